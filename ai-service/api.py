@@ -1,13 +1,41 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+import itertools
+import json
 import sys
 import os
+import threading
+import time
+import uuid
+
+import yaml
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.assistant.store_assistant import StoreAssistant
+from src.factory import (
+    build_generation_scheduler,
+    build_host_pool,
+    build_intent_router,
+    build_llm_handler,
+    build_response_cache,
+    build_retrieval_cache,
+    build_retrieval_system,
+)
+from src.orders.order_manager import OrderManager
+from src.products.product_manager import ProductManager
+from src.models.scheduler import SchedulerRejected
+from src.rag.batching import BatchingEmbedder
+from src.rag.embedding_cache import EmbeddingCache
+from src.rag.embeddings import EmbeddingModel
+from src.rag.retrieval import RetrievalSystem
+from src.rag.store_versions import current_store_dir, prune_versions
 # 👇 FIX 1: Import from the NEW ingest_data script
 try:
     from scripts.ingest_data import main as run_ingestion
@@ -26,13 +54,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "config.yaml")
+
+def load_config(config_path: str = CONFIG_PATH) -> Dict:
+    """Load configuration from YAML file."""
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            return yaml.safe_load(f) or {}
+    return {}
+
+config = load_config()
+llm_config = config.get('llm', {})
+rag_config = config.get('rag', {})
+assistant_config = config.get('assistant', {})
+
+# Same directory scripts/ingest_data.py syncs into
+VECTOR_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "vector_store")
+
+# Shared by every retrieval system opened below; each sync starts a new generation
+retrieval_cache = build_retrieval_cache(rag_config)
+
+# llm.base_url (a list spreads chats and embeddings over several hosts);
+# a comma-separated OLLAMA_BASE_URL overrides it
+ollama_hosts = build_host_pool(llm_config, os.getenv("OLLAMA_BASE_URL"))
+
+# Persistent across restarts and shared with syncs, so unchanged text is embedded once
+cache_config = rag_config.get('embedding_cache', {})
+embedding_cache = None
+if cache_config.get('enabled', True):
+    embedding_cache = EmbeddingCache(
+        cache_path=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            cache_config.get('path') or os.path.join("data", "embedding_cache", "embeddings.db")
+        ),
+        max_bytes=int(cache_config.get('max_mb', 256)) * 1024 * 1024
+    )
+
+# Shared by every retrieval system opened below
+shared_embedding_model = EmbeddingModel(
+    model_name=rag_config.get('embedding_model', 'mxbai-embed-large'),
+    provider=rag_config.get('embedding_provider', 'ollama'),
+    cache=embedding_cache,
+    host_pool=ollama_hosts,
+)
+# Concurrent chats share one embedding call instead of one round-trip each
+batching_config = rag_config.get('query_batching', {})
+if batching_config.get('enabled', True):
+    shared_embedding_model = BatchingEmbedder(
+        shared_embedding_model,
+        max_batch_size=batching_config.get('max_batch_size', 16),
+        max_wait_ms=batching_config.get('max_wait_ms', 5)
+    )
+
+def create_retrieval_system(persist_dir: str, embedding_model: Optional[EmbeddingModel] = None) -> RetrievalSystem:
+    """Open a retrieval system on a vector store directory, configured from the rag section."""
+    return build_retrieval_system(
+        rag_config,
+        embedding_model or shared_embedding_model,
+        persist_dir=persist_dir,
+        cache=retrieval_cache
+    )
+
 # 👇 FIX 2: Pass your store name here
 print("🧠 Initializing AI Brain...")
-assistant = StoreAssistant(store_name="LEEWAY")
+retrieval_system = create_retrieval_system(current_store_dir(VECTOR_STORE_DIR))
+product_manager = ProductManager()
+order_manager = OrderManager()
+assistant = StoreAssistant(
+    store_name="LEEWAY",
+    # Follow-up turns reuse Ollama's KV cache for the conversation so far (llm.sessions)
+    llm_handler=build_llm_handler(llm_config, ollama_hosts),
+    retrieval_system=retrieval_system,
+    product_manager=product_manager,
+    order_manager=order_manager,
+    # Near-duplicate guest questions reuse an earlier answer
+    response_cache=build_response_cache(assistant_config),
+    # Ollama serves a couple of generations at a time; the rest wait in line or get a 429/503
+    generation_scheduler=build_generation_scheduler(llm_config),
+    # Price / stock / browse / order-status turns are answered without the LLM
+    intent_router=build_intent_router(
+        assistant_config, product_manager, order_manager, retrieval_system.embedding_model
+    )
+)
 print("✅ AI Ready!")
 
+# Syncs run one at a time in the background; chats keep using the live
+# retriever until a finished sync swaps in the new one
+sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sync")
+sync_jobs: Dict[str, Dict] = {}
+sync_jobs_lock = threading.Lock()
+MAX_SYNC_JOBS = 50
+
 class ChatRequest(BaseModel):
     message: str
+    # Send a per-visitor ID to continue the conversation's LLM context;
+    # "guest" turns are answered standalone
     session_id: str = "guest"
 
 @app.post("/chat")
@@ -43,29 +159,155 @@ async def chat_endpoint(request: ChatRequest):
     """
     try:
         # This now returns a DICTIONARY with products
-        response_data = assistant.process_user_message(request.message, request.session_id)
+        # Awaits Ollama instead of blocking, so other chats keep being served
+        response_data = await assistant.aprocess_user_message(request.message, request.session_id)
         return response_data
+    except SchedulerRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         print(f"❌ Error processing message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/sync-products")
-async def sync_products():
+def _overloaded(error: SchedulerRejected) -> HTTPException:
+    """429/503 telling the client when to retry."""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def _sse_events(first: Optional[Dict], events: Iterator[Dict]) -> Iterator[str]:
+    """Format the assistant's stream events as server-sent events."""
+    try:
+        if first is None:
+            return
+        for event in itertools.chain([first], events):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event, default=str, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        print(f"❌ Error streaming message: {e}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
     """
-    Call this API when you add a new product in Admin Panel.
-    It re-reads MySQL and updates the Vector DB.
+    Same as /chat, streamed as server-sent events:
+        event: products  data: {"products": [...], "action": "..."}   (sent first)
+        event: token     data: {"text": "..."}                        (one per chunk)
+        event: done      data: {"response": "...", "products": [...], "action": "..."}
+        event: error     data: {"detail": "..."}                      (on failure)
     """
-    if not run_ingestion:
-        raise HTTPException(status_code=500, detail="Ingestion script not found")
-        
+    events = assistant.stream_user_message(request.message, request.session_id)
     try:
-        print("🔄 Syncing Products...")
-        run_ingestion() # Runs the main() function from ingest_data.py
-        return {"status": "success", "message": "Vector DB updated with latest products"}
+        # Waits for a generation slot, so overload is answered with a status code
+        first = await run_in_threadpool(next, events, None)
+    except SchedulerRejected as e:
+        raise _overloaded(e)
     except Exception as e:
-        print(f"❌ Sync Error: {e}")
+        print(f"❌ Error streaming message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    # The generator blocks on Ollama, so Starlette iterates it in a worker thread
+    return StreamingResponse(
+        _sse_events(first, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/stats")
+async def stats():
+    """Prompt sizes, cache hit ratios and memory use of the live assistant."""
+    retrieval_system = assistant.retrieval_system
+    return {
+        "turns": assistant.turn_stats(),
+        "prompt": assistant.llm_handler.prompt_stats(),
+        "sessions": assistant.llm_handler.session_stats(),
+        "scheduler": assistant.generation_scheduler.stats(),
+        "hosts": ollama_hosts.stats(),
+        "response_cache": assistant.response_cache.stats(),
+        "retrieval_cache": retrieval_system.cache_stats(),
+        "embedding_cache": retrieval_system.embedding_model.cache_stats(),
+        "query_batching": (
+            shared_embedding_model.stats() if isinstance(shared_embedding_model, BatchingEmbedder) else {}
+        ),
+    }
+
+def _update_sync_job(job_id: str, **fields):
+    with sync_jobs_lock:
+        sync_jobs[job_id].update(fields)
+
+def _run_sync_job(job_id: str, full: bool):
+    """Run ingestion, then swap the assistant onto the synced store."""
+    _update_sync_job(job_id, status="running", started_at=time.time())
+    try:
+        print(f"🔄 Syncing Products (job {job_id})...")
+        # Runs the main() function from ingest_data.py
+        result = run_ingestion(full=full, embedding_cache=embedding_cache)
+        if result.get("status") == "error":
+            raise RuntimeError(result.get("message"))
+
+        if result["mode"] == "full" or result.get("upserted") or result.get("deleted"):
+            # Open the synced store off the request path, then swap atomically
+            retrieval_system = create_retrieval_system(
+                result["vector_store_dir"],
+                embedding_model=assistant.retrieval_system.embedding_model
+            )
+            # A full rebuild may change anything, so it drops every cached answer
+            assistant.swap_retrieval_system(retrieval_system, result.get("changed_product_ids"))
+            prune_versions(VECTOR_STORE_DIR)
+        _update_sync_job(job_id, status="succeeded", result=result, finished_at=time.time())
+        print(f"✅ Sync job {job_id} finished")
+    except Exception as e:
+        print(f"❌ Sync Error: {e}")
+        _update_sync_job(job_id, status="failed", error=str(e), finished_at=time.time())
+
+@app.post("/sync-products", status_code=202)
+async def sync_products(full: bool = False):
+    """
+    Call this API when you add a new product in Admin Panel.
+    It re-reads MySQL and updates the Vector DB in the background.
+    Only changed products are re-embedded unless ?full=true is passed.
+
+    Returns a job id; poll GET /sync-products/{job_id} for its status.
+    """
+    if not run_ingestion:
+        raise HTTPException(status_code=500, detail="Ingestion script not found")
+
+    with sync_jobs_lock:
+        # A sync that hasn't started yet will pick up this change too
+        for job in sync_jobs.values():
+            if job["status"] == "queued" and job["full"] == full:
+                return dict(job)
+
+        job_id = uuid.uuid4().hex
+        sync_jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "full": full,
+            "created_at": time.time(),
+            "status_url": f"/sync-products/{job_id}",
+        }
+        # Forget the oldest finished jobs
+        finished = [
+            jid for jid, job in sync_jobs.items()
+            if job["status"] in ("succeeded", "failed")
+        ]
+        for jid in finished[:max(0, len(sync_jobs) - MAX_SYNC_JOBS)]:
+            del sync_jobs[jid]
+        job = dict(sync_jobs[job_id])
+
+    sync_executor.submit(_run_sync_job, job_id, full)
+    return job
+
+@app.get("/sync-products/{job_id}")
+async def sync_status(job_id: str):
+    """Status of a sync job: queued, running, succeeded or failed."""
+    with sync_jobs_lock:
+        job = sync_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown sync job")
+        return dict(job)
+
 if __name__ == "__main__":
     import uvicorn
     # Run on port 8000
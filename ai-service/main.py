@@ -12,9 +12,19 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.assistant.store_assistant import StoreAssistant
-from src.models.llm_handler import LLMHandler
-from src.rag.retrieval import RetrievalSystem
+from src.factory import (
+    build_generation_scheduler,
+    build_host_pool,
+    build_intent_router,
+    build_llm_handler,
+    build_response_cache,
+    build_retrieval_cache,
+    build_retrieval_system,
+)
 from src.rag.embeddings import EmbeddingModel
+from src.rag.embedding_cache import EmbeddingCache
+from src.rag.batching import BatchingEmbedder
+from src.rag.store_versions import current_store_dir
 from src.products.product_manager import ProductManager
 from src.orders.order_manager import OrderManager
 from src.audio.text_to_speech import TextToSpeech
@@ -33,31 +43,48 @@ def create_assistant(config: dict) -> StoreAssistant:
     """Create and configure Store Assistant."""
     # LLM Handler
     llm_config = config.get('llm', {})
-    llm_handler = LLMHandler(
-        model_type=llm_config.get('model_type', 'openai'),
-        model_name=llm_config.get('model_name'),
-        api_key=llm_config.get('api_key'),
-        base_url=llm_config.get('base_url'),
-        temperature=llm_config.get('temperature', 0.7),
-        max_tokens=llm_config.get('max_tokens')
-    )
+    # One pool of Ollama hosts for generation and embeddings, so load
+    # balancing sees every request a host is serving
+    host_pool = build_host_pool(llm_config)
+    llm_handler = build_llm_handler(llm_config, host_pool)
     
+    generation_scheduler = build_generation_scheduler(llm_config)
+
     # RAG System
     rag_config = config.get('rag', {})
 
+    # Persistent embedding cache (skips re-embedding unchanged text)
+    cache_config = rag_config.get('embedding_cache', {})
+    embedding_cache = None
+    if cache_config.get('enabled', True):
+        embedding_cache = EmbeddingCache(
+            cache_path=cache_config.get('path'),
+            max_bytes=int(cache_config.get('max_mb', 256)) * 1024 * 1024
+        )
+
     # Embeddings (now defaulting to Ollama local embeddings)
     embedding_model = EmbeddingModel(
         model_name=rag_config.get('embedding_model', 'mxbai-embed-large'),
         provider=rag_config.get('embedding_provider', 'ollama'),
-        base_url=llm_config.get('base_url'),
+        cache=embedding_cache,
+        host_pool=host_pool,
     )
 
-    retrieval_system = RetrievalSystem(
-        embedding_model=embedding_model,
-        top_k=rag_config.get('top_k', 5),
-        vector_store_type=rag_config.get('vector_store_type', 'chroma'),
-        persist_dir=rag_config.get('persist_dir'),
-        collection_name=rag_config.get('collection_name', 'store_assistant')
+    # Coalesce concurrent query embeddings into one provider call
+    batching_config = rag_config.get('query_batching', {})
+    if batching_config.get('enabled', True):
+        embedding_model = BatchingEmbedder(
+            embedding_model,
+            max_batch_size=batching_config.get('max_batch_size', 16),
+            max_wait_ms=batching_config.get('max_wait_ms', 5)
+        )
+
+    retrieval_system = build_retrieval_system(
+        rag_config,
+        embedding_model,
+        # Follows the version published by the last full sync, if any
+        persist_dir=current_store_dir(rag_config.get('persist_dir') or 'data/vector_store'),
+        cache=build_retrieval_cache(rag_config)
     )
     
     # Product Manager
@@ -87,13 +114,20 @@ def create_assistant(config: dict) -> StoreAssistant:
     
     # Assistant
     assistant_config = config.get('assistant', {})
+    response_cache = build_response_cache(assistant_config)
+
+    intent_router = build_intent_router(assistant_config, product_manager, order_manager, embedding_model)
+
     assistant = StoreAssistant(
         llm_handler=llm_handler,
         retrieval_system=retrieval_system,
         product_manager=product_manager,
         order_manager=order_manager,
         tts=tts,
-        use_rag=assistant_config.get('use_rag', True)
+        use_rag=assistant_config.get('use_rag', True),
+        response_cache=response_cache,
+        generation_scheduler=generation_scheduler,
+        intent_router=intent_router
     )
     
     return assistant
@@ -0,0 +1,374 @@
+"""
+Retrieval benchmark for the VectorStore backends.
+
+Generates a synthetic product catalog, embeds it with the deterministic
+"hash" embedding provider (no Ollama needed), builds every requested
+backend from the same vectors and reports:
+
+    build_seconds, memory_bytes (RSS growth), disk_bytes,
+    latency_ms p50/p95/p99, qps (one query at a time), batch_qps
+    and recall@k against brute-force ground truth
+
+Results are written as JSON so runs can be compared across commits:
+
+    python scripts/benchmark_retrieval.py --sizes 1000,10000 \\
+        --backends numpy,faiss-flat,faiss-hnsw --output bench.json
+
+Progress goes to stderr; without --output the JSON goes to stdout.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Make `src` importable when run directly as `python scripts/benchmark_retrieval.py`
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.embeddings import EmbeddingModel
+from src.rag.vector_store import VectorStore
+
+# Backend name -> VectorStore arguments ({nlist} and {pq_m} depend on the catalog).
+# In-process backends are built with a single add_documents call, like the
+# assistant's indexing; ChromaDB gets batches of BUILD_BATCH.
+BACKENDS: Dict[str, Dict[str, Any]] = {
+    "chroma": {"store_type": "chroma"},
+    "faiss-flat": {"store_type": "faiss", "index_factory": "Flat"},
+    "faiss-hnsw": {"store_type": "faiss", "index_factory": "HNSW32", "ef_search": 64},
+    "faiss-ivf": {"store_type": "faiss", "index_factory": "IVF{nlist},Flat", "nprobe": 8},
+    "faiss-ivfpq": {"store_type": "faiss", "index_factory": "IVF{nlist},PQ{pq_m}", "nprobe": 8},
+    "faiss-sq8": {"store_type": "faiss", "index_factory": "SQ8"},
+    "numpy": {"store_type": "numpy"},
+    "numpy-int8": {"store_type": "numpy", "quantization": "int8"},
+}
+DEFAULT_BACKENDS = "chroma,faiss-flat,faiss-hnsw,faiss-ivf,numpy,numpy-int8"
+# Documents per add_documents call (ChromaDB rejects very large batches)
+BUILD_BATCH = 5000
+
+CATEGORIES = ["Rings", "Bracelets", "Necklaces", "Earrings", "Anklets", "Pendants", "Bangles", "Watches"]
+MATERIALS = ["gold", "silver", "rose gold", "platinum", "stainless steel", "copper", "brass", "pearl"]
+COLORS = ["red", "blue", "green", "black", "white", "pink", "purple", "golden", "silver", "emerald"]
+STYLES = ["bridal", "casual", "party", "vintage", "minimal", "classic", "modern", "traditional", "kundan", "boho"]
+STONES = ["diamond", "ruby", "sapphire", "zircon", "crystal", "opal", "topaz", "none"]
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def iter_catalog(n: int, seed: int, batch_size: int = BUILD_BATCH) -> Iterator[Tuple[List[str], List[Dict]]]:
+    """
+    Yield a deterministic synthetic catalog in batches of (ids, documents).
+
+    Attribute words repeat across products, so neighbourhoods are dense
+    like a real jewellery catalog; the SKU word keeps every text unique.
+    Rows are generated in fixed-size blocks, so the catalog is the same
+    whatever batch_size is.
+    """
+    ids: List[str] = []
+    documents: List[Dict] = []
+    vocabularies = (CATEGORIES, MATERIALS, COLORS, STYLES, STONES)
+    for start in range(0, n, BUILD_BATCH):
+        count = min(BUILD_BATCH, n - start)
+        rng = np.random.default_rng([seed, start])
+        picks = [rng.integers(0, len(words), count) for words in vocabularies]
+        prices = rng.integers(500, 50000, count)
+        stocks = rng.integers(0, 20, count)
+        for i in range(count):
+            row = start + i
+            category, material, color, style, stone = (
+                words[pick[i]] for words, pick in zip(vocabularies, picks)
+            )
+            text = (
+                f"Product: {style} {material} {category.lower()} sku{row}\n"
+                f"Description: {color} {stone} {style} {category.lower()} in {material}\n"
+                f"Category: {category}"
+            )
+            ids.append(f"item_{row}")
+            documents.append({
+                "text": text,
+                "product_id": row,
+                "category": category,
+                "price": float(prices[i]),
+                "stock": int(stocks[i]),
+                "type": "product",
+            })
+            if len(ids) == batch_size:
+                yield ids, documents
+                ids, documents = [], []
+    if ids:
+        yield ids, documents
+
+
+def make_queries(n_queries: int, seed: int) -> List[str]:
+    """Shopper-style queries: partial attribute combinations, no SKU."""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(n_queries):
+        words = [
+            STYLES[rng.integers(len(STYLES))],
+            COLORS[rng.integers(len(COLORS))],
+            MATERIALS[rng.integers(len(MATERIALS))],
+            CATEGORIES[rng.integers(len(CATEGORIES))].lower(),
+        ]
+        keep = rng.permutation(len(words))[: rng.integers(2, len(words) + 1)]
+        queries.append(" ".join(words[i] for i in sorted(keep)))
+    return queries
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def directory_bytes(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int, chunk: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force cosine top-k (rows of matrix and queries are normalized)."""
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(matrix), chunk):
+        scores = queries @ matrix[start:start + chunk].T
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, axis=1)])
+        best_rows = np.hstack([best_rows, top + start])
+        keep = np.argsort(-best_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    return best_rows, best_scores
+
+
+def tie_aware_recall(
+    results: List[List[Dict]], matrix: np.ndarray, queries: np.ndarray, exact_scores: np.ndarray, k: int
+) -> float:
+    """
+    recall@k that treats equally similar documents as interchangeable.
+
+    Hashed embeddings produce exact ties; a returned document counts as a
+    hit when its true similarity reaches the k-th best true similarity.
+    """
+    hits = 0
+    for q, docs in enumerate(results):
+        rows = [int(doc["id"].rsplit("_", 1)[1]) for doc in docs[:k]]
+        if rows:
+            threshold = exact_scores[q, -1] - 1e-5
+            hits += int(np.count_nonzero(matrix[rows] @ queries[q] >= threshold))
+    return hits / (len(results) * k) if results else 1.0
+
+
+def resolve_backend(name: str, n_items: int, dim: int) -> Dict[str, Any]:
+    """VectorStore arguments for a backend, sized for the catalog."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}. Choose from: {', '.join(BACKENDS)}")
+    nlist = int(min(4096, max(16, 4 * np.sqrt(n_items))))
+    # ~16 dimensions per PQ sub-vector; m must divide dim
+    pq_m = next((m for m in range(max(1, dim // 16), 0, -1) if dim % m == 0), 1)
+    config = dict(BACKENDS[name])
+    if "index_factory" in config:
+        config["index_factory"] = config["index_factory"].format(nlist=nlist, pq_m=pq_m)
+    return config
+
+
+def benchmark_backend(
+    name: str,
+    n_items: int,
+    dim: int,
+    seed: int,
+    matrix: np.ndarray,
+    query_vectors: np.ndarray,
+    exact_scores: np.ndarray,
+    k: int,
+    warmup: int = 10,
+) -> Dict[str, Any]:
+    """Build one backend from the catalog and measure it."""
+    config = resolve_backend(name, n_items, dim)
+    result: Dict[str, Any] = {"backend": name, "items": n_items, "dim": dim, "k": k, "config": config}
+    persist_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        gc.collect()
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        store = VectorStore(persist_dir=persist_dir, collection_name="benchmark", **config)
+        batch_size = BUILD_BATCH if config["store_type"] == "chroma" else n_items
+        for ids, documents in iter_catalog(n_items, seed, batch_size):
+            first = int(ids[0].rsplit("_", 1)[1])
+            store.add_documents(matrix[first:first + len(ids)], documents, ids)
+        store.save()
+        result["build_seconds"] = round(time.perf_counter() - started, 4)
+        gc.collect()
+        result["memory_bytes"] = max(0, rss_bytes() - rss_before)
+        result["disk_bytes"] = directory_bytes(persist_dir)
+
+        for vector in query_vectors[:warmup]:
+            store.search(vector, k=k)
+        latencies = []
+        results = []
+        started = time.perf_counter()
+        for vector in query_vectors:
+            t0 = time.perf_counter()
+            results.append(store.search(vector, k=k))
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        latencies_ms = np.asarray(latencies) * 1000.0
+        result["latency_ms"] = {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 4),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 4),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 4),
+            "mean": round(float(latencies_ms.mean()), 4),
+        }
+        result["qps"] = round(len(query_vectors) / elapsed, 2) if elapsed > 0 else None
+
+        started = time.perf_counter()
+        store.search_batch(query_vectors, k=k)
+        elapsed = time.perf_counter() - started
+        result["batch_qps"] = round(len(query_vectors) / elapsed, 2) if elapsed > 0 else None
+
+        result["recall_at_k"] = round(tie_aware_recall(results, matrix, query_vectors, exact_scores, k), 4)
+        result["status"] = "ok"
+        del store
+    except ImportError as e:
+        result["status"] = "skipped"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    return result
+
+
+def environment_info() -> Dict[str, Any]:
+    """Where the numbers came from."""
+    info: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["git_commit"] = None
+    for module in ("faiss", "chromadb"):
+        try:
+            info[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            info[module] = None
+    return info
+
+
+def run_benchmark(
+    sizes: List[int],
+    backends: List[str],
+    dim: int = 384,
+    n_queries: int = 200,
+    k: int = 10,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """
+    Benchmark every backend on every catalog size.
+
+    Returns:
+        {"environment": ..., "parameters": ..., "datasets": [...], "results": [...]}
+    """
+    embedder = EmbeddingModel(provider="hash", dimension=dim)
+    report: Dict[str, Any] = {
+        "environment": environment_info(),
+        "parameters": {"sizes": sizes, "backends": backends, "dim": dim, "queries": n_queries, "k": k, "seed": seed},
+        "datasets": [],
+        "results": [],
+    }
+    for n_items in sizes:
+        log(f"📦 Generating {n_items} items (dim {dim})...")
+        started = time.perf_counter()
+        matrix = np.empty((n_items, dim), dtype=np.float32)
+        for ids, documents in iter_catalog(n_items, seed):
+            first = int(ids[0].rsplit("_", 1)[1])
+            matrix[first:first + len(ids)] = embedder.embed_batch([doc["text"] for doc in documents])
+        query_vectors = embedder.embed_batch(make_queries(n_queries, seed))
+        embed_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, exact_scores = exact_top_k(matrix, query_vectors, k)
+        report["datasets"].append({
+            "items": n_items,
+            "embed_seconds": round(embed_seconds, 4),
+            "ground_truth_seconds": round(time.perf_counter() - started, 4),
+            "matrix_bytes": int(matrix.nbytes),
+        })
+
+        for name in backends:
+            log(f"⏱️  {name} @ {n_items}...")
+            result = benchmark_backend(name, n_items, dim, seed, matrix, query_vectors, exact_scores, k)
+            if result["status"] == "ok":
+                log(
+                    f"   build {result['build_seconds']:.2f}s, p50 {result['latency_ms']['p50']:.3f}ms, "
+                    f"p99 {result['latency_ms']['p99']:.3f}ms, {result['qps']:.0f} qps, "
+                    f"recall@{k} {result['recall_at_k']:.3f}"
+                )
+            else:
+                log(f"   {result['status']}: {result.get('error')}")
+            report["results"].append(result)
+        del matrix
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends on a synthetic catalog.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated catalog sizes (e.g. 1000,100000,1000000)")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS, help=f"Comma-separated backends from: {', '.join(BACKENDS)}")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--k", type=int, default=10, help="Results per query (recall@k)")
+    parser.add_argument("--seed", type=int, default=42, help="Catalog and query seed")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    for name in backends:
+        resolve_backend(name, 1, args.dim)
+    report = run_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",") if size.strip()],
+        backends=backends,
+        dim=args.dim,
+        n_queries=args.queries,
+        k=args.k,
+        seed=args.seed,
+    )
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+        log(f"✅ Wrote {args.output}")
+    else:
+        print(payload)
+    return report
+
+
+if __name__ == "__main__":
+    main()
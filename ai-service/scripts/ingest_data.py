@@ -1,26 +1,119 @@
 """
 Unified Master Ingestion Script
 Ingests Product data (MySQL) and Training data (JSON) into ChromaDB.
+
+By default only products that were inserted, updated or deleted since the
+last sync are re-embedded (delta mode). Run with --full to rebuild the
+whole vector store from scratch; full rebuilds stream the products table
+through a bounded, parallel embedding pipeline (see ingest_pipeline.py).
+
+Full rebuilds are written into a new versioned directory that is only
+published once it is complete (see src/rag/store_versions.py), so the live
+store keeps serving until then.
+
+Set PRODUCTS_SQLITE_PATH (or pass --sqlite) to read products from a SQLite
+file with the same schema instead of MySQL, e.g. for local benchmarking.
 """
 
+import argparse
+import hashlib
+import itertools
 import os
 import json
-import mysql.connector
+import shutil
+import sqlite3
+import sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Make `src` importable when run directly as `python scripts/ingest_data.py`
+sys.path.append(str(Path(__file__).parent.parent))
+
+try:
+    from scripts.ingest_pipeline import run_pipeline
+except ImportError:
+    from ingest_pipeline import run_pipeline
+from src.rag.embedding_cache import EmbeddingCache
+from src.rag.store_versions import create_version_dir, current_store_dir, publish_version
 
 # --- CONFIGURATION ---
 VECTOR_STORE_PATH = "data/vector_store"
 COLLECTION_NAME = "store_assistant"
 # We use mxbai for the DATABASE because it is better at searching than Llama3
 EMBEDDING_MODEL = "mxbai-embed-large" 
+# Content hashes and the updated_at watermark of the last sync live here
+SYNC_STATE_FILE = "sync_state.json"
+# Vector store IDs of MySQL products (training examples use "train_<n>")
+PRODUCT_ID_PREFIX = "db_product_"
+# Full rebuild pipeline sizing: rows per batch, embedding workers, batches in flight
+BATCH_SIZE = 256
+EMBED_WORKERS = 4
+QUEUE_SIZE = 8
+# Read products from this SQLite file instead of MySQL when set
+SQLITE_PATH_ENV = "PRODUCTS_SQLITE_PATH"
+# rag.embedding_cache in here locates the embedding cache shared with the API
+CONFIG_PATH = "config/config.yaml"
+
+class CachedEmbeddings(Embeddings):
+    """
+    Ollama embeddings backed by the persistent EmbeddingCache.
+
+    Uses the same keys as src.rag.embeddings.EmbeddingModel, so vectors
+    computed here are reused by the API for queries and later syncs, and
+    vice versa.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str = EMBEDDING_MODEL):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key("ollama", self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing, vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [list(map(float, found[key])) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def load_embedding_cache(base_dir: Path) -> Optional[EmbeddingCache]:
+    """Open the embedding cache configured under rag.embedding_cache, if enabled."""
+    import yaml
+
+    config_path = base_dir / CONFIG_PATH
+    config = {}
+    if config_path.exists():
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f) or {}
+    cache_config = config.get("rag", {}).get("embedding_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    return EmbeddingCache(
+        cache_path=str(base_dir / (cache_config.get("path") or "data/embedding_cache/embeddings.db")),
+        max_bytes=int(cache_config.get("max_mb", 256)) * 1024 * 1024
+    )
+
+def get_embeddings(embedding_cache: Optional[EmbeddingCache] = None) -> Embeddings:
+    """Ollama embeddings, served from embedding_cache where possible."""
+    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    if embedding_cache is None:
+        return embeddings
+    return CachedEmbeddings(embeddings, embedding_cache)
 
 def get_mysql_connection():
     """Create a MySQL connection."""
+    import mysql.connector
     return mysql.connector.connect(
         host=os.getenv("MYSQL_HOST", "localhost"),
         user=os.getenv("MYSQL_USER", "root"),
@@ -28,18 +121,71 @@ def get_mysql_connection():
         database=os.getenv("MYSQL_DATABASE", "ecommerce_db"),
     )
 
-def fetch_products() -> List[Dict[str, Any]]:
-    """Fetch all products from MySQL."""
-    conn = get_mysql_connection()
+def get_connection():
+    """Connect to the products database (SQLite if PRODUCTS_SQLITE_PATH is set, else MySQL)."""
+    sqlite_path = os.getenv(SQLITE_PATH_ENV)
+    if sqlite_path:
+        # The streaming reader hands its connection from the caller to the reader thread
+        conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return get_mysql_connection()
+
+def is_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+def dict_cursor(conn):
+    """Cursor returning rows by column name; MySQL cursors stream rows unbuffered."""
+    if is_sqlite(conn):
+        return conn.cursor()
+    return conn.cursor(dictionary=True, buffered=False)
+
+def has_updated_at(conn) -> bool:
+    """Check whether the products table has an updated_at column."""
+    cursor = conn.cursor()
     try:
-        # We fetch exactly the columns you specified
-        query = """
-            SELECT id, name, category, price, stock, rating, image, images, description 
-            FROM products
-        """
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        if is_sqlite(conn):
+            cursor.execute("PRAGMA table_info(products)")
+            return any(row[1] == "updated_at" for row in cursor.fetchall())
+        cursor.execute("SHOW COLUMNS FROM products LIKE 'updated_at'")
+        return cursor.fetchone() is not None
+    finally:
+        cursor.close()
+
+def product_query(conn, since: Optional[str] = None) -> tuple:
+    """
+    Build the product SELECT for this database.
+
+    Args:
+        since: Only select rows with updated_at >= since (needs an
+               updated_at column; ignored otherwise)
+
+    Returns:
+        (query, params)
+    """
+    # We fetch exactly the columns you specified
+    columns = "id, name, category, price, stock, rating, image, images, description"
+    if not has_updated_at(conn):
+        return f"SELECT {columns} FROM products", ()
+    columns += ", updated_at"
+    if since is None:
+        return f"SELECT {columns} FROM products", ()
+    placeholder = "?" if is_sqlite(conn) else "%s"
+    return f"SELECT {columns} FROM products WHERE updated_at >= {placeholder}", (since,)
+
+def fetch_products(since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch products from the database.
+
+    Args:
+        since: Only fetch rows with updated_at >= since (see product_query)
+    """
+    conn = get_connection()
+    try:
+        query, params = product_query(conn, since)
+        cursor = dict_cursor(conn)
+        cursor.execute(query, params)
+        rows = [dict(row) for row in cursor.fetchall()]
         cursor.close()
         return rows
     except Exception as e:
@@ -48,6 +194,49 @@ def fetch_products() -> List[Dict[str, Any]]:
     finally:
         conn.close()
 
+def iter_product_batches(batch_size: int = BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream all products in fixed-size batches.
+
+    Rows are pulled from the cursor batch by batch, so only one batch is
+    held in memory here regardless of the table size.
+    """
+    conn = get_connection()
+    try:
+        query, params = product_query(conn)
+        cursor = dict_cursor(conn)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+        cursor.close()
+    finally:
+        conn.close()
+
+def fetch_product_ids() -> Optional[List[str]]:
+    """Fetch the IDs of all products (None if the database can't be read)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM products")
+        ids = [str(row[0]) for row in cursor.fetchall()]
+        cursor.close()
+        return ids
+    except Exception as e:
+        print(f"❌ Error fetching product IDs: {e}")
+        return None
+    finally:
+        conn.close()
+
+def latest_updated_at(rows: List[Dict[str, Any]], current: Optional[str] = None) -> Optional[str]:
+    """Get the newest updated_at value among rows (as a MySQL datetime string)."""
+    values = [str(row["updated_at"]) for row in rows if row.get("updated_at") is not None]
+    if current is not None:
+        values.append(current)
+    return max(values) if values else None
+
 def products_to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
     """Convert product rows into LangChain Documents."""
     documents = []
@@ -106,50 +295,252 @@ def load_training_data(json_path: Path) -> List[Document]:
         documents.append(Document(page_content=content, metadata=meta))
     return documents
 
-def main():
-    base_dir = Path(__file__).parent.parent
-    
-    # 1. Setup Paths
-    vector_store_dir = base_dir / VECTOR_STORE_PATH
-    training_json = base_dir / "src" / "chat" / "training_data.json"
-    
+def document_id(doc: Document) -> str:
+    """Stable vector store ID of a product or training document."""
+    if doc.metadata.get("type") == "product":
+        return f"{PRODUCT_ID_PREFIX}{doc.metadata['id']}"
+    return doc.metadata["id"]
+
+def document_hash(doc: Document) -> str:
+    """Hash of everything that ends up in the vector store for a document."""
+    payload = json.dumps(
+        {"text": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_sync_state(state_path: Path) -> Optional[Dict[str, Any]]:
+    """Load the state of the last sync (None if there was none)."""
+    if not state_path.exists():
+        return None
+    try:
+        with state_path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Warning: Could not read sync state ({e}); doing a full rebuild.")
+        return None
+
+def save_sync_state(state_path: Path, hashes: Dict[str, str], watermark: Optional[str]):
+    """Write the sync state atomically."""
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"hashes": hashes, "watermark": watermark}, f)
+    os.replace(tmp_path, state_path)
+
+def full_rebuild(
+    persist_dir: Path,
+    training_json: Path,
+    batch_size: int = BATCH_SIZE,
+    workers: int = EMBED_WORKERS,
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> Dict[str, Any]:
+    """
+    Re-embed every product and training example into a new store version.
+
+    Product rows are streamed from the database in batches of batch_size
+    and embedded by several workers at once; each embedded batch is upserted
+    as soon as it is ready. The new version is published only after every
+    batch was written; the previous version is left untouched.
+    """
+    import chromadb
+
     # 2. Load Data
-    print(f"🚀 Starting Ingestion using {EMBEDDING_MODEL}...")
-    
-    products = fetch_products()
-    if not products:
+    print(f"🚀 Starting Ingestion using {EMBEDDING_MODEL} ({workers} workers, batches of {batch_size})...")
+    # Read the first batch before creating anything, so an unreachable
+    # database never produces an empty version
+    product_batches = iter_product_batches(batch_size)
+    try:
+        first_batch = next(product_batches, None)
+    except Exception as e:
+        print(f"❌ Error fetching products: {e}")
+        first_batch = None
+    if not first_batch:
         print("❌ No products found in MySQL! Make sure XAMPP is running.")
-        return
+        return {"mode": "full", "status": "error", "message": "No products found in MySQL"}
 
-    product_docs = products_to_documents(products)
-    print(f"📦 Loaded {len(product_docs)} products from MySQL.")
-    
     training_docs = load_training_data(training_json)
     print(f"📚 Loaded {len(training_docs)} training examples.")
     
-    all_docs = product_docs + training_docs
-    
     # 3. Initialize ChromaDB & Embeddings
+    embeddings = get_embeddings(embedding_cache)
+    
+    # Build next to the live store instead of deleting it
+    vector_store_dir = Path(create_version_dir(str(persist_dir)))
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+
+    hashes: Dict[str, str] = {}
+    watermark: List[Optional[str]] = [None]
+    product_count = [0]
+
+    def document_batches() -> Iterator[List[Document]]:
+        for rows in itertools.chain([first_batch], product_batches):
+            watermark[0] = latest_updated_at(rows, watermark[0])
+            product_count[0] += len(rows)
+            yield products_to_documents(rows)
+        for start in range(0, len(training_docs), batch_size):
+            yield training_docs[start:start + batch_size]
+
+    def embed(docs: List[Document]) -> List[List[float]]:
+        return embeddings.embed_documents([doc.page_content for doc in docs])
+
+    def write(docs: List[Document], vectors: List[List[float]]):
+        ids = [document_id(doc) for doc in docs]
+        collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in docs],
+            metadatas=[doc.metadata for doc in docs]
+        )
+        for doc_id, doc in zip(ids, docs):
+            hashes[doc_id] = document_hash(doc)
+
+    def report(stats: Dict[str, float]):
+        print(f"📈 {int(stats['items'])} items embedded ({stats['items_per_second']:.1f} items/s)")
+
     print("🧠 Generating embeddings (this may take a moment)...")
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    try:
+        stats = run_pipeline(
+            document_batches(), embed, write,
+            workers=workers, queue_size=QUEUE_SIZE, on_progress=report
+        )
+        save_sync_state(vector_store_dir / SYNC_STATE_FILE, hashes, watermark[0])
+    except BaseException:
+        # Never leave a half-built version behind
+        shutil.rmtree(vector_store_dir, ignore_errors=True)
+        raise
+    publish_version(str(persist_dir), str(vector_store_dir))
     
-    # Delete old DB to avoid duplicates
-    if vector_store_dir.exists():
-        import shutil
-        try:
-            shutil.rmtree(vector_store_dir)
-            print("🗑️  Cleared old vector store.")
-        except:
-            pass
-
-    vector_store = Chroma.from_documents(
-        documents=all_docs,
-        embedding=embeddings,
-        persist_directory=str(vector_store_dir),
-        collection_name=COLLECTION_NAME
+    print(
+        f"✅ Success! Ingested {int(stats['items'])} items ({product_count[0]} products) into "
+        f"{vector_store_dir.name} in {stats['seconds']:.1f}s ({stats['items_per_second']:.1f} items/s)"
     )
+    return {
+        "mode": "full",
+        "status": "success",
+        "vector_store_dir": str(vector_store_dir),
+        "upserted": int(stats["items"]),
+        "deleted": 0,
+        "seconds": round(stats["seconds"], 3),
+        "items_per_second": round(stats["items_per_second"], 1),
+    }
+
+def delta_sync(
+    vector_store_dir: Path,
+    training_json: Path,
+    state: Dict[str, Any],
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> Dict[str, Any]:
+    """
+    Re-embed only the documents that changed since the last sync.
+
+    Changes are found by comparing content hashes. If the products table
+    has an updated_at column, only rows touched since the last watermark
+    are fetched; deletions are found from the (cheap) list of product IDs.
+    """
+    watermark = state.get("watermark")
+    hashes: Dict[str, str] = dict(state.get("hashes", {}))
+
+    # 1. Find what changed
+    products = fetch_products(since=watermark)
+    if watermark is None:
+        product_ids = [str(row.get("id", "")) for row in products]
+    else:
+        product_ids = fetch_product_ids()
+    if not product_ids:
+        # An empty catalog almost always means MySQL is down; never wipe the store for it
+        print("❌ No products found in MySQL! Make sure XAMPP is running.")
+        return {"mode": "delta", "status": "error", "message": "No products found in MySQL"}
+
+    candidates = products_to_documents(products) + load_training_data(training_json)
+    changed = [doc for doc in candidates if hashes.get(document_id(doc)) != document_hash(doc)]
+
+    live_ids = {f"{PRODUCT_ID_PREFIX}{product_id}" for product_id in product_ids}
+    live_ids.update(doc.metadata["id"] for doc in candidates if doc.metadata.get("type") != "product")
+    removed = [doc_id for doc_id in hashes if doc_id not in live_ids]
+
+    # 2. Embed and upsert only those
+    if changed or removed:
+        vector_store = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=get_embeddings(embedding_cache),
+            persist_directory=str(vector_store_dir)
+        )
+        if changed:
+            vector_store.add_documents(changed, ids=[document_id(doc) for doc in changed])
+        if removed:
+            vector_store.delete(ids=removed)
+
+    for doc in changed:
+        hashes[document_id(doc)] = document_hash(doc)
+    for doc_id in removed:
+        del hashes[doc_id]
+    save_sync_state(vector_store_dir / SYNC_STATE_FILE, hashes, latest_updated_at(products, watermark))
+
+    # Lets the API drop cached answers that mention these products
+    changed_product_ids = [doc.metadata["id"] for doc in changed if doc.metadata.get("type") == "product"]
+    changed_product_ids += [
+        doc_id[len(PRODUCT_ID_PREFIX):] for doc_id in removed if doc_id.startswith(PRODUCT_ID_PREFIX)
+    ]
+
+    print(f"✅ Delta sync: {len(changed)} upserted, {len(removed)} deleted.")
+    return {
+        "mode": "delta",
+        "status": "success",
+        "vector_store_dir": str(vector_store_dir),
+        "upserted": len(changed),
+        "deleted": len(removed),
+        "changed_product_ids": changed_product_ids,
+    }
+
+def main(
+    full: bool = False,
+    batch_size: int = BATCH_SIZE,
+    workers: int = EMBED_WORKERS,
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> Dict[str, Any]:
+    """
+    Sync the vector store with MySQL and the training data.
+
+    Args:
+        full: Rebuild everything instead of syncing only what changed.
+              A full rebuild also happens when there is no previous sync.
+        batch_size: Rows read and embedded per batch (full rebuild)
+        workers: Concurrent embedding workers (full rebuild)
+        embedding_cache: Persistent cache for document embeddings, e.g. the
+                         one the API embeds queries with
+
+    Returns:
+        Summary with the mode used, the live vector_store_dir and the
+        number of upserted/deleted items
+    """
+    base_dir = Path(__file__).parent.parent
     
-    print(f"✅ Success! Ingested {len(all_docs)} items into {VECTOR_STORE_PATH}")
+    # 1. Setup Paths
+    persist_dir = base_dir / VECTOR_STORE_PATH
+    vector_store_dir = Path(current_store_dir(str(persist_dir)))
+    training_json = base_dir / "src" / "chat" / "training_data.json"
+
+    state = None if full else load_sync_state(vector_store_dir / SYNC_STATE_FILE)
+    if state is None:
+        return full_rebuild(
+            persist_dir, training_json, batch_size=batch_size, workers=workers, embedding_cache=embedding_cache
+        )
+    return delta_sync(vector_store_dir, training_json, state, embedding_cache=embedding_cache)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync products and training data into the vector store")
+    parser.add_argument("--full", action="store_true", help="Rebuild the whole vector store")
+    parser.add_argument("--sqlite", help="Read products from this SQLite file instead of MySQL")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per batch (full rebuild)")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="Embedding workers (full rebuild)")
+    args = parser.parse_args()
+    if args.sqlite:
+        os.environ[SQLITE_PATH_ENV] = args.sqlite
+    main(
+        full=args.full,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        embedding_cache=load_embedding_cache(Path(__file__).parent.parent)
+    )
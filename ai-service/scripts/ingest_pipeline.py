@@ -0,0 +1,153 @@
+"""
+Staged streaming pipeline for full vector store rebuilds.
+
+    reader (cursor batches) -> bounded queue -> N embedding workers
+                            -> bounded queue -> writer (batched upserts)
+
+Only a handful of batches are ever in flight, so peak memory depends on
+the batch size and queue size, not on how big the catalog is.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_DONE = object()
+
+
+def run_pipeline(
+    batches: Iterable[List[Any]],
+    embed: Callable[[List[Any]], List[List[float]]],
+    write: Callable[[List[Any], List[List[float]]], None],
+    workers: int = 4,
+    queue_size: Optional[int] = None,
+    on_progress: Optional[Callable[[Dict[str, float]], None]] = None,
+    progress_interval: float = 2.0,
+) -> Dict[str, float]:
+    """
+    Stream batches through concurrent embedding workers into a writer.
+
+    Args:
+        batches: Iterable of item batches; consumed lazily in a reader thread
+        embed: Turns a batch into one vector per item (called from worker threads)
+        write: Stores a batch with its vectors (called from the calling thread only)
+        workers: Number of concurrent embedding workers
+        queue_size: Max batches waiting in each queue (default: 2 * workers)
+        on_progress: Called with the running stats at most every progress_interval seconds
+        progress_interval: Seconds between progress reports
+
+    Returns:
+        Stats: items, batches, seconds, items_per_second, embed_seconds
+        (summed over workers) and write_seconds
+
+    Raises:
+        The first exception raised by the reader, a worker or the writer
+    """
+    workers = max(1, int(workers))
+    queue_size = queue_size or 2 * workers
+    to_embed: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    to_write: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+    stats = {"items": 0, "batches": 0, "seconds": 0.0, "items_per_second": 0.0,
+             "embed_seconds": 0.0, "write_seconds": 0.0}
+
+    def fail(error: BaseException):
+        errors.append(error)
+        stop.set()
+
+    def put(q: "queue.Queue", item) -> bool:
+        # Blocks while the queue is full (backpressure) unless the pipeline stops
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: "queue.Queue"):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def read():
+        try:
+            for batch in batches:
+                if batch and not put(to_embed, batch):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            for _ in range(workers):
+                put(to_embed, _DONE)
+
+    def embed_worker():
+        try:
+            while True:
+                batch = get(to_embed)
+                if batch is _DONE:
+                    break
+                started = time.perf_counter()
+                vectors = embed(batch)
+                with lock:
+                    stats["embed_seconds"] += time.perf_counter() - started
+                if not put(to_write, (batch, vectors)):
+                    break
+        except BaseException as e:
+            fail(e)
+        finally:
+            put(to_write, _DONE)
+
+    threads = [threading.Thread(target=read, name="ingest-reader", daemon=True)]
+    threads += [
+        threading.Thread(target=embed_worker, name=f"ingest-embed-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    last_report = started
+    for thread in threads:
+        thread.start()
+
+    # Writer stage runs here so the store is only touched from one thread
+    finished_workers = 0
+    try:
+        while finished_workers < workers:
+            item = get(to_write)
+            if item is _DONE:
+                if stop.is_set():
+                    break
+                finished_workers += 1
+                continue
+            batch, vectors = item
+            write_started = time.perf_counter()
+            write(batch, vectors)
+            now = time.perf_counter()
+            stats["write_seconds"] += now - write_started
+            stats["items"] += len(batch)
+            stats["batches"] += 1
+            if on_progress is not None and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(_with_rate(stats, now - started))
+    except BaseException as e:
+        fail(e)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return _with_rate(stats, time.perf_counter() - started)
+
+
+def _with_rate(stats: Dict[str, float], seconds: float) -> Dict[str, float]:
+    result = dict(stats)
+    result["seconds"] = seconds
+    result["items_per_second"] = stats["items"] / seconds if seconds > 0 else 0.0
+    return result
@@ -0,0 +1,224 @@
+"""
+Stub Ollama servers for exercising multi-host routing locally.
+
+Each server imitates the parts of Ollama's HTTP API the assistant uses:
+
+    GET  /api/version, /api/tags      health checks
+    POST /api/embed                   deterministic "hash" embeddings
+    POST /api/generate                echo answers, streamed (NDJSON) or not,
+                                      with a growing `context` token array
+
+Latency and failures can be injected per server, so load balancing,
+circuit breaking and failover can be observed without a GPU:
+
+    python scripts/stub_ollama.py --hosts 3 --port 11500 --latency 0.2 \\
+        --fail-rate 0.0,0.0,0.5
+
+    # then point the assistant at them:
+    llm:
+      base_url: ["http://127.0.0.1:11500", "http://127.0.0.1:11501", "http://127.0.0.1:11502"]
+
+From Python (e.g. a throwaway script), StubOllamaServer can be started
+in-process and its latency / fail_rate / down attributes changed while
+it runs.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Make `src` importable when run directly as `python scripts/stub_ollama.py`
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.embeddings import EmbeddingModel
+
+
+class StubOllamaServer:
+    """One fake Ollama host on 127.0.0.1, served from a background thread."""
+
+    def __init__(
+        self,
+        port: int = 0,
+        name: Optional[str] = None,
+        latency: float = 0.0,
+        fail_rate: float = 0.0,
+        dimension: int = 384,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize stub server (call start() to serve).
+
+        Args:
+            port: Port to listen on (0 = pick a free one)
+            name: Tag put in front of generated answers (default "stub:<port>")
+            latency: Seconds added to every embed / generate request
+            fail_rate: Fraction of embed / generate requests answered with HTTP 500
+            dimension: Embedding size
+            seed: Seed for the failure injection
+        """
+        self.latency = latency
+        self.fail_rate = fail_rate
+        # While True every request, health checks included, gets HTTP 503
+        self.down = False
+        self.requests: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._embedder = EmbeddingModel(provider="hash", dimension=dimension)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.name = name or f"stub:{self.port}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, path: str):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.fail_rate
+
+    def embed(self, body: Dict) -> Dict:
+        texts = body.get("input", "")
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        vectors = self._embedder.embed_batch(texts) if texts else []
+        return {"model": body.get("model"), "embeddings": [list(map(float, vector)) for vector in vectors]}
+
+    def generate_parts(self, body: Dict) -> List[Dict]:
+        """The answer as a list of stream chunks; the last one carries the context."""
+        prompt = body.get("prompt", "")
+        words = [f"[{self.name}]"] + prompt.split()[-8:]
+        # Stand-in token IDs: one per prompt word and answer word
+        context = list(body.get("context") or []) + list(range(len(prompt.split()) + len(words)))
+        parts = [
+            {"model": body.get("model"), "response": word + " ", "done": False}
+            for word in words
+        ]
+        parts.append({
+            "model": body.get("model"),
+            "response": "",
+            "done": True,
+            "done_reason": "stop",
+            "context": context,
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": len(words),
+        })
+        return parts
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                server._count(self.path)
+                if server.down:
+                    self._send_json(503, {"error": "host is down"})
+                elif self.path == "/api/version":
+                    self._send_json(200, {"version": "0.0.0-stub"})
+                elif self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": "llama3.2"}, {"name": "mxbai-embed-large"}]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                server._count(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if server.down:
+                    self._send_json(503, {"error": "host is down"})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    self._send_json(500, {"error": f"injected failure on {server.name}"})
+                    return
+
+                if self.path == "/api/embed":
+                    self._send_json(200, server.embed(body))
+                elif self.path == "/api/generate":
+                    parts = server.generate_parts(body)
+                    if body.get("stream", True):
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.end_headers()
+                        for part in parts:
+                            self.wfile.write((json.dumps(part) + "\n").encode("utf-8"))
+                            self.wfile.flush()
+                    else:
+                        final = dict(parts[-1])
+                        final["response"] = "".join(part["response"] for part in parts)
+                        self._send_json(200, final)
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+        return Handler
+
+
+def _per_host(values: str, count: int) -> List[float]:
+    """'0.1' -> [0.1] * count; '0,0,0.5' -> one value per host."""
+    parsed = [float(value) for value in values.split(",")]
+    return parsed * count if len(parsed) == 1 else parsed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run stub Ollama servers for load balancing and failover tests.")
+    parser.add_argument("--hosts", type=int, default=2, help="Number of servers")
+    parser.add_argument("--port", type=int, default=11500, help="Port of the first server (the rest follow)")
+    parser.add_argument("--latency", default="0", help="Seconds per request, one value or one per host")
+    parser.add_argument("--fail-rate", default="0", help="Fraction of failed requests, one value or one per host")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    args = parser.parse_args(argv)
+
+    latencies = _per_host(args.latency, args.hosts)
+    fail_rates = _per_host(args.fail_rate, args.hosts)
+    if len(latencies) != args.hosts or len(fail_rates) != args.hosts:
+        parser.error("--latency and --fail-rate take one value or one per host")
+
+    servers = [
+        StubOllamaServer(
+            port=args.port + i,
+            latency=latencies[i],
+            fail_rate=fail_rates[i],
+            dimension=args.dim,
+            seed=i,
+        ).start()
+        for i in range(args.hosts)
+    ]
+    for server in servers:
+        print(f"✅ {server.name} on {server.url} (latency {server.latency}s, fail rate {server.fail_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+"""
+Intent router for the Store Assistant.
+
+Many turns ("is X in stock", "price of X", "show me rings", "my order
+status", "salam") can be answered straight from the catalog and order
+data. The router classifies a message with precompiled patterns first and,
+if none match, with nearest-centroid matching against embedded example
+utterances. Routable intents get a templated Roman Urdu reply; everything
+else (and anything the router is unsure about) still goes to the LLM.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import re
+import threading
+
+import numpy as np
+
+from ..orders.order_manager import OrderManager
+from ..products.product_manager import ProductManager
+
+GREETING = "greeting"
+PRICE = "price"
+STOCK = "stock"
+BROWSE = "browse"
+ORDER_STATUS = "order_status"
+# Centroid class for open questions, so they aren't forced into an intent
+OTHER = "other"
+
+_GREETING = re.compile(r"^\s*(hi+|hello|hey|salam|assalam\w*|aoa|start)\b", re.IGNORECASE)
+_ORDER_ID = re.compile(r"\bORD-\d{8}-\d{4}\b", re.IGNORECASE)
+_PHONE = re.compile(r"\+?\d[\d\s-]{8,}\d")
+_ORDER_STATUS = re.compile(
+    r"\b(my|mera|meri|mere)\s+(order|parcel)\b"
+    r"|\b(order|parcel|delivery|shipment)\b.*\b(status|kahan|kahaan|where|track|kab|pohanch\w*|arrive\w*)\b"
+    r"|\b(track|status)\b.*\b(order|parcel)\b",
+    re.IGNORECASE,
+)
+_PURCHASE = re.compile(
+    r"\b(buy|purchase|khareed\w*|lena hai|leni hai|add to cart|checkout|place (?:an |my )?order|order (?:karna|kar|karni))\b",
+    re.IGNORECASE,
+)
+_PRICE = re.compile(
+    r"\b(price|prices|cost|rate|qeemat|keemat|how much|kitna|kitne\s+(?:ka|ki|ke|mein|main|may))\b",
+    re.IGNORECASE,
+)
+_STOCK = re.compile(
+    r"\b(in stock|stock|available|availability|milega|milegi|mil (?:jaye|jayega|jayegi|sakta|sakti))\b",
+    re.IGNORECASE,
+)
+_BROWSE = re.compile(
+    r"\b(show|dikhao|dikhaen|dikhayen|dikha do|browse|collection|list)\b",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Words that never identify a product on their own
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "is", "are", "me", "my", "i", "you", "your", "it", "this", "that",
+    "in", "on", "and", "or", "do", "does", "what", "which", "please", "plz", "show", "price", "stock",
+    "available", "ka", "ki", "ke", "hai", "hain", "kya", "ye", "yeh", "wo", "woh", "mujhe", "aap",
+    "apke", "apki", "mein", "main", "se", "ko", "bhi", "kitne", "kitna", "new", "all",
+}
+
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    GREETING: [
+        "hi", "hello there", "assalam o alaikum", "salam", "hey", "good morning",
+    ],
+    PRICE: [
+        "what is the price of the gold ring", "how much does this bracelet cost",
+        "is ring ki price kya hai", "ye necklace kitne ka hai", "earrings ka rate batao",
+        "silver chain ki qeemat",
+    ],
+    STOCK: [
+        "is the gold ring in stock", "do you have this bracelet available",
+        "kya ye ring available hai", "necklace stock mein hai", "ye earrings mil jayengi",
+        "is it sold out",
+    ],
+    BROWSE: [
+        "show me rings", "i want to see your bracelets", "rings dikhao",
+        "necklaces ki collection dikhayen", "what earrings do you have", "browse all bangles",
+    ],
+    ORDER_STATUS: [
+        "where is my order", "what is the status of my order", "mera order kahan hai",
+        "mera parcel kab aayega", "track my delivery", "order status batayen",
+    ],
+    OTHER: [
+        "which ring would suit a wedding", "suggest a gift for my wife", "what is your return policy",
+        "kya ye gold plated hai", "do you deliver to lahore", "how do i take care of silver jewellery",
+        "mujhe koi acha sa tohfa suggest karein", "what payment methods do you accept",
+    ],
+}
+
+ORDER_STATUS_TEXT = {
+    "pending": "pending hai (abhi confirm hona baqi hai)",
+    "confirmed": "confirm ho chuka hai ✅",
+    "processing": "tayyar ho raha hai 📦",
+    "shipped": "ship ho chuka hai 🚚, jald aap tak pohanch jayega",
+    "delivered": "deliver ho chuka hai ✅",
+    "cancelled": "cancel ho chuka hai ❌",
+}
+
+
+@dataclass
+class Intent:
+    """A classified message."""
+    name: str
+    confidence: float
+    # "pattern" or "centroid"
+    source: str
+
+
+def _stem(word: str) -> str:
+    """Crude singular form so "rings" matches "Ring" and "watches" matches "Watch"."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxhz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall(text or "")]
+
+
+def format_price(price) -> str:
+    """1500 -> "1,500"; 1499.5 -> "1,499.50"."""
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return str(price)
+    return f"{price:,.0f}" if price.is_integer() else f"{price:,.2f}"
+
+
+class IntentRouter:
+    """Pattern + nearest-centroid intent classifier with templated replies.
+
+    Example utterances are embedded once (one embed_batch call) and
+    averaged into one normalized centroid per intent, so classifying a
+    message the patterns missed costs one embedding and a tiny matrix-vector
+    product. Catalog lookups use an inverted index over product name words.
+    """
+
+    def __init__(
+        self,
+        product_manager: ProductManager,
+        order_manager: Optional[OrderManager] = None,
+        embedding_model=None,
+        similarity_threshold: float = 0.7,
+        margin: float = 0.05,
+        examples: Optional[Dict[str, List[str]]] = None,
+    ):
+        """
+        Initialize intent router.
+
+        Args:
+            product_manager: Catalog the replies are built from
+            order_manager: Orders for status questions (skipped if None)
+            embedding_model: EmbeddingModel for centroid matching; patterns
+                             only if None
+            similarity_threshold: Minimum cosine similarity to the best centroid
+            margin: Required lead of the best centroid over the runner-up
+            examples: Example utterances per intent (default DEFAULT_EXAMPLES);
+                      include an "other" class for questions the LLM should get
+        """
+        self.product_manager = product_manager
+        self.order_manager = order_manager
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.margin = margin
+        self.examples = examples or DEFAULT_EXAMPLES
+        self._lock = threading.Lock()
+        self._centroid_names: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        # Embeddings computed for routing, reused by the response cache
+        self._recent_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._index_key = None
+        self._name_words: List[set] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._categories: Dict[str, str] = {}
+        self._counters: Dict[str, int] = {"pattern": 0, "centroid": 0, "unrouted": 0}
+
+    # Classification
+
+    def classify(self, text: str) -> Optional[Intent]:
+        """
+        Classify a message.
+
+        Returns:
+            The intent, or None if the message should go to the LLM
+        """
+        intent = self._match_patterns(text)
+        if intent is None and not _PURCHASE.search(text or "") and self._can_embed():
+            try:
+                self._ensure_centroids()
+                intent = self._nearest_centroid(text, self._embed(text))
+            except Exception as e:
+                print(f"Warning: Intent centroid matching failed: {e}")
+        return self._count(intent)
+
+    async def aclassify(self, text: str) -> Optional[Intent]:
+        """Async version of classify (embedding calls are awaited)."""
+        intent = self._match_patterns(text)
+        if intent is None and not _PURCHASE.search(text or "") and self._can_embed():
+            try:
+                await self._aensure_centroids()
+                intent = self._nearest_centroid(text, await self._aembed(text))
+            except Exception as e:
+                print(f"Warning: Intent centroid matching failed: {e}")
+        return self._count(intent)
+
+    def _match_patterns(self, text: str) -> Optional[Intent]:
+        text = text or ""
+        # Order status first: "mera order kahan hai" also contains "order"
+        if _ORDER_ID.search(text) or _ORDER_STATUS.search(text):
+            return Intent(ORDER_STATUS, 1.0, "pattern")
+        if _GREETING.match(text) and len(text.split()) < 3:
+            return Intent(GREETING, 1.0, "pattern")
+        # Buying goes through the ordering flow / LLM, never a canned reply
+        if _PURCHASE.search(text):
+            return None
+        if _PRICE.search(text):
+            return Intent(PRICE, 1.0, "pattern")
+        if _STOCK.search(text):
+            return Intent(STOCK, 1.0, "pattern")
+        if _BROWSE.search(text):
+            return Intent(BROWSE, 1.0, "pattern")
+        return None
+
+    def _nearest_centroid(self, text: str, embedding: np.ndarray) -> Optional[Intent]:
+        if self._centroids is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0 or vector.shape[0] != self._centroids.shape[1]:
+            return None
+        similarities = self._centroids @ (vector / norm)
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        runner_up = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        name = self._centroid_names[order[0]]
+        if name == OTHER or best < self.similarity_threshold or best - runner_up < self.margin:
+            return None
+        # Short greetings only; "hello, is the ring in stock?" is not one
+        if name == GREETING and len(text.split()) >= 3:
+            return None
+        return Intent(name, best, "centroid")
+
+    def _can_embed(self) -> bool:
+        return self.embedding_model is not None and bool(self.examples)
+
+    def _ensure_centroids(self):
+        if self._centroids is not None:
+            return
+        names, texts = self._example_texts()
+        self._set_centroids(names, self.embedding_model.embed_batch(texts))
+
+    async def _aensure_centroids(self):
+        if self._centroids is not None:
+            return
+        names, texts = self._example_texts()
+        self._set_centroids(names, await self.embedding_model.aembed_batch(texts))
+
+    def _example_texts(self):
+        names, texts = [], []
+        for name, utterances in self.examples.items():
+            for utterance in utterances:
+                names.append(name)
+                texts.append(utterance)
+        return names, texts
+
+    def _set_centroids(self, names: List[str], embeddings: np.ndarray):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+        labels = list(dict.fromkeys(names))
+        label_rows = np.asarray([labels.index(name) for name in names])
+        centroids = np.stack([embeddings[label_rows == i].mean(axis=0) for i in range(len(labels))])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        with self._lock:
+            self._centroid_names = labels
+            self._centroids = centroids / np.where(norms > 0, norms, 1.0)
+
+    def _embed(self, text: str) -> np.ndarray:
+        embedding = self.embedding_model.embed_text(text)
+        self._remember_embedding(text, embedding)
+        return embedding
+
+    async def _aembed(self, text: str) -> np.ndarray:
+        embedding = await self.embedding_model.aembed_text(text)
+        self._remember_embedding(text, embedding)
+        return embedding
+
+    def _remember_embedding(self, text: str, embedding: np.ndarray):
+        with self._lock:
+            self._recent_embeddings[text] = embedding
+            self._recent_embeddings.move_to_end(text)
+            while len(self._recent_embeddings) > 64:
+                self._recent_embeddings.popitem(last=False)
+
+    def cached_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Embedding of text if routing computed it recently, else None."""
+        with self._lock:
+            return self._recent_embeddings.get(text)
+
+    def _count(self, intent: Optional[Intent]) -> Optional[Intent]:
+        with self._lock:
+            self._counters[intent.source if intent else "unrouted"] += 1
+        return intent
+
+    # Templated replies
+
+    def answer(self, intent: Intent, text: str, session_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Answer a classified message from catalog / order data.
+
+        Args:
+            intent: Result of classify / aclassify
+            text: The message
+            session_id: Per-client session ID of the requester (None if the
+                        client is anonymous); order details are only given
+                        for orders of this session or customer
+
+        Returns:
+            {"response", "products", "action"}, or None if the data needed
+            isn't there (e.g. no product matched) and the LLM should answer
+        """
+        if intent.name == ORDER_STATUS:
+            return self._answer_order_status(text, session_id)
+        if intent.name == PRICE:
+            return self._answer_price(self.match_products(text))
+        if intent.name == STOCK:
+            return self._answer_stock(self.match_products(text))
+        if intent.name == BROWSE:
+            return self._answer_browse(text)
+        return None
+
+    def _answer_price(self, products: List[Dict]) -> Optional[Dict]:
+        if not products:
+            return None
+        if len(products) == 1:
+            product = products[0]
+            lines = [f"**{product.get('name')}**", f"🏷️ Price: {format_price(product.get('price', 0))} PKR"]
+            lines.append(self._stock_line(product))
+            return self._reply("\n".join(lines), products)
+        lines = ["Ye rahi prices:"]
+        lines += [
+            f"• **{product.get('name')}** — {format_price(product.get('price', 0))} PKR"
+            for product in products[:5]
+        ]
+        return self._reply("\n".join(lines), products)
+
+    def _answer_stock(self, products: List[Dict]) -> Optional[Dict]:
+        if not products:
+            return None
+        if len(products) == 1:
+            product = products[0]
+            if self._in_stock(product):
+                response = (
+                    f"Ji haan, **{product.get('name')}** stock mein available hai "
+                    f"({product.get('stock')} pieces). 🏷️ Price: {format_price(product.get('price', 0))} PKR"
+                )
+                return self._reply(response, products)
+            alternatives = [
+                p for p in self.product_manager.search_products(category=product.get('category'))
+                if self._in_stock(p) and p.get('id') != product.get('id')
+            ][:3]
+            response = f"Maaf kijiye, **{product.get('name')}** filhal out of stock hai. 😔"
+            if alternatives:
+                response += "\nLekin ye available hain:\n" + "\n".join(
+                    f"• **{p.get('name')}** — {format_price(p.get('price', 0))} PKR" for p in alternatives
+                )
+            return self._reply(response, [product] + alternatives)
+        lines = ["Stock ki details:"]
+        lines += [f"• **{product.get('name')}** — {self._stock_line(product)}" for product in products[:5]]
+        return self._reply("\n".join(lines), products)
+
+    def _answer_browse(self, text: str) -> Optional[Dict]:
+        category = self.match_category(text)
+        if category is not None:
+            products = self.product_manager.search_products(category=category)
+            title = f"Ye rahi humari **{category}** collection:"
+        else:
+            products = self.match_products(text)
+            title = "Ye products aapke liye:"
+        if not products:
+            return None
+        # In-stock items first, then catalog order
+        products = sorted(products, key=lambda p: not self._in_stock(p))[:5]
+        lines = [title] + [
+            f"• **{p.get('name')}** — {format_price(p.get('price', 0))} PKR"
+            + ("" if self._in_stock(p) else " (out of stock)")
+            for p in products
+        ]
+        lines.append("Kisi ki details chahiye to bata dein!")
+        return self._reply("\n".join(lines), products)
+
+    def _answer_order_status(self, text: str, session_id: Optional[str] = None) -> Optional[Dict]:
+        match = _ORDER_ID.search(text or "")
+        if match is None:
+            return {
+                "response": (
+                    "Apna order ID aur order wala phone number bata dein (jaise ORD-20250101-0001, 03001234567), "
+                    "main status check kar deti hoon."
+                ),
+                "products": [],
+                "action": None,
+            }
+        if self.order_manager is None:
+            return None
+        order_id = match.group(0).upper()
+        order = self.order_manager.get_order(order_id)
+        # Order IDs are sequential, so an ID alone doesn't prove the order is
+        # the requester's; unknown and foreign orders look the same
+        if order is None or not self._owns_order(order, text, session_id):
+            return None
+        status = ORDER_STATUS_TEXT.get(str(order.status).lower(), str(order.status))
+        response = f"Aapka order **{order_id}** {status}."
+        return {"response": response, "products": [], "action": None}
+
+    @staticmethod
+    def _owns_order(order, text: str, session_id: Optional[str]) -> bool:
+        """Placed in this chat session, or the message gives the order's phone number."""
+        if session_id is not None and getattr(order, "session_id", None) == session_id:
+            return True
+        phone = re.sub(r"\D", "", order.phone_number or "")
+        if len(phone) < 10:
+            return False
+        # Compare the last 10 digits, so "+92 300..." matches "0300..."
+        given = (re.sub(r"\D", "", candidate) for candidate in _PHONE.findall(_ORDER_ID.sub(" ", text)))
+        return any(len(digits) >= 10 and digits[-10:] == phone[-10:] for digits in given)
+
+    @staticmethod
+    def _in_stock(product: Dict) -> bool:
+        try:
+            return int(product.get('stock') or 0) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def _stock_line(self, product: Dict) -> str:
+        return "✅ Stock mein available hai" if self._in_stock(product) else "❌ Filhal out of stock hai"
+
+    @staticmethod
+    def _reply(response: str, products: List[Dict]) -> Dict:
+        return {"response": response, "products": products[:5], "action": "DISPLAY_PRODUCTS"}
+
+    # Catalog lookups
+
+    def refresh(self):
+        """Rebuild the product name index (call after the catalog changes)."""
+        products = self.product_manager.products
+        postings: Dict[str, List[int]] = {}
+        name_words = []
+        for i, product in enumerate(products):
+            words = {word for word in _words(str(product.get('name', ''))) if word not in _STOPWORDS}
+            name_words.append(words)
+            for word in words:
+                postings.setdefault(word, []).append(i)
+        categories = {}
+        for category in self.product_manager.get_categories():
+            key = " ".join(_words(category))
+            if key:
+                categories[key] = category
+        with self._lock:
+            self._name_words = name_words
+            self._postings = postings
+            self._categories = categories
+            self._index_key = (id(products), len(products))
+
+    def _ensure_index(self):
+        products = self.product_manager.products
+        if self._index_key != (id(products), len(products)):
+            self.refresh()
+
+    def match_products(self, text: str) -> List[Dict]:
+        """
+        Products whose names best match the message.
+
+        A product matches if at least half of its name words appear in the
+        message; only the best scoring products are returned.
+        """
+        self._ensure_index()
+        words = set(_words(text)) - _STOPWORDS
+        hits: Dict[int, int] = {}
+        for word in words:
+            for i in self._postings.get(word, ()):
+                hits[i] = hits.get(i, 0) + 1
+        if not hits:
+            return []
+        scores = {i: count / max(1, len(self._name_words[i])) for i, count in hits.items()}
+        best = max(scores.values())
+        if best < 0.5:
+            return []
+        products = self.product_manager.products
+        return [products[i] for i in sorted(scores) if scores[i] == best and i < len(products)]
+
+    def match_category(self, text: str) -> Optional[str]:
+        """Catalog category mentioned in the message, if any (longest name wins)."""
+        self._ensure_index()
+        message = " " + " ".join(_words(text)) + " "
+        for key in sorted(self._categories, key=len, reverse=True):
+            if f" {key} " in message:
+                return self._categories[key]
+        return None
+
+    def stats(self) -> Dict:
+        """Get classification counters (pattern, centroid, unrouted)."""
+        with self._lock:
+            return dict(self._counters)
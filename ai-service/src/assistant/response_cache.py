@@ -0,0 +1,230 @@
+"""
+Semantic response cache for the Store Assistant.
+Questions that are paraphrases of an earlier question (cosine similarity of
+their embeddings above a threshold) reuse the earlier LLM answer instead of
+generating a new one.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+import threading
+
+import numpy as np
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+class SemanticResponseCache:
+    """Nearest-neighbour cache of (query embedding -> response, product IDs).
+
+    Embeddings live in one preallocated matrix so a lookup is a single
+    matrix-vector product. Every entry remembers the products its answer was
+    based on, and is dropped as soon as any of them changes. Entries are
+    evicted least recently used first once the entry or byte budget is hit.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+    ):
+        """
+        Initialize response cache.
+
+        Args:
+            similarity_threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum number of cached responses
+            max_bytes: Approximate upper bound on memory used by entries
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._row_entry: List[int] = []
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._by_product: Dict[str, Set[int]] = {}
+        self._bytes = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _numbers(query: str) -> Tuple[str, ...]:
+        # "rings under 2000" and "rings under 5000" embed almost identically
+        return tuple(_NUMBER.findall(query or ""))
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query: str, embedding: np.ndarray) -> Optional[Dict]:
+        """
+        Find a cached answer for a paraphrase of query.
+
+        Args:
+            query: Query text (numbers in it must match the cached query's)
+            embedding: Query embedding
+
+        Returns:
+            {"response", "product_ids", "similarity"} or None on a miss
+        """
+        vector = self._normalize(embedding)
+        numbers = self._numbers(query)
+        with self._lock:
+            rows = len(self._row_entry)
+            if rows == 0 or self._vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+            similarities = self._vectors[:rows] @ vector
+            # Best candidates first; numbers rarely differ, so this is short
+            for row in np.argsort(-similarities):
+                similarity = float(similarities[row])
+                if similarity < self.similarity_threshold:
+                    break
+                entry_id = self._row_entry[row]
+                entry = self._entries[entry_id]
+                if entry["numbers"] != numbers:
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return {
+                    "response": entry["response"],
+                    "product_ids": list(entry["product_ids"]),
+                    "similarity": similarity,
+                }
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query: str,
+        embedding: np.ndarray,
+        response: str,
+        product_ids: List[str],
+        referenced_ids: Iterable[str] = (),
+    ):
+        """
+        Cache a response.
+
+        Args:
+            query: Query text
+            embedding: Query embedding
+            response: Generated response text
+            product_ids: Products shown with the response (resolved fresh on a hit)
+            referenced_ids: Other products whose data went into the response
+        """
+        vector = self._normalize(embedding)
+        # Card IDs keep their original type so the catalog can resolve them
+        product_ids = list(product_ids)
+        referenced = {str(pid) for pid in product_ids} | {str(pid) for pid in referenced_ids}
+        nbytes = vector.nbytes + len(response.encode("utf-8")) + 64 * (len(referenced) + 4)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._reset(vector.shape[0])
+            while self._entries and (
+                len(self._entries) >= self.max_entries or self._bytes + nbytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+            entry_id = self._next_id
+            self._next_id += 1
+            row = len(self._row_entry)
+            self._vectors[row] = vector
+            self._row_entry.append(entry_id)
+            self._entries[entry_id] = {
+                "row": row,
+                "numbers": self._numbers(query),
+                "response": response,
+                "product_ids": product_ids,
+                "referenced": referenced,
+                "bytes": nbytes,
+            }
+            for pid in referenced:
+                self._by_product.setdefault(pid, set()).add(entry_id)
+            self._bytes += nbytes
+
+    def invalidate_products(self, product_ids: Iterable[str]) -> int:
+        """
+        Drop every response that was based on any of the given products.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            for pid in {str(pid) for pid in product_ids}:
+                for entry_id in list(self._by_product.get(pid, ())):
+                    if entry_id in self._entries:
+                        self._remove(entry_id)
+                        removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            dimension = self._vectors.shape[1] if self._vectors is not None else None
+            self._vectors = None
+            if dimension is not None:
+                self._reset(dimension)
+
+    def _reset(self, dimension: int):
+        self._vectors = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        self._row_entry = []
+        self._entries.clear()
+        self._by_product.clear()
+        self._bytes = 0
+
+    def _remove(self, entry_id: int):
+        """Remove an entry, moving the last matrix row into its slot."""
+        entry = self._entries.pop(entry_id)
+        row = entry["row"]
+        last = len(self._row_entry) - 1
+        if row != last:
+            moved_id = self._row_entry[last]
+            self._vectors[row] = self._vectors[last]
+            self._row_entry[row] = moved_id
+            self._entries[moved_id]["row"] = row
+        self._row_entry.pop()
+        for pid in entry["referenced"]:
+            ids = self._by_product.get(pid)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_product[pid]
+        self._bytes -= entry["bytes"]
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and size information."""
+        with self._lock:
+            entries = len(self._entries)
+            nbytes = self._bytes
+            matrix_bytes = int(self._vectors.nbytes) if self._vectors is not None else 0
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": entries,
+            "bytes": nbytes,
+            "matrix_bytes": matrix_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -2,21 +2,36 @@
 Main Store Assistant that integrates RAG, fine-tuning, and all components.
 """
 
-from typing import Optional, Dict, List
+from contextlib import nullcontext
+from typing import Optional, Dict, Iterator, List, Tuple
+import hashlib
+import json
 import re
+import threading
 
 # NOTE: If you get import errors, ensure these paths exist. 
+from ..rag.diversity import dedupe_by_product, product_key
 from ..rag.retrieval import RetrievalSystem
 from ..models.llm_handler import LLMHandler
+from ..models.scheduler import PRIORITY_BROWSE, PRIORITY_CHECKOUT, GenerationScheduler
 from ..products.product_manager import ProductManager
 from ..orders.order_manager import OrderManager
 from ..orders.order_schema import Order, OrderItem, OrderStatus
 from ..audio.text_to_speech import TextToSpeech
 from .conversation_manager import ConversationManager, ConversationState
+from .intent_router import GREETING, Intent, IntentRouter
+from .response_cache import SemanticResponseCache
 
 
 class StoreAssistant:
     """Main Store Assistant AI agent."""
+
+    # Vector store ID prefix for documents indexed from the product catalog
+    PRODUCT_DOC_PREFIX = "product_"
+    # Session IDs shared by many clients (the API's default); their turns
+    # never continue an LLM context or see orders placed under the same ID,
+    # or one chat would leak into another
+    SHARED_SESSION_IDS = frozenset({"guest"})
     
     def __init__(
         self,
@@ -26,7 +41,10 @@ class StoreAssistant:
         order_manager: Optional[OrderManager] = None,
         tts: Optional[TextToSpeech] = None,
         use_rag: bool = True,
-        store_name: str = "our store"  # <--- 1. NEW VARIABLE (Change default name here)
+        store_name: str = "our store",  # <--- 1. NEW VARIABLE (Change default name here)
+        response_cache: Optional[SemanticResponseCache] = None,
+        generation_scheduler: Optional[GenerationScheduler] = None,
+        intent_router: Optional[IntentRouter] = None
     ):
         self.llm_handler = llm_handler or LLMHandler()
         self.retrieval_system = retrieval_system or RetrievalSystem()
@@ -35,6 +53,14 @@ class StoreAssistant:
         self.tts = tts
         self.use_rag = use_rag
         self.store_name = store_name # Store it for later use
+        # Answers to near-duplicate questions are reused instead of regenerated
+        self.response_cache = response_cache
+        # Limits concurrent LLM generations; checkout turns are served first
+        self.generation_scheduler = generation_scheduler
+        # Answers simple turns (price, stock, browse, order status) from catalog data
+        self.intent_router = intent_router
+        self._turn_lock = threading.Lock()
+        self._turns: Dict[str, int] = {}
         self.conversation_manager = ConversationManager()
         self.current_order: Optional[Order] = None
         
@@ -51,35 +77,217 @@ class StoreAssistant:
         return result.get("response", "I'm sorry, I couldn't generate a response.")
     # ----------------------------------------------------
     
-    def _index_products(self):
-        """Index products in RAG system for retrieval."""
-        products = self.product_manager.products
-        documents = []
-        for product in products:
+    def swap_retrieval_system(
+        self,
+        retrieval_system: RetrievalSystem,
+        changed_product_ids: Optional[List[str]] = None
+    ):
+        """
+        Replace the live retrieval system, e.g. after a vector store rebuild.
+
+        The catalog is indexed into the new system first, then it replaces
+        the old one in a single assignment; requests already running finish
+        on the old system.
+
+        Args:
+            retrieval_system: System to switch to
+            changed_product_ids: Products the sync changed; cached responses
+                mentioning them are dropped (None: drop all cached responses)
+        """
+        self._index_products(retrieval_system)
+        self.retrieval_system = retrieval_system
+        # Results cached by requests still running on the old system are dropped
+        retrieval_system.invalidate_cache()
+        if changed_product_ids is None:
+            self.clear_response_cache()
+            # Conversations may quote anything from the old store
+            self.llm_handler.reset_sessions()
+        else:
+            self.invalidate_products(changed_product_ids)
+
+    def invalidate_products(self, product_ids: List[str]):
+        """Drop cached responses and LLM session contexts based on any of the given products."""
+        if not product_ids:
+            return
+        if self.response_cache is not None:
+            self.response_cache.invalidate_products(product_ids)
+        self.llm_handler.reset_sessions(product_ids)
+
+    def clear_response_cache(self):
+        """Drop every cached response."""
+        if self.response_cache is not None:
+            self.response_cache.clear()
+
+    def update_product_stock(self, product_id: str, quantity: int):
+        """Update a product's stock and drop cached responses that mention it."""
+        self.product_manager.update_stock(product_id, quantity)
+        self.invalidate_products([product_id])
+
+    def _index_products(self, retrieval_system: Optional[RetrievalSystem] = None):
+        """
+        Incrementally index products in the RAG system.
+
+        Each product document is fingerprinted; only new or changed products
+        are embedded and upserted, and products that left the catalog are
+        deleted from the vector store. Catalog documents indexed before
+        fingerprinting, under positional IDs ("0", "1", ...), are deleted too.
+
+        Args:
+            retrieval_system: System to index into (defaults to the live one)
+        """
+        retrieval_system = retrieval_system or self.retrieval_system
+        if self.intent_router is not None:
+            self.intent_router.refresh()
+        documents: Dict[str, Dict] = {}
+        for product in self.product_manager.products:
             doc_text = (
                 f"Product: {product.get('name')}\n"
                 f"Description: {product.get('description')}\n"
                 f"Category: {product.get('category')}\n"
                 f"Price: ${product.get('price'):.2f}"
             )
-            documents.append({
+            doc = {
                 "text": doc_text,
                 "product_id": product.get('id'),
                 "name": product.get('name'),
                 "category": product.get('category'),
+                "price": product.get('price'),
+                "stock": product.get('stock'),
                 "type": "product"
-            })
-        
-        if documents:
-            self.retrieval_system.add_documents(documents)
+            }
+            doc["fingerprint"] = hashlib.sha256(
+                json.dumps(doc, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+            documents[f"{self.PRODUCT_DOC_PREFIX}{product.get('id')}"] = doc
+
+        fingerprints = retrieval_system.get_fingerprints()
+        indexed = {
+            doc_id: fingerprint
+            for doc_id, fingerprint in fingerprints.items()
+            if doc_id.startswith(self.PRODUCT_DOC_PREFIX)
+        }
+        # Left over from the old full re-indexing; they would duplicate every product
+        legacy_ids = [
+            doc_id for doc_id in retrieval_system.get_ids()
+            if doc_id.isdigit() and doc_id not in fingerprints
+        ]
+
+        changed_ids = [
+            doc_id for doc_id, doc in documents.items()
+            if indexed.get(doc_id) != doc["fingerprint"]
+        ]
+        removed_ids = [doc_id for doc_id in indexed if doc_id not in documents]
+
+        prefix_length = len(self.PRODUCT_DOC_PREFIX)
+        self.invalidate_products([doc_id[prefix_length:] for doc_id in changed_ids + removed_ids])
+
+        if changed_ids:
+            retrieval_system.upsert_documents(
+                [documents[doc_id] for doc_id in changed_ids], changed_ids
+            )
+        if removed_ids or legacy_ids:
+            retrieval_system.delete_documents(removed_ids + legacy_ids)
+        if changed_ids or removed_ids or legacy_ids:
+            retrieval_system.save()
     
     def process_user_message(self, user_message: str, session_id: str = "guest", use_audio: bool = False) -> dict:
         """
         Process user message and return structured data (Text + Products).
         """
+        # 1 & 2. Greetings and ordering are answered without the LLM
+        result = self._handle_without_generation(user_message, session_id)
+        if result is not None:
+            return result
+        
+        # 3. Handle Product Search (The New Logic!)
+        # We get BOTH the text reply AND the list of product objects
+        response_text, found_products = self._generate_response(user_message, session_id)
+        
+        return {
+            "response": response_text,
+            "products": found_products, # <--- SENDING DATA TO FRONTEND
+            "action": "DISPLAY_PRODUCTS" if found_products else None
+        }
+
+    async def aprocess_user_message(self, user_message: str, session_id: str = "guest") -> dict:
+        """
+        Async version of process_user_message.
+
+        Embedding, retrieval and generation are awaited, so one slow LLM call
+        doesn't hold up other requests on the same event loop.
+        """
+        result = await self._ahandle_without_generation(user_message, session_id)
+        if result is not None:
+            return result
+
+        response_text, found_products = await self._agenerate_response(user_message, session_id)
+        return {
+            "response": response_text,
+            "products": found_products,
+            "action": "DISPLAY_PRODUCTS" if found_products else None
+        }
+
+    def stream_user_message(self, user_message: str, session_id: str = "guest") -> Iterator[Dict]:
+        """
+        Streaming version of process_user_message.
+
+        Yields events in this order:
+            {"event": "products", "products": [...], "action": ...}  before generation starts
+            {"event": "token", "text": "..."}                           one per text chunk
+            {"event": "done", "response": "...", "products": [...], "action": ..., ...}
+        """
+        result = self._handle_without_generation(user_message, session_id)
+        if result is not None:
+            yield {"event": "products", "products": result.get("products", []), "action": result.get("action")}
+            yield {"event": "token", "text": result["response"]}
+            yield {"event": "done", **result}
+            return
+
+        products, chunks = self._generate_response_stream(user_message, session_id)
+        action = "DISPLAY_PRODUCTS" if products else None
+        parts = []
+        try:
+            # Cards first, so the shopper sees something while the model is still prefilling
+            yield {"event": "products", "products": products, "action": action}
+            for chunk in chunks:
+                parts.append(chunk)
+                yield {"event": "token", "text": chunk}
+        finally:
+            # Frees the generation slot if the client disconnects mid-stream
+            if hasattr(chunks, "close"):
+                chunks.close()
+        yield {"event": "done", "response": "".join(parts), "products": products, "action": action}
+
+    def _handle_without_generation(self, user_message: str, session_id: str) -> Optional[dict]:
+        """
+        Answer greetings, ordering-flow messages and routable intents.
+
+        Returns:
+            The response dict, or None if the message needs a generated answer
+        """
+        intent = None
+        # Ordering turns go to the ordering flow; don't pay for classifying them
+        if self.intent_router is not None and not self.conversation_manager.is_ordering_mode(session_id):
+            intent = self.intent_router.classify(user_message)
+        return self._answer_without_generation(user_message, session_id, intent)
+
+    async def _ahandle_without_generation(self, user_message: str, session_id: str) -> Optional[dict]:
+        """Async version of _handle_without_generation."""
+        intent = None
+        if self.intent_router is not None and not self.conversation_manager.is_ordering_mode(session_id):
+            intent = await self.intent_router.aclassify(user_message)
+        return self._answer_without_generation(user_message, session_id, intent)
+
+    def _answer_without_generation(self, user_message: str, session_id: str, intent: Optional[Intent]) -> Optional[dict]:
+        """Shared part of _handle_without_generation once the message is classified."""
         # 1. Handle Greetings (Quick Return)
-        greetings = ["hi", "hello", "salam", "assalam", "hey", "start"]
-        if any(g.lower() in user_message.lower() for g in greetings) and len(user_message.split()) < 3:
+        if self.intent_router is not None:
+            is_greeting = intent is not None and intent.name == GREETING
+        else:
+            greetings = ["hi", "hello", "salam", "assalam", "hey", "start"]
+            is_greeting = any(g.lower() in user_message.lower() for g in greetings) and len(user_message.split()) < 3
+        if is_greeting:
+            self._record_turn("greeting")
             return {
                 "response": f"Aslam u Alaikum! 👋 Welcome to {self.store_name}. Main apki kya madad kar sakti hoon?",
                 "products": [], # No products for greeting
@@ -90,52 +298,283 @@ class StoreAssistant:
         
         # 2. Handle Ordering (Keep existing logic)
         if self.conversation_manager.is_ordering_mode(session_id):
+            self._record_turn("ordering")
             return self._handle_ordering_flow(user_message, session_id)
-        
-        # 3. Handle Product Search (The New Logic!)
-        else:
-            # We get BOTH the text reply AND the list of product objects
-            response_text, found_products = self._generate_response(user_message)
-            
-            return {
-                "response": response_text,
-                "products": found_products, # <--- SENDING DATA TO FRONTEND
-                "action": "DISPLAY_PRODUCTS" if found_products else None
-            }
 
-    def _generate_response(self, query: str) -> tuple[str, List[Dict]]:
+        # 3. Price / stock / browse / order status straight from the catalog
+        if intent is not None:
+            result = self.intent_router.answer(intent, user_message, session_id=self._client_session(session_id))
+            if result is not None:
+                self._record_turn(f"intent:{intent.name}")
+                return result
+        return None
+
+    def _record_turn(self, route: str):
+        with self._turn_lock:
+            self._turns[route] = self._turns.get(route, 0) + 1
+
+    def turn_stats(self) -> Dict:
+        """
+        How turns were answered: "llm" is a full generation; everything else
+        (greeting, ordering, intent:*, response_cache) skipped the LLM.
+        """
+        with self._turn_lock:
+            by_route = dict(self._turns)
+        turns = sum(by_route.values())
+        without_llm = turns - by_route.get("llm", 0)
+        stats = {
+            "turns": turns,
+            "without_llm": without_llm,
+            "without_llm_ratio": (without_llm / turns) if turns else 0.0,
+            "by_route": by_route,
+        }
+        if self.intent_router is not None:
+            stats["classifier"] = self.intent_router.stats()
+        return stats
+
+    def _update_conversation_state(self, user_message: str, session_id: str):
+        """Record the user's message in the session history."""
+        self.conversation_manager.add_message(session_id, "user", user_message)
+
+    def _generate_response(self, query: str, session_id: Optional[str] = None) -> tuple[str, List[Dict]]:
         """
         Generate response and return found products.
+        With a per-client session_id (not a shared one like "guest"),
+        generation continues that session's LLM context.
         Returns: (response_string, list_of_product_dicts)
         """
-        # 1. Search for products
-        products = self.product_manager.search_products(query=query)
-        
-        # 2. Build Context for AI (Text only)
-        context = []
-        if self.use_rag:
-            context = self.retrieval_system.retrieve(query, top_k=3)
-        
-        if products:
-            for product in products[:3]:
-                context.append({
-                    "text": self.product_manager.format_product_for_display(product),
-                    "product_id": product.get('id'),
-                    "type": "product"
-                })
+        products, context, query_embedding, cached_response = self._prepare_response(query, session_id)
+        if cached_response is not None:
+            self._record_turn("response_cache")
+            return cached_response, products
 
         # 3. Generate AI Text Response
+        self._record_turn("llm")
         system_prompt = self._get_system_prompt()
-        response_text = self.llm_handler.generate_with_context(
-            query=query,
-            context=context,
-            system_prompt=system_prompt
-        )
+        llm_session = self._client_session(session_id)
+        with self._generation_slot(query, session_id):
+            if llm_session is not None:
+                response_text = self.llm_handler.generate_for_session(
+                    llm_session, query, context=context, system_prompt=system_prompt
+                )
+            else:
+                response_text = self.llm_handler.generate_with_context(
+                    query=query,
+                    context=context,
+                    system_prompt=system_prompt
+                )
+        self._cache_response(query, query_embedding, response_text, products, context)
+        return response_text, products
+
+    async def _agenerate_response(self, query: str, session_id: Optional[str] = None) -> tuple[str, List[Dict]]:
+        """Async version of _generate_response."""
+        products, context, query_embedding, cached_response = await self._aprepare_response(query, session_id)
+        if cached_response is not None:
+            self._record_turn("response_cache")
+            return cached_response, products
+
+        self._record_turn("llm")
+        llm_session = self._client_session(session_id)
+        async with self._ageneration_slot(query, session_id):
+            if llm_session is not None:
+                response_text = await self.llm_handler.agenerate_for_session(
+                    llm_session, query, context=context, system_prompt=self._get_system_prompt()
+                )
+            else:
+                response_text = await self.llm_handler.agenerate_with_context(
+                    query=query,
+                    context=context,
+                    system_prompt=self._get_system_prompt()
+                )
+        self._cache_response(query, query_embedding, response_text, products, context)
+        return response_text, products
+
+    def _generate_response_stream(self, query: str, session_id: Optional[str] = None) -> Tuple[List[Dict], Iterator[str]]:
+        """
+        Like _generate_response, but the text is an iterator of chunks.
+        Returns: (list_of_product_dicts, text_chunk_iterator)
+        """
+        products, context, query_embedding, cached_response = self._prepare_response(query, session_id)
+        if cached_response is not None:
+            self._record_turn("response_cache")
+            return products, iter([cached_response])
+
+        self._record_turn("llm")
+        llm_session = self._client_session(session_id)
+
+        def chunks() -> Iterator[str]:
+            # The slot is held until the stream finishes or is closed
+            with self._generation_slot(query, session_id):
+                yield ""
+                parts = []
+                if llm_session is not None:
+                    stream = self.llm_handler.generate_for_session_stream(
+                        llm_session, query, context=context, system_prompt=self._get_system_prompt()
+                    )
+                else:
+                    stream = self.llm_handler.generate_with_context_stream(
+                        query=query,
+                        context=context,
+                        system_prompt=self._get_system_prompt()
+                    )
+                for chunk in stream:
+                    parts.append(chunk)
+                    yield chunk
+            # Only complete answers are cached
+            self._cache_response(query, query_embedding, "".join(parts), products, context)
+
+        stream = chunks()
+        # Wait for a slot now, so an overloaded server rejects before any output
+        next(stream)
+        return products, stream
+
+    def _client_session(self, session_id: Optional[str]) -> Optional[str]:
+        """Per-client session ID, or None for shared and missing ones (e.g. "guest")."""
+        if not session_id or session_id in self.SHARED_SESSION_IDS:
+            return None
+        return session_id
+
+    def _uses_response_cache(self, session_id: Optional[str]) -> bool:
+        """
+        Whether a turn may be answered from, and stored in, the response cache.
+
+        Only standalone turns qualify: an answer generated on top of a
+        session's earlier turns depends on that conversation, not just on
+        the question.
+        """
+        if self.response_cache is None:
+            return False
+        return self._client_session(session_id) is None or self.llm_handler.session_contexts is None
+
+    def _generation_priority(self, query: str, session_id: Optional[str]) -> int:
+        """Checkout and ordering turns are scheduled ahead of browsing."""
+        session_id = session_id or "guest"
+        if (
+            self.current_order is not None
+            or self.conversation_manager.is_ordering_mode(session_id)
+            or self.conversation_manager.get_state(session_id) == ConversationState.ORDER_CONFIRMATION
+            or self.conversation_manager.extract_order_intent(query, session_id)
+        ):
+            return PRIORITY_CHECKOUT
+        return PRIORITY_BROWSE
+
+    def _generation_slot(self, query: str, session_id: Optional[str]):
+        """Context manager holding an LLM generation slot (no-op without a scheduler)."""
+        if self.generation_scheduler is None:
+            return nullcontext()
+        return self.generation_scheduler.slot(self._generation_priority(query, session_id))
+
+    def _ageneration_slot(self, query: str, session_id: Optional[str]):
+        """Async version of _generation_slot."""
+        if self.generation_scheduler is None:
+            return nullcontext()
+        return self.generation_scheduler.aslot(self._generation_priority(query, session_id))
+
+    def _prepare_response(self, query: str, session_id: Optional[str] = None) -> tuple:
+        """
+        Find products and build the LLM context for a query.
+
+        Returns:
+            (products, context, query_embedding, cached_response). On a
+            response cache hit cached_response is set and context is empty;
+            query_embedding is None when the response cache is off or the
+            turn continues a session.
+        """
+        # 0. Reuse the answer to a near-duplicate question if we have one
+        query_embedding = None
+        if self._uses_response_cache(session_id):
+            try:
+                query_embedding = self._routed_embedding(query)
+                if query_embedding is None:
+                    query_embedding = self.retrieval_system.embedding_model.embed_text(query)
+            except Exception as e:
+                print(f"Warning: Could not embed query for response cache: {e}")
+            cached = self._lookup_cached_response(query, query_embedding)
+            if cached is not None:
+                return cached
+
+        # 1. Search for products
+        products = self.product_manager.search_products(query=query)
+        rag_docs = self.retrieval_system.retrieve(query, top_k=3) if self.use_rag else []
+        return self._build_context(products, rag_docs) + (query_embedding, None)
+
+    async def _aprepare_response(self, query: str, session_id: Optional[str] = None) -> tuple:
+        """Async version of _prepare_response (embedding and retrieval are awaited)."""
+        query_embedding = None
+        if self._uses_response_cache(session_id):
+            try:
+                query_embedding = self._routed_embedding(query)
+                if query_embedding is None:
+                    query_embedding = await self.retrieval_system.embedding_model.aembed_text(query)
+            except Exception as e:
+                print(f"Warning: Could not embed query for response cache: {e}")
+            cached = self._lookup_cached_response(query, query_embedding)
+            if cached is not None:
+                return cached
+
+        products = self.product_manager.search_products(query=query)
+        rag_docs = await self.retrieval_system.aretrieve(query, top_k=3) if self.use_rag else []
+        return self._build_context(products, rag_docs) + (query_embedding, None)
+
+    def _routed_embedding(self, query: str):
+        """Query embedding the intent router already computed, if any."""
+        return self.intent_router.cached_embedding(query) if self.intent_router is not None else None
+
+    def _lookup_cached_response(self, query: str, query_embedding) -> Optional[tuple]:
+        """_prepare_response result for a response cache hit, or None."""
+        if query_embedding is None:
+            return None
+        cached = self.response_cache.lookup(query, query_embedding)
+        if cached is None:
+            return None
+        # Cards come from the live catalog, never from the cache
+        products = [self.product_manager.get_product(pid) for pid in cached["product_ids"]]
+        return [p for p in products if p], [], query_embedding, cached["response"]
+
+    def _build_context(self, products: List[Dict], rag_docs: List[Dict]) -> tuple:
+        """
+        Build Context for AI (Text only).
+        Returns: (top_products, context)
+        """
+        catalog_context = [
+            {
+                "text": self.product_manager.format_product_for_display(product),
+                "product_id": product.get('id'),
+                "type": "product"
+            }
+            for product in products[:3]
+        ]
+        # Each product goes into the prompt once; the catalog entry wins
+        # because it has the live stock
+        catalog_ids = {product_key(doc) for doc in catalog_context}
+        context = [
+            doc for doc in dedupe_by_product(rag_docs)
+            if product_key(doc) is None or product_key(doc) not in catalog_ids
+        ]
+        context.extend(catalog_context)
 
-        # 4. Return BOTH text and the raw product data
         # We only send the top 5 products to keep the chat clean
-        return response_text, products[:5]
-    
+        return products[:5], context
+
+    def _cache_response(
+        self,
+        query: str,
+        query_embedding,
+        response_text: str,
+        products: List[Dict],
+        context: List[Dict]
+    ):
+        """Remember a generated answer for near-duplicate questions."""
+        if query_embedding is None or self.response_cache is None:
+            return
+        self.response_cache.store(
+            query,
+            query_embedding,
+            response_text,
+            product_ids=[p.get('id') for p in products],
+            referenced_ids=[key for key in map(product_key, context) if key is not None]
+        )
+
     def _handle_ordering_flow(self, message: str, session_id: str) -> dict:
         """Handle order placement flow."""
         state = self.conversation_manager.get_state(session_id)
@@ -249,7 +688,12 @@ class StoreAssistant:
             return {"response": "I need a bit more information to complete your order. Please provide your name, phone number, and address.", "action": None}
     
     def _get_system_prompt(self) -> str:
-        """Get system prompt for the assistant."""
+        """
+        Get system prompt for the assistant.
+
+        Keep this byte-identical between requests (no timestamps or per-user
+        text): Ollama reuses its KV cache only for an unchanged prompt prefix.
+        """
         return f"""You are a polite, smart, and friendly Female Customer Assistant for "{self.store_name}".
 
 CRITICAL RULES:
@@ -0,0 +1,183 @@
+"""
+Builders for the assistant's components from config.yaml sections.
+
+main.py and api.py both build their components here, so a setting in
+config.yaml means the same thing for the CLI and the served API.
+"""
+
+from typing import Dict, Optional, Sequence, Union
+
+from .assistant.intent_router import IntentRouter
+from .assistant.response_cache import SemanticResponseCache
+from .models.host_pool import HostPool, normalize_hosts
+from .models.llm_handler import LLMHandler
+from .models.scheduler import GenerationScheduler
+from .models.session_context import SessionContextStore
+from .rag.embeddings import EmbeddingModel
+from .rag.result_cache import RetrievalCache
+from .rag.retrieval import RetrievalSystem
+from .rag.vector_store import VectorStore
+
+
+def build_host_pool(llm_config: Dict, hosts: Union[str, Sequence[str], None] = None) -> HostPool:
+    """
+    One pool of Ollama hosts for generation and embeddings (llm.base_url, llm.pool).
+
+    Args:
+        llm_config: The llm section
+        hosts: Overrides llm.base_url (e.g. from the OLLAMA_BASE_URL environment variable)
+    """
+    pool_config = llm_config.get('pool', {})
+    return HostPool(
+        normalize_hosts(hosts or llm_config.get('base_url')),
+        failure_threshold=pool_config.get('failure_threshold', 3),
+        cooldown_seconds=pool_config.get('cooldown_seconds', 30),
+        slow_call_seconds=pool_config.get('slow_call_seconds'),
+        request_timeout_seconds=pool_config.get('request_timeout_seconds'),
+        health_check_interval_seconds=pool_config.get('health_check_interval_seconds', 0)
+    )
+
+
+def build_session_contexts(llm_config: Dict) -> Optional[SessionContextStore]:
+    """Per-session Ollama contexts for KV cache reuse (llm.sessions), or None when disabled."""
+    sessions_config = llm_config.get('sessions', {})
+    if not sessions_config.get('enabled', True):
+        return None
+    return SessionContextStore(
+        max_sessions=sessions_config.get('max_sessions', 256),
+        max_tokens_per_session=sessions_config.get('max_tokens_per_session', 4096),
+        idle_ttl_seconds=sessions_config.get('idle_ttl_seconds', 900)
+    )
+
+
+def build_llm_handler(llm_config: Dict, host_pool: Optional[HostPool] = None) -> LLMHandler:
+    """
+    The LLM handler configured by the llm section.
+
+    Args:
+        llm_config: The llm section
+        host_pool: Ollama hosts, shared with the embedding model
+    """
+    return LLMHandler(
+        model_type=llm_config.get('model_type', 'ollama'),
+        model_name=llm_config.get('model_name'),
+        api_key=llm_config.get('api_key'),
+        host_pool=host_pool,
+        temperature=llm_config.get('temperature', 0.7),
+        max_tokens=llm_config.get('max_tokens'),
+        context_max_tokens=llm_config.get('context_max_tokens', 1500),
+        context_item_max_tokens=llm_config.get('context_item_max_tokens', 300),
+        session_contexts=build_session_contexts(llm_config)
+    )
+
+
+def build_generation_scheduler(llm_config: Dict) -> GenerationScheduler:
+    """Admission control in front of the LLM (llm.scheduler)."""
+    scheduler_config = llm_config.get('scheduler', {})
+    return GenerationScheduler(
+        max_concurrent=scheduler_config.get('max_concurrent', 2),
+        max_queue=scheduler_config.get('max_queue', 16),
+        queue_timeout_seconds=scheduler_config.get('queue_timeout_seconds', 20)
+    )
+
+
+def build_vector_store(rag_config: Dict, persist_dir: str) -> VectorStore:
+    """
+    Open the configured vector store (rag.vector_store_type, rag.faiss, rag.numpy).
+
+    Args:
+        rag_config: The rag section
+        persist_dir: Store directory, e.g. the version published by the last full sync
+    """
+    faiss_config = rag_config.get('faiss', {})
+    numpy_config = rag_config.get('numpy', {})
+    return VectorStore(
+        store_type=rag_config.get('vector_store_type', 'chroma'),
+        persist_dir=persist_dir,
+        collection_name=rag_config.get('collection_name', 'store_assistant'),
+        index_factory=faiss_config.get('index_factory', 'Flat'),
+        nprobe=faiss_config.get('nprobe', 8),
+        ef_search=faiss_config.get('ef_search', 64),
+        quantization=numpy_config.get('quantization'),
+        rerank_factor=numpy_config.get('rerank_factor', 4)
+    )
+
+
+def build_retrieval_cache(rag_config: Dict) -> Optional[RetrievalCache]:
+    """Result cache for repeated queries (rag.retrieval_cache), or None when disabled."""
+    cache_config = rag_config.get('retrieval_cache', {})
+    if not cache_config.get('enabled', True):
+        return None
+    return RetrievalCache(
+        max_entries=cache_config.get('max_entries', 1024),
+        ttl_seconds=cache_config.get('ttl_seconds', 300),
+        max_bytes=int(cache_config.get('max_mb', 16) * 1024 * 1024)
+    )
+
+
+def build_retrieval_system(
+    rag_config: Dict,
+    embedding_model: EmbeddingModel,
+    persist_dir: str,
+    cache: Optional[RetrievalCache] = None
+) -> RetrievalSystem:
+    """
+    Retrieval over the configured vector store (rag.top_k, rag.hybrid, rag.mmr).
+
+    Args:
+        rag_config: The rag section
+        embedding_model: Query embedding model
+        persist_dir: Store directory to open
+        cache: Result cache, shared across the systems opened after each sync
+    """
+    hybrid_config = rag_config.get('hybrid', {})
+    mmr_config = rag_config.get('mmr', {})
+    return RetrievalSystem(
+        embedding_model=embedding_model,
+        vector_store=build_vector_store(rag_config, persist_dir),
+        top_k=rag_config.get('top_k', 5),
+        hybrid=hybrid_config.get('enabled', False),
+        rrf_k=hybrid_config.get('rrf_k', 60),
+        cache=cache,
+        mmr=mmr_config.get('enabled', False),
+        mmr_lambda=mmr_config.get('lambda', 0.5)
+    )
+
+
+def build_response_cache(assistant_config: Dict) -> Optional[SemanticResponseCache]:
+    """Answers to near-duplicate questions (assistant.response_cache), or None when disabled."""
+    cache_config = assistant_config.get('response_cache', {})
+    if not cache_config.get('enabled', True):
+        return None
+    return SemanticResponseCache(
+        similarity_threshold=cache_config.get('similarity_threshold', 0.95),
+        max_entries=cache_config.get('max_entries', 512),
+        max_bytes=int(cache_config.get('max_mb', 32) * 1024 * 1024)
+    )
+
+
+def build_intent_router(
+    assistant_config: Dict,
+    product_manager,
+    order_manager,
+    embedding_model: EmbeddingModel
+) -> Optional[IntentRouter]:
+    """
+    Catalog-answered intents without the LLM (assistant.intent_router), or None when disabled.
+
+    Args:
+        assistant_config: The assistant section
+        product_manager: Catalog the routed answers come from
+        order_manager: Orders for order-status turns
+        embedding_model: Query embedding model, shared with retrieval
+    """
+    router_config = assistant_config.get('intent_router', {})
+    if not router_config.get('enabled', True):
+        return None
+    return IntentRouter(
+        product_manager=product_manager,
+        order_manager=order_manager,
+        embedding_model=embedding_model,
+        similarity_threshold=router_config.get('similarity_threshold', 0.7),
+        margin=router_config.get('margin', 0.05)
+    )
@@ -0,0 +1,178 @@
+"""
+Token-budgeted context assembly for RAG prompts.
+
+Prefill time grows with prompt length, so retrieved context is packed into
+a fixed token budget: duplicates are dropped, the most relevant items go
+first and long descriptions are shortened instead of crowding out other
+products.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+
+from ..rag.diversity import product_key
+
+_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+ELLIPSIS = "..."
+# Items are joined with a blank line, about one token
+SEPARATOR_TOKENS = 1
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate the number of LLM tokens in a text.
+
+    Punctuation counts as one token and words as one token per four
+    characters, which is close to what BPE tokenizers (llama, GPT) produce
+    for English and Roman Urdu, without loading a tokenizer.
+    """
+    return sum(
+        max(1, math.ceil(len(token) / 4)) if token[0].isalnum() or token[0] == "_" else 1
+        for token in _TOKEN.findall(text or "")
+    )
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shorten text to about max_tokens, cutting at a sentence or word boundary.
+
+    Multi-line items (e.g. "Product: ...\\nPrice: ...\\nDescription: ...")
+    keep their short lines intact; only the long lines are cut.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.split("\n")
+    line_tokens = [count_tokens(line) for line in lines]
+    # Short lines (name, price, stock) are worth more per token than prose
+    short_budget = sum(tokens for tokens in line_tokens if tokens <= 32)
+    if short_budget >= max_tokens:
+        return _cut(text, max_tokens)
+
+    long_lines = [i for i, tokens in enumerate(line_tokens) if tokens > 32]
+    remaining = max_tokens - short_budget
+    share = remaining // len(long_lines)
+    for i in long_lines:
+        lines[i] = _cut(lines[i], share)
+    return "\n".join(line for line in lines if line)
+
+
+def _cut(text: str, max_tokens: int) -> str:
+    """Cut one piece of text to max_tokens at the best boundary available."""
+    if max_tokens <= 0:
+        return ""
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_END.split(text):
+        tokens = count_tokens(sentence)
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    # Keep whole sentences if they cover most of the budget, otherwise cut words
+    if kept and used >= max_tokens // 2:
+        return " ".join(kept)
+
+    words = text.split()
+    result = []
+    used = count_tokens(ELLIPSIS)
+    for word in words:
+        tokens = count_tokens(word)
+        if used + tokens > max_tokens:
+            break
+        result.append(word)
+        used += tokens
+    return (" ".join(result) + ELLIPSIS) if result else ""
+
+
+class ContextBuilder:
+    """Packs context items into a token budget, most relevant first."""
+
+    def __init__(self, max_tokens: int = 1500, max_item_tokens: int = 300, min_item_tokens: int = 24):
+        """
+        Initialize context builder.
+
+        Args:
+            max_tokens: Token budget for the whole context block
+            max_item_tokens: Longer items are truncated to this many tokens
+            min_item_tokens: Items are not squeezed below this to fill the
+                             last bit of budget; they are skipped instead
+        """
+        self.max_tokens = max_tokens
+        self.max_item_tokens = max_item_tokens
+        self.min_item_tokens = min_item_tokens
+
+    @staticmethod
+    def relevance(item: Dict) -> float:
+        """
+        Relevance of a context item (higher is better).
+
+        Uses 'relevance' if the caller set one, else the fused RRF score,
+        else the vector distance (1 - distance). Items without any score,
+        such as exact catalog matches, rank first.
+        """
+        if item.get("relevance") is not None:
+            return float(item["relevance"])
+        if item.get("rrf_score") is not None:
+            # RRF scores are tiny; lift them above plain distances
+            return 1.0 + float(item["rrf_score"])
+        if item.get("distance") is not None:
+            return 1.0 - float(item["distance"])
+        return 2.0
+
+    def build(self, context: Optional[List[Dict]]) -> Tuple[str, Dict]:
+        """
+        Assemble the context block.
+
+        Args:
+            context: Items with a "text" (or "content") field and optional
+                     product_id / relevance / rrf_score / distance
+
+        Returns:
+            (context_text, stats) where stats has items, used, deduplicated,
+            truncated, dropped and tokens
+        """
+        items = []
+        for position, item in enumerate(context or []):
+            text = (item.get("text") or item.get("content") or "").strip()
+            if text:
+                items.append((self.relevance(item), position, item, text))
+        # Most relevant first; ties keep the caller's order
+        items.sort(key=lambda entry: (-entry[0], entry[1]))
+
+        stats = {"items": len(items), "used": 0, "deduplicated": 0, "truncated": 0, "dropped": 0, "tokens": 0}
+        seen_products = set()
+        seen_texts = set()
+        parts = []
+        for _, _, item, original in items:
+            key = product_key(item)
+            if (key is not None and key in seen_products) or original in seen_texts:
+                stats["deduplicated"] += 1
+                continue
+
+            text = original
+            separator = SEPARATOR_TOKENS if parts else 0
+            remaining = self.max_tokens - stats["tokens"] - separator
+            limit = min(self.max_item_tokens, remaining)
+            tokens = count_tokens(text)
+            if tokens > limit:
+                if limit < self.min_item_tokens:
+                    stats["dropped"] += 1
+                    continue
+                text = truncate_to_tokens(text, limit)
+                tokens = count_tokens(text)
+                if not text or tokens > remaining:
+                    stats["dropped"] += 1
+                    continue
+                stats["truncated"] += 1
+
+            if key is not None:
+                seen_products.add(key)
+            seen_texts.add(original)
+            parts.append(text)
+            stats["used"] += 1
+            stats["tokens"] += tokens + separator
+
+        return "\n\n".join(parts), stats
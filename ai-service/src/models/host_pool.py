@@ -0,0 +1,420 @@
+"""
+Load balancing and failover over several Ollama hosts.
+
+Requests go to the healthy host with the fewest requests in flight. Hosts
+that keep failing (or answering too slowly) are ejected by a circuit
+breaker for a cooldown period, failed requests are retried on a peer, and
+an optional background health check ejects dead hosts before any request
+hits them and brings recovered ones back early.
+"""
+
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+import urllib.request
+
+try:
+    import httpx  # type: ignore
+    _TRANSPORT_ERRORS = (OSError, TimeoutError, asyncio.TimeoutError, httpx.TransportError)
+except ImportError:  # pragma: no cover - httpx comes with the ollama client
+    _TRANSPORT_ERRORS = (OSError, TimeoutError, asyncio.TimeoutError)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def normalize_hosts(hosts: Union[str, Sequence[str], None], default: str = "http://localhost:11434") -> List[str]:
+    """
+    Turn a host or list of hosts into a list of unique base URLs.
+
+    Accepts "host:port", "http://host:port/" or a comma separated string.
+    """
+    if hosts is None:
+        hosts = [default]
+    elif isinstance(hosts, str):
+        hosts = hosts.split(",")
+    urls = []
+    for host in hosts:
+        host = (host or "").strip().rstrip("/")
+        if not host:
+            continue
+        if "://" not in host:
+            host = "http://" + host
+        if host not in urls:
+            urls.append(host)
+    return urls or [default]
+
+
+def is_host_failure(error: BaseException) -> bool:
+    """
+    Whether an error says something about the host rather than the request.
+
+    Connection errors, timeouts and HTTP 5xx answers count; anything else
+    (e.g. a 4xx for an unknown model or a bad argument) would fail the same
+    way on every host.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 100:
+        return status >= 500
+    return isinstance(error, _TRANSPORT_ERRORS)
+
+
+class _Host:
+    __slots__ = (
+        "url", "outstanding", "state", "opened_until", "trial_token",
+        "consecutive_failures", "requests", "failures", "slow_calls", "ejections",
+        "latency_seconds", "last_error",
+    )
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.state = CLOSED
+        self.opened_until = 0.0
+        # Set while the half-open trial request runs; only it may clear it
+        self.trial_token: Optional[int] = None
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.ejections = 0
+        self.latency_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class HostPool:
+    """Least-outstanding-requests balancer with a per-host circuit breaker.
+
+    Circuit states per host:
+        closed     requests flow normally
+        open       ejected after failure_threshold consecutive failures
+                   (or a failed health check) until cooldown_seconds pass
+        half_open  cooldown over; one trial request decides whether the
+                   host closes again or goes back to open
+
+    If every host is ejected, the one due back soonest is still tried, so a
+    single-host pool behaves like a plain client.
+    """
+
+    def __init__(
+        self,
+        hosts: Union[str, Sequence[str], None] = None,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+        slow_call_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        request_timeout_seconds: Optional[float] = None,
+        health_check_interval_seconds: float = 0.0,
+        health_check_timeout_seconds: float = 2.0,
+        health_check_path: str = "/api/version",
+    ):
+        """
+        Initialize host pool.
+
+        Args:
+            hosts: Base URL or list of base URLs (e.g. "http://gpu1:11434")
+            failure_threshold: Consecutive failures that eject a host
+            cooldown_seconds: How long an ejected host gets no traffic
+            slow_call_seconds: Successful calls slower than this count as
+                               failures for the breaker (None = never)
+            max_attempts: Hosts tried per request (default: every host)
+            request_timeout_seconds: HTTP timeout for clients built on the pool
+            health_check_interval_seconds: Probe every host this often in a
+                                           background thread (0 = off)
+            health_check_timeout_seconds: Timeout of one probe
+            health_check_path: Path probed with GET (cheap, no model load)
+        """
+        self.hosts = normalize_hosts(hosts)
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.max_attempts = max_attempts or len(self.hosts)
+        self.request_timeout_seconds = request_timeout_seconds
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self.health_check_timeout_seconds = health_check_timeout_seconds
+        self.health_check_path = health_check_path
+        self.retries = 0
+        self._state: Dict[str, _Host] = {url: _Host(url) for url in self.hosts}
+        self._lock = threading.Lock()
+        self._next = 0
+        self._trial_tokens = itertools.count(1)
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_check_interval_seconds > 0:
+            self.start_health_checks()
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    # Request routing
+
+    def call(self, fn: Callable[[str], T], affinity: Optional[str] = None) -> T:
+        """
+        Run fn(host_url) on the best host, retrying on a peer if the host fails.
+
+        Only host failures (see is_host_failure) are retried and count
+        against the host's circuit breaker; other errors are raised at once.
+
+        Args:
+            fn: Performs the request against the given base URL
+            affinity: Optional key (e.g. a session ID) that prefers the same
+                      host every time while it isn't busier than the others
+
+        Returns:
+            fn's result
+
+        Raises:
+            The first error that isn't a host failure, or the last error if
+            every attempt failed
+        """
+        tried: List[str] = []
+        error: Optional[BaseException] = None
+        for _ in range(self.max_attempts):
+            lease = self._acquire(tried, affinity)
+            if lease is None:
+                break
+            host, trial = lease
+            tried.append(host)
+            started = time.monotonic()
+            try:
+                result = fn(host)
+            except Exception as exc:
+                if not is_host_failure(exc):
+                    # The host answered; the request itself is at fault
+                    self._release(host, trial, time.monotonic() - started)
+                    raise
+                self._release(host, trial, time.monotonic() - started, exc)
+                error = exc
+                continue
+            except BaseException:
+                # Cancelled or interrupted: not the host's fault
+                self._release(host, trial, time.monotonic() - started)
+                raise
+            self._release(host, trial, time.monotonic() - started)
+            return result
+        raise error if error is not None else RuntimeError("No Ollama host available")
+
+    async def acall(self, fn: Callable[[str], Awaitable[T]], affinity: Optional[str] = None) -> T:
+        """Async version of call; fn returns an awaitable."""
+        tried: List[str] = []
+        error: Optional[BaseException] = None
+        for _ in range(self.max_attempts):
+            lease = self._acquire(tried, affinity)
+            if lease is None:
+                break
+            host, trial = lease
+            tried.append(host)
+            started = time.monotonic()
+            try:
+                result = await fn(host)
+            except Exception as exc:
+                if not is_host_failure(exc):
+                    self._release(host, trial, time.monotonic() - started)
+                    raise
+                self._release(host, trial, time.monotonic() - started, exc)
+                error = exc
+                continue
+            except BaseException:
+                # Cancelled or interrupted: not the host's fault
+                self._release(host, trial, time.monotonic() - started)
+                raise
+            self._release(host, trial, time.monotonic() - started)
+            return result
+        raise error if error is not None else RuntimeError("No Ollama host available")
+
+    def stream(self, fn: Callable[[str], Iterable[T]], affinity: Optional[str] = None) -> Iterator[T]:
+        """
+        Like call, for streaming requests: yields the items of fn(host_url).
+
+        A host that fails before its first item is retried on a peer; once
+        items have been yielded the error is raised, since the caller has
+        already used part of the answer. Errors that aren't host failures
+        are raised at once.
+        """
+        tried: List[str] = []
+        error: Optional[BaseException] = None
+        for _ in range(self.max_attempts):
+            lease = self._acquire(tried, affinity)
+            if lease is None:
+                break
+            host, trial = lease
+            tried.append(host)
+            started = time.monotonic()
+            produced = False
+            error = None
+            try:
+                for item in fn(host):
+                    produced = True
+                    yield item
+            except Exception as exc:
+                error = exc
+            finally:
+                # A consumer that stops early is not the host's fault
+                failed = error is not None and is_host_failure(error)
+                self._release(host, trial, time.monotonic() - started, error if failed else None)
+            if error is None:
+                return
+            if produced or not failed:
+                raise error
+        raise error if error is not None else RuntimeError("No Ollama host available")
+
+    def _acquire(self, exclude: Sequence[str], affinity: Optional[str]) -> Optional[Tuple[str, Optional[int]]]:
+        """Pick a host; returns (url, trial token or None), or None if all were tried."""
+        now = time.monotonic()
+        with self._lock:
+            hosts = [self._state[url] for url in self.hosts if url not in exclude]
+            if not hosts:
+                return None
+            if exclude:
+                self.retries += 1
+            candidates = [host for host in hosts if self._available(host, now)]
+            if not candidates:
+                # Everything is ejected: better to try the host due back soonest than to fail
+                candidates = [min(hosts, key=lambda host: host.opened_until)]
+
+            # Rotate the start so ties are spread round-robin
+            self._next = (self._next + 1) % len(candidates)
+            ordered = candidates[self._next:] + candidates[:self._next]
+            chosen = min(ordered, key=lambda host: host.outstanding)
+            if affinity is not None:
+                preferred = max(candidates, key=lambda host: self._affinity_score(affinity, host.url))
+                # Stick to the session's host (its KV cache) unless it is clearly busier
+                if preferred.outstanding <= chosen.outstanding + 1:
+                    chosen = preferred
+
+            trial = None
+            if chosen.state != CLOSED:
+                chosen.state = HALF_OPEN
+                trial = next(self._trial_tokens)
+                chosen.trial_token = trial
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen.url, trial
+
+    @staticmethod
+    def _affinity_score(key: str, url: str) -> int:
+        # Rendezvous hashing: stable per key, and only keys of a removed host move
+        return int.from_bytes(hashlib.blake2b(f"{key}|{url}".encode("utf-8"), digest_size=8).digest(), "big")
+
+    def _available(self, host: _Host, now: float) -> bool:
+        if host.state == CLOSED:
+            return True
+        # Open hosts get one trial request once the cooldown is over
+        return now >= host.opened_until and host.trial_token is None
+
+    def _release(self, url: str, trial: Optional[int], elapsed: float, error: Optional[BaseException] = None):
+        now = time.monotonic()
+        with self._lock:
+            host = self._state[url]
+            host.outstanding -= 1
+            # Requests sent before the host was ejected don't decide its trial
+            is_trial = trial is not None and host.trial_token == trial
+            if is_trial:
+                host.trial_token = None
+            slow = error is None and self.slow_call_seconds is not None and elapsed > self.slow_call_seconds
+            if error is None:
+                host.latency_seconds = (
+                    elapsed if host.latency_seconds is None else 0.8 * host.latency_seconds + 0.2 * elapsed
+                )
+            if error is None and not slow:
+                host.consecutive_failures = 0
+                if is_trial:
+                    host.state = CLOSED
+                return
+
+            if slow:
+                host.slow_calls += 1
+                host.last_error = f"slow call ({elapsed:.1f}s)"
+            else:
+                host.failures += 1
+                host.last_error = f"{type(error).__name__}: {error}"
+            host.consecutive_failures += 1
+            if is_trial or host.consecutive_failures >= self.failure_threshold:
+                self._eject(host, now)
+
+    def _eject(self, host: _Host, now: float):
+        if host.state != OPEN:
+            host.ejections += 1
+        host.state = OPEN
+        host.opened_until = now + self.cooldown_seconds
+
+    # Health checks
+
+    def start_health_checks(self):
+        """Probe every host in a background thread every health_check_interval_seconds."""
+        if self._health_thread is not None or self.health_check_interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def close(self):
+        """Stop the health check thread."""
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=self.health_check_timeout_seconds + 1)
+            self._health_thread = None
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_check_interval_seconds):
+            self.check_health()
+
+    def check_health(self) -> Dict[str, bool]:
+        """
+        Probe every host once: failing hosts are ejected, ejected hosts that
+        answer again are put back into rotation.
+
+        Returns:
+            Host URL -> whether it answered
+        """
+        results = {}
+        for url in self.hosts:
+            try:
+                with urllib.request.urlopen(url + self.health_check_path, timeout=self.health_check_timeout_seconds) as response:
+                    ok = 200 <= response.status < 300
+            except Exception as exc:
+                ok = False
+                error = f"health check: {type(exc).__name__}: {exc}"
+            else:
+                error = None if ok else f"health check: HTTP {response.status}"
+            results[url] = ok
+
+            now = time.monotonic()
+            with self._lock:
+                host = self._state[url]
+                if ok and host.state != CLOSED:
+                    host.state = CLOSED
+                    host.consecutive_failures = 0
+                    host.trial_token = None
+                elif not ok:
+                    host.last_error = error
+                    self._eject(host, now)
+        return results
+
+    def stats(self) -> Dict:
+        """Get per-host state, load, latency and failure counters."""
+        now = time.monotonic()
+        with self._lock:
+            hosts = {
+                url: {
+                    "state": host.state,
+                    "outstanding": host.outstanding,
+                    "requests": host.requests,
+                    "failures": host.failures,
+                    "slow_calls": host.slow_calls,
+                    "ejections": host.ejections,
+                    "latency_seconds": host.latency_seconds or 0.0,
+                    "ejected_for_seconds": max(0.0, host.opened_until - now) if host.state == OPEN else 0.0,
+                    "last_error": host.last_error,
+                }
+                for url, host in self._state.items()
+            }
+        return {"hosts": hosts, "retries": self.retries}
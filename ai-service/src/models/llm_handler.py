@@ -5,10 +5,16 @@ This implementation is focused on local Ollama (e.g. llama3) but keeps the
 interface flexible so it can be extended to other providers if needed.
 """
 
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+import threading
 
 from langchain_core.prompts import PromptTemplate  # type: ignore
 
+from ..rag.diversity import product_key
+from .context_builder import ContextBuilder, count_tokens
+from .host_pool import HostPool
+from .session_context import SessionContextStore
+
 try:
     # Preferred import style
     from langchain_ollama.llms import OllamaLLM  # type: ignore
@@ -16,6 +22,20 @@ except ImportError:  # pragma: no cover - fallback for older versions
     from langchain_ollama import OllamaLLM  # type: ignore
 
 
+# The system prompt comes first and never varies per request, so Ollama can
+# reuse the KV cache for that prefix; everything request-specific follows it
+TURN_TEMPLATE = """Context Information:
+{context}
+
+Question: {query}
+
+Answer based on the context above. If the context is not sufficient, say so explicitly,
+and do not make up product details or orders that are not present.
+"""
+
+RAG_TEMPLATE = "{system_prompt}\n\n" + TURN_TEMPLATE
+
+
 class LLMHandler:
     """Wrapper around the underlying LLM (Ollama by default)."""
 
@@ -24,9 +44,13 @@ class LLMHandler:
         model_type: str = "ollama",
         model_name: Optional[str] = None,
         api_key: Optional[str] = None,
-        base_url: Optional[str] = None,
+        base_url: Optional[Union[str, Sequence[str]]] = None,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        context_max_tokens: int = 1500,
+        context_item_max_tokens: int = 300,
+        session_contexts: Optional[SessionContextStore] = None,
+        host_pool: Optional[HostPool] = None,
     ):
         """
         Initialize LLM handler.
@@ -35,15 +59,25 @@ class LLMHandler:
             model_type:  "ollama" (default). Hooks are left for "openai"/"anthropic" if added later.
             model_name:  Underlying model name (e.g. "llama3" / "llama3.2").
             api_key:     Not used for Ollama (kept for API compatibility).
-            base_url:    Ollama base URL (default http://localhost:11434).
+            base_url:    Ollama base URL (default http://localhost:11434), or a list
+                         of URLs to spread requests over several Ollama hosts.
             temperature: Sampling temperature.
             max_tokens:  Max tokens / num_predict for Ollama.
+            context_max_tokens:      Token budget for retrieved context in RAG prompts.
+            context_item_max_tokens: Longer context items are truncated to this.
+            session_contexts: Optional store of per-session Ollama contexts. When
+                set, the *_for_session methods continue each session from its
+                previous turn so only the new turn is prefilled.
+            host_pool: Optional HostPool to route requests through (e.g. one
+                shared with the EmbeddingModel). Built from base_url if omitted.
         """
         self.model_type = model_type or "ollama"
         # Default to llama3.2 since that's what you have locally
         self.model_name = model_name or "llama3.2"
         self.api_key = api_key
-        self.base_url = base_url or "http://localhost:11434"
+        # Least-outstanding-requests routing with failover between hosts
+        self.host_pool = host_pool or HostPool(base_url or "http://localhost:11434")
+        self.base_url = self.host_pool.hosts[0]
         self.temperature = temperature
         self.max_tokens = max_tokens or 1000
 
@@ -54,18 +88,57 @@ class LLMHandler:
                 f"got '{self.model_type}'."
             )
 
-        self._llm = OllamaLLM(
-            model=self.model_name,
-            base_url=self.base_url,
-            temperature=self.temperature,
-            num_predict=self.max_tokens,
+        self.context_builder = ContextBuilder(
+            max_tokens=context_max_tokens,
+            max_item_tokens=context_item_max_tokens,
         )
+        # Compiled once; only the values change per request
+        self._rag_prompt = PromptTemplate(
+            input_variables=["system_prompt", "context", "query"],
+            template=RAG_TEMPLATE,
+        )
+        self._turn_prompt = PromptTemplate(
+            input_variables=["context", "query"],
+            template=TURN_TEMPLATE,
+        )
+        self.session_contexts = session_contexts
+        self._ollama_clients: Dict[str, object] = {}
+        self._ollama_async_clients: Dict[str, object] = {}
+        self._metrics_lock = threading.Lock()
+        self._prompt_metrics = self._empty_prompt_metrics()
+
+        client_options = {}
+        if self.host_pool.request_timeout_seconds:
+            client_options["client_kwargs"] = {"timeout": self.host_pool.request_timeout_seconds}
+        self._llms = {
+            host: OllamaLLM(
+                model=self.model_name,
+                base_url=host,
+                temperature=self.temperature,
+                num_predict=self.max_tokens,
+                **client_options,
+            )
+            for host in self.host_pool.hosts
+        }
 
    # Basic generation
     
     def generate(self, prompt: str) -> str:
         """Generate a plain response for a prompt."""
-        return self._llm.invoke(prompt)
+        return self.host_pool.call(lambda host: self._llms[host].invoke(prompt))
+
+    async def agenerate(self, prompt: str) -> str:
+        """Async version of generate; the event loop stays free while Ollama runs."""
+        return await self.host_pool.acall(lambda host: self._llms[host].ainvoke(prompt))
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a plain response for a prompt, yielding text chunks as the
+        model produces them.
+        """
+        for chunk in self.host_pool.stream(lambda host: self._llms[host].stream(prompt)):
+            if chunk:
+                yield chunk
 
     
     # RAG-style generation with context
@@ -88,39 +161,248 @@ class LLMHandler:
         Returns:
             Generated response string.
         """
-        system_prompt = system_prompt or (
-            "You are a helpful store assistant. Answer clearly and concisely."
+        return self.generate(self._build_rag_prompt(query, context, system_prompt))
+
+    async def agenerate_with_context(
+        self,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        """Async version of generate_with_context."""
+        return await self.agenerate(self._build_rag_prompt(query, context, system_prompt))
+
+    def generate_with_context_stream(
+        self,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of generate_with_context.
+
+        Yields:
+            Text chunks of the response, in order, as Ollama produces them.
+        """
+        return self.generate_stream(self._build_rag_prompt(query, context, system_prompt))
+
+    # Session-aware generation (Ollama context reuse)
+
+    def generate_for_session(
+        self,
+        session_id: str,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        """
+        generate_with_context that continues the session's previous turn.
+
+        The first turn sends the system prompt; later turns send only the new
+        context and question along with the context tokens Ollama returned
+        last time, so the runtime reuses its cached prefix. Falls back to
+        generate_with_context when no session store is configured.
+        """
+        if self.session_contexts is None:
+            return self.generate_with_context(query, context, system_prompt)
+        request = self._session_request(session_id, query, context, system_prompt)
+        # The session's host most likely still has its KV cache
+        response = self.host_pool.call(
+            lambda host: self._ollama_client(host).generate(**request), affinity=session_id
         )
+        self.session_contexts.put(session_id, response.get("context"), self._referenced_products(context))
+        return response.get("response", "")
 
-        context = context or []
-        context_texts: List[str] = []
-        for item in context:
-            text = item.get("text") or item.get("content") or ""
-            if text:
-                context_texts.append(text)
+    async def agenerate_for_session(
+        self,
+        session_id: str,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        """Async version of generate_for_session."""
+        if self.session_contexts is None:
+            return await self.agenerate_with_context(query, context, system_prompt)
+        request = self._session_request(session_id, query, context, system_prompt)
+        response = await self.host_pool.acall(
+            lambda host: self._ollama_async_client(host).generate(**request), affinity=session_id
+        )
+        self.session_contexts.put(session_id, response.get("context"), self._referenced_products(context))
+        return response.get("response", "")
 
-        joined_context = "\n\n".join(context_texts).strip()
+    def generate_for_session_stream(
+        self,
+        session_id: str,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> Iterator[str]:
+        """Streaming version of generate_for_session."""
+        if self.session_contexts is None:
+            yield from self.generate_with_context_stream(query, context, system_prompt)
+            return
+        request = self._session_request(session_id, query, context, system_prompt)
+        parts = self.host_pool.stream(
+            lambda host: self._ollama_client(host).generate(stream=True, **request), affinity=session_id
+        )
+        for part in parts:
+            if part.get("response"):
+                yield part["response"]
+            if part.get("done"):
+                # Only the final chunk carries the context
+                self.session_contexts.put(session_id, part.get("context"), self._referenced_products(context))
 
-        rag_template = """{system_prompt}
+    def reset_session(self, session_id: str):
+        """Start the session's next turn from a fresh context."""
+        if self.session_contexts is not None:
+            self.session_contexts.drop(session_id)
 
-Context Information:
-{context}
+    def reset_sessions(self, product_ids: Optional[List[str]] = None):
+        """
+        Start sessions over whose context holds outdated product data.
 
-Question: {query}
+        Args:
+            product_ids: Products that changed (None: reset every session)
+        """
+        if self.session_contexts is None:
+            return
+        if product_ids is None:
+            self.session_contexts.clear()
+        elif product_ids:
+            self.session_contexts.drop_products(product_ids)
 
-Answer based on the context above. If the context is not sufficient, say so explicitly,
-and do not make up product details or orders that are not present.
-"""
+    @staticmethod
+    def _referenced_products(context: Optional[List[Dict]]) -> List[str]:
+        return [key for key in map(product_key, context or []) if key is not None]
 
-        prompt_template = PromptTemplate(
-            input_variables=["system_prompt", "context", "query"],
-            template=rag_template,
+    @staticmethod
+    def _import_ollama():
+        try:
+            import ollama  # type: ignore
+        except ImportError as exc:
+            raise ImportError(
+                "The 'ollama' Python package is required for session-aware generation. "
+                "Install it with: pip install ollama"
+            ) from exc
+        return ollama
+
+    def _client_options(self) -> Dict:
+        timeout = self.host_pool.request_timeout_seconds
+        return {"timeout": timeout} if timeout else {}
+
+    def _ollama_client(self, host: str):
+        client = self._ollama_clients.get(host)
+        if client is None:
+            client = self._import_ollama().Client(host=host, **self._client_options())
+            self._ollama_clients[host] = client
+        return client
+
+    def _ollama_async_client(self, host: str):
+        client = self._ollama_async_clients.get(host)
+        if client is None:
+            client = self._import_ollama().AsyncClient(host=host, **self._client_options())
+            self._ollama_async_clients[host] = client
+        return client
+
+    def _session_request(
+        self,
+        session_id: str,
+        query: str,
+        context: Optional[List[Dict]],
+        system_prompt: Optional[str],
+    ) -> Dict:
+        """Arguments for Ollama's generate call for one session turn."""
+        joined_context, context_stats = self.context_builder.build(context)
+        prompt = self._turn_prompt.format(
+            context=joined_context or "No additional context was provided.",
+            query=query,
+        )
+        previous = self.session_contexts.get(session_id)
+        request = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "options": {"temperature": self.temperature, "num_predict": self.max_tokens},
+        }
+        if previous is None:
+            # Byte-identical across sessions, so even first turns share a cached prefix
+            request["system"] = system_prompt or (
+                "You are a helpful store assistant. Answer clearly and concisely."
+            )
+            self._record_prompt(count_tokens(request["system"]) + count_tokens(prompt), context_stats)
+        else:
+            request["context"] = previous
+            self._record_prompt(count_tokens(prompt), context_stats)
+        return request
+
+    def host_stats(self) -> Dict:
+        """Get per-host load, circuit breaker state and failure counters."""
+        return self.host_pool.stats()
+
+    def session_stats(self) -> Dict:
+        """Get session context store statistics (empty if sessions are off)."""
+        return self.session_contexts.stats() if self.session_contexts is not None else {}
+
+    def _build_rag_prompt(
+        self,
+        query: str,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        """Format the RAG prompt, packing the context into the token budget."""
+        system_prompt = system_prompt or (
+            "You are a helpful store assistant. Answer clearly and concisely."
         )
 
-        final_prompt = prompt_template.format(
+        joined_context, context_stats = self.context_builder.build(context)
+
+        prompt = self._rag_prompt.format(
             system_prompt=system_prompt,
             context=joined_context or "No additional context was provided.",
             query=query,
         )
+        self._record_prompt(count_tokens(prompt), context_stats)
+        return prompt
+
+    # Prompt size metrics
+
+    @staticmethod
+    def _empty_prompt_metrics() -> Dict:
+        return {
+            "prompts": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_max": 0,
+            "prompt_tokens_last": 0,
+            "context_tokens_total": 0,
+            "context_items_used": 0,
+            "context_items_deduplicated": 0,
+            "context_items_truncated": 0,
+            "context_items_dropped": 0,
+        }
+
+    def _record_prompt(self, prompt_tokens: int, context_stats: Dict):
+        with self._metrics_lock:
+            metrics = self._prompt_metrics
+            metrics["prompts"] += 1
+            metrics["prompt_tokens_total"] += prompt_tokens
+            metrics["prompt_tokens_max"] = max(metrics["prompt_tokens_max"], prompt_tokens)
+            metrics["prompt_tokens_last"] = prompt_tokens
+            metrics["context_tokens_total"] += context_stats["tokens"]
+            metrics["context_items_used"] += context_stats["used"]
+            metrics["context_items_deduplicated"] += context_stats["deduplicated"]
+            metrics["context_items_truncated"] += context_stats["truncated"]
+            metrics["context_items_dropped"] += context_stats["dropped"]
+
+    def prompt_stats(self) -> Dict:
+        """Get prompt size counters (approximate tokens) for RAG prompts."""
+        with self._metrics_lock:
+            stats = dict(self._prompt_metrics)
+        prompts = stats["prompts"]
+        stats["prompt_tokens_avg"] = stats["prompt_tokens_total"] / prompts if prompts else 0.0
+        stats["context_tokens_avg"] = stats["context_tokens_total"] / prompts if prompts else 0.0
+        stats["context_budget_tokens"] = self.context_builder.max_tokens
+        return stats
 
-        return self._llm.invoke(final_prompt)
\ No newline at end of file
+    def reset_prompt_stats(self):
+        """Reset prompt size counters."""
+        with self._metrics_lock:
+            self._prompt_metrics = self._empty_prompt_metrics()
@@ -0,0 +1,309 @@
+"""
+Admission control for LLM generation.
+
+A local Ollama instance only generates a few responses at a time; extra
+requests just slow every response down. The scheduler hands out a fixed
+number of generation slots, keeps a bounded, priority-ordered wait queue
+with per-request deadlines and rejects quickly once the queue is full, so
+clients can back off (429/503 with Retry-After) instead of timing out.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+# Lower value = served first
+PRIORITY_CHECKOUT = 0
+PRIORITY_BROWSE = 10
+
+PRIORITY_NAMES = {PRIORITY_CHECKOUT: "checkout", PRIORITY_BROWSE: "browse"}
+
+
+class SchedulerRejected(Exception):
+    """A generation request was not admitted.
+
+    Attributes:
+        status_code: HTTP status to answer with (429 or 503)
+        retry_after: Suggested seconds to wait before retrying
+    """
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(SchedulerRejected):
+    """The wait queue was full, or the request was displaced by a higher priority one."""
+
+    status_code = 429
+
+
+class QueueTimeoutError(SchedulerRejected):
+    """No generation slot freed up before the request's deadline."""
+
+    status_code = 503
+
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "enqueued_at", "state", "event", "loop", "future")
+
+    def __init__(self, priority: int, deadline: float, loop=None, future=None):
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        # waiting -> granted | rejected | expired
+        self.state = "waiting"
+        self.event = threading.Event() if future is None else None
+        self.loop = loop
+        self.future = future
+
+
+def _resolve(future: "asyncio.Future"):
+    if not future.done():
+        future.set_result(None)
+
+
+class GenerationScheduler:
+    """Concurrency slots plus a bounded priority queue in front of the LLM.
+
+    Usable from threads (slot) and from asyncio code (aslot); both share
+    the same slots and queue. A freed slot is handed straight to the best
+    waiter (lowest priority value, then first come), so queued requests
+    are never overtaken by new arrivals.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_queue: int = 16,
+        queue_timeout_seconds: float = 20.0,
+    ):
+        """
+        Initialize generation scheduler.
+
+        Args:
+            max_concurrent: Generations allowed to run at once (match OLLAMA_NUM_PARALLEL)
+            max_queue: Requests allowed to wait for a slot; more are rejected
+            queue_timeout_seconds: Default deadline for getting a slot
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._lock = threading.Lock()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._queued = 0
+        # Moving average of how long a generation holds its slot
+        self._service_seconds: Optional[float] = None
+        self._waits = deque(maxlen=512)
+        self._counters = self._empty_counters()
+
+    @staticmethod
+    def _empty_counters() -> Dict:
+        return {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_full": 0,
+            "shed": 0,
+            "timed_out": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "max_queue_depth_seen": 0,
+            "admitted_by_priority": {},
+        }
+
+    # Public API
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None):
+        """
+        Hold a generation slot for the duration of the block.
+
+        Raises:
+            QueueFullError: The queue is full (raised without waiting)
+            QueueTimeoutError: No slot freed up within timeout
+        """
+        self.acquire(priority, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None):
+        """Async version of slot; waiting doesn't block the event loop."""
+        await self.aacquire(priority, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def acquire(self, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None):
+        """Wait for a generation slot (see slot). Pair with release()."""
+        waiter = self._enqueue(priority, timeout)
+        if waiter is None:
+            return
+        waiter.event.wait(max(0.0, waiter.deadline - time.monotonic()))
+        self._finish_wait(waiter)
+
+    async def aacquire(self, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None):
+        """Async version of acquire."""
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(priority, timeout, loop=loop, future=loop.create_future())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait({waiter.future}, timeout=max(0.0, waiter.deadline - time.monotonic()))
+        except asyncio.CancelledError:
+            # Client went away: give up the place in line, or the slot if it just arrived
+            with self._lock:
+                granted = waiter.state == "granted"
+                if waiter.state == "waiting":
+                    waiter.state = "expired"
+                    self._queued -= 1
+            if granted:
+                self.release()
+            raise
+        self._finish_wait(waiter)
+
+    def release(self, service_seconds: Optional[float] = None):
+        """Give a slot back, handing it to the best waiter if there is one."""
+        now = time.monotonic()
+        with self._lock:
+            if service_seconds is not None:
+                if self._service_seconds is None:
+                    self._service_seconds = service_seconds
+                else:
+                    self._service_seconds = 0.8 * self._service_seconds + 0.2 * service_seconds
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.state != "waiting":
+                    continue
+                self._queued -= 1
+                if waiter.deadline <= now:
+                    # About to time out anyway; don't spend the slot on it
+                    waiter.state = "expired"
+                    self._wake(waiter)
+                    continue
+                waiter.state = "granted"
+                self._wake(waiter)
+                return
+            self._active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying."""
+        with self._lock:
+            return self._retry_after_locked()
+
+    def stats(self) -> Dict:
+        """Get slot usage, queue depth, wait times and rejection counters."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["admitted_by_priority"] = dict(counters["admitted_by_priority"])
+            waits = sorted(self._waits)
+            active = self._active
+            queued = self._queued
+            service_seconds = self._service_seconds
+        admitted = counters["admitted"]
+        return {
+            **counters,
+            "active": active,
+            "queue_depth": queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "wait_seconds_avg": (counters["wait_seconds_total"] / admitted) if admitted else 0.0,
+            "wait_seconds_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "service_seconds_avg": service_seconds or 0.0,
+        }
+
+    def reset_stats(self):
+        """Reset counters (slots and queue are left alone)."""
+        with self._lock:
+            self._counters = self._empty_counters()
+            self._waits.clear()
+
+    # Internals
+
+    def _enqueue(self, priority: int, timeout: Optional[float], loop=None, future=None) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter)."""
+        timeout = self.queue_timeout_seconds if timeout is None else timeout
+        with self._lock:
+            if self._active < self.max_concurrent and self._queued == 0:
+                self._active += 1
+                self._record_admission(priority, 0.0)
+                return None
+
+            if self._queued >= self.max_queue and not self._shed_lower_priority(priority):
+                self._counters["rejected_full"] += 1
+                raise QueueFullError("Generation queue is full", self._retry_after_locked())
+
+            waiter = _Waiter(priority, time.monotonic() + timeout, loop=loop, future=future)
+            heapq.heappush(self._heap, (priority, next(self._sequence), waiter))
+            self._queued += 1
+            self._counters["queued"] += 1
+            self._counters["max_queue_depth_seen"] = max(self._counters["max_queue_depth_seen"], self._queued)
+            return waiter
+
+    def _shed_lower_priority(self, priority: int) -> bool:
+        """Reject the newest waiter of the lowest priority below this one, if any."""
+        victim = None
+        for entry in self._heap:
+            waiter = entry[2]
+            if waiter.state != "waiting" or waiter.priority <= priority:
+                continue
+            if victim is None or (entry[0], entry[1]) > (victim[0], victim[1]):
+                victim = entry
+        if victim is None:
+            return False
+        victim[2].state = "rejected"
+        self._queued -= 1
+        self._counters["shed"] += 1
+        self._wake(victim[2])
+        return True
+
+    def _finish_wait(self, waiter: _Waiter):
+        """Turn the outcome of a wait into a return (slot held) or an exception."""
+        with self._lock:
+            if waiter.state == "waiting":
+                waiter.state = "expired"
+                self._queued -= 1
+            if waiter.state == "granted":
+                self._record_admission(waiter.priority, time.monotonic() - waiter.enqueued_at)
+                return
+            retry_after = self._retry_after_locked()
+            if waiter.state == "rejected":
+                raise QueueFullError("Displaced by a higher priority request", retry_after)
+            self._counters["timed_out"] += 1
+        raise QueueTimeoutError("Timed out waiting for a generation slot", retry_after)
+
+    @staticmethod
+    def _wake(waiter: _Waiter):
+        if waiter.future is not None:
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+        else:
+            waiter.event.set()
+
+    def _record_admission(self, priority: int, wait_seconds: float):
+        counters = self._counters
+        counters["admitted"] += 1
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        counters["admitted_by_priority"][name] = counters["admitted_by_priority"].get(name, 0) + 1
+        counters["wait_seconds_total"] += wait_seconds
+        counters["wait_seconds_max"] = max(counters["wait_seconds_max"], wait_seconds)
+        self._waits.append(wait_seconds)
+
+    def _retry_after_locked(self) -> int:
+        # Time for the queue ahead to drain through the available slots
+        service_seconds = self._service_seconds or 1.0
+        return max(1, math.ceil(service_seconds * (self._queued + 1) / self.max_concurrent))
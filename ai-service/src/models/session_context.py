@@ -0,0 +1,157 @@
+"""
+Per-session Ollama context store.
+
+Ollama's generate API returns a `context` token array that encodes the
+conversation so far. Sending it back with the next turn lets the runtime
+reuse its KV cache for that prefix, so only the new turn is prefilled.
+"""
+
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+import threading
+import time
+
+import numpy as np
+
+
+class SessionContextStore:
+    """Bounded LRU store of Ollama context tokens, evicting idle sessions.
+
+    Tokens are kept as int32 arrays (4 bytes per token). A session whose
+    context outgrows max_tokens_per_session starts over on its next turn,
+    which also keeps it inside the model's context window.
+
+    Each session also remembers the product IDs its context was built from,
+    so it can be reset once one of those products changes.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        max_tokens_per_session: int = 4096,
+        idle_ttl_seconds: float = 900.0,
+    ):
+        """
+        Initialize session context store.
+
+        Args:
+            max_sessions: Maximum number of sessions kept (least recently used evicted)
+            max_tokens_per_session: Contexts longer than this are dropped
+                                    (keep it below the model's num_ctx)
+            idle_ttl_seconds: Sessions unused for this long are evicted
+        """
+        self.max_sessions = max_sessions
+        self.max_tokens_per_session = max_tokens_per_session
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resets = 0
+        self._sessions: "OrderedDict[str, Tuple[float, np.ndarray, FrozenSet[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[List[int]]:
+        """
+        Context tokens of a session's previous turn.
+
+        Returns:
+            Token list to send with the next generate call, or None to start fresh
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._sessions[session_id] = (now, entry[1], entry[2])
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entry[1].tolist()
+
+    def put(self, session_id: str, context: Optional[List[int]], product_ids: Iterable[str] = ()):
+        """
+        Remember the context returned by the latest turn of a session.
+
+        Args:
+            session_id: Session the turn belongs to
+            context: Context tokens returned by Ollama
+            product_ids: Products whose data went into this turn's prompt
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            previous = self._sessions.get(session_id)
+            if not context or len(context) > self.max_tokens_per_session:
+                if self._sessions.pop(session_id, None) is not None:
+                    self.resets += 1
+                return
+            # The context still holds every earlier turn's prompt
+            referenced = frozenset(str(pid) for pid in product_ids)
+            if previous is not None:
+                referenced |= previous[2]
+            self._sessions[session_id] = (now, np.asarray(context, dtype=np.int32), referenced)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def drop(self, session_id: str):
+        """Forget a session (e.g. when the conversation is reset)."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def drop_products(self, product_ids: Iterable[str]) -> int:
+        """
+        Forget every session whose context mentions any of the given products.
+
+        Returns:
+            Number of sessions reset
+        """
+        changed = {str(pid) for pid in product_ids}
+        with self._lock:
+            stale = [session_id for session_id, entry in self._sessions.items() if entry[2] & changed]
+            for session_id in stale:
+                del self._sessions[session_id]
+            self.resets += len(stale)
+        return len(stale)
+
+    def clear(self):
+        """Forget every session."""
+        with self._lock:
+            self.resets += len(self._sessions)
+            self._sessions.clear()
+
+    def _evict_idle(self, now: float):
+        if self.idle_ttl_seconds <= 0:
+            return
+        # Oldest first, so stop at the first session that is still fresh
+        while self._sessions:
+            session_id, (last_used, _, _) = next(iter(self._sessions.items()))
+            if now - last_used <= self.idle_ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Get session counts, token memory and hit/miss counters."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            tokens = sum(len(entry[1]) for entry in self._sessions.values())
+            sessions = len(self._sessions)
+        turns = self.hits + self.misses
+        return {
+            "sessions": sessions,
+            "tokens": tokens,
+            "bytes": tokens * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / turns) if turns else 0.0,
+            "evictions": self.evictions,
+            "resets": self.resets,
+            "max_sessions": self.max_sessions,
+            "max_tokens_per_session": self.max_tokens_per_session,
+        }
@@ -53,6 +53,9 @@ class Order:
     status: str = OrderStatus.PENDING.value
     created_at: Optional[str] = None
     notes: Optional[str] = None
+    # Chat session the order was placed from; lets the assistant tell that
+    # session its status
+    session_id: Optional[str] = None
     
     def __post_init__(self):
         """Initialize default values."""
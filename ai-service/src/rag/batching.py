@@ -0,0 +1,164 @@
+"""
+Micro-batching wrapper for query embeddings.
+Coalesces concurrent single-text embedding requests into one embed_batch call.
+"""
+
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+import asyncio
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .embeddings import EmbeddingModel
+
+
+class BatchingEmbedder:
+    """Drop-in replacement for EmbeddingModel that batches embed_text calls.
+
+    Callers of ``embed_text`` are queued; a background dispatcher thread waits
+    up to ``max_wait_ms`` (or until ``max_batch_size`` requests are queued)
+    and sends them to the wrapped model as a single ``embed_batch`` call.
+    Everything else is delegated to the wrapped model unchanged.
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Initialize batching embedder.
+
+        Args:
+            embedding_model: Underlying embedding model
+            max_batch_size: Maximum number of texts per embed_batch call
+            max_wait_ms: Maximum time to wait for more requests to join a batch
+        """
+        self.embedding_model = embedding_model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        if name == "embedding_model":
+            raise AttributeError(name)
+        return getattr(self.embedding_model, name)
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for embedding.
+
+        Args:
+            text: Input text to embed
+
+        Returns:
+            Future resolving to the embedding vector
+        """
+        self._ensure_dispatcher()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Embed a single text, sharing a provider call with concurrent callers."""
+        return self.submit(text).result()
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch directly (already batched, so no queueing)."""
+        return self.embedding_model.embed_batch(texts)
+
+    async def aembed_text(self, text: str) -> np.ndarray:
+        """Async embed_text: awaits the shared batch without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    async def aembed_batch(self, texts: List[str]) -> np.ndarray:
+        """Async embed_batch (no queueing)."""
+        return await self.embedding_model.aembed_batch(texts)
+
+    def stats(self) -> Dict:
+        """Get batching counters."""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": (self.requests / self.batches) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        """Stop the dispatcher thread after draining queued requests."""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def _ensure_dispatcher(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._dispatch_loop,
+                        name="embedding-batcher",
+                        daemon=True,
+                    )
+                    self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Grab whatever is already queued even once the wait is up
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._run_batch(batch)
+            except Exception as exc:
+                # Never let one bad batch stop the dispatcher: later callers would wait forever
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[tuple]):
+        # Skip requests whose caller gave up (e.g. a cancelled aembed_text)
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.embedding_model.embed_batch(texts)
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Embedding model returned {len(vectors)} vectors for {len(batch)} texts")
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.requests += len(batch)
+        for i, (_, future) in enumerate(batch):
+            future.set_result(np.asarray(vectors[i], dtype=np.float32))
@@ -0,0 +1,93 @@
+"""
+Result diversification for retrieved context.
+
+Catalogs often hold several near-identical variants of one product; filling
+the prompt with all of them wastes tokens. Maximal Marginal Relevance picks
+results that are relevant to the query but unlike the ones already picked.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def product_key(doc: Dict) -> Optional[str]:
+    """
+    Product ID behind a document, as a string, or None for non-product documents.
+
+    Catalog documents indexed by the assistant carry 'product_id'; documents
+    synced from the database carry the product ID as 'id' with type "product".
+    """
+    if doc.get('product_id') is not None:
+        return str(doc['product_id'])
+    if doc.get('type') == 'product' and doc.get('id') is not None:
+        return str(doc['id'])
+    return None
+
+
+def dedupe_by_product(docs: List[Dict]) -> List[Dict]:
+    """Keep only the first (best ranked) document of each product."""
+    seen = set()
+    unique = []
+    for doc in docs:
+        key = product_key(doc)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(doc)
+    return unique
+
+
+def mmr_select(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Pick k diverse candidates with Maximal Marginal Relevance.
+
+    Each step picks the candidate maximizing
+        lambda * sim(query, c) - (1 - lambda) * max(sim(c, already picked))
+    using cosine similarity. The candidate-candidate similarities are one
+    matrix product and every step is a vectorized update, so the cost is
+    O(n^2 d + k n) for n candidates.
+
+    Args:
+        query_embedding: Query vector, shape (d,)
+        candidate_embeddings: Candidate vectors, shape (n, d), in ranked order
+        k: Number of candidates to pick
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        Indices into candidate_embeddings, in pick order
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    n = candidates.shape[0] if candidates.ndim == 2 else 0
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.where(norms > 0, norms, 1.0)
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    query_norm = np.linalg.norm(query)
+    if query_norm > 0:
+        query = query / query_norm
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    selected = np.zeros(n, dtype=bool)
+
+    # The first pick has nothing to be redundant with
+    picks = [int(np.argmax(relevance))]
+    for _ in range(k - 1):
+        last = picks[-1]
+        selected[last] = True
+        np.maximum(max_similarity, similarity[last], out=max_similarity)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        picks.append(int(np.argmax(scores)))
+    return picks
@@ -0,0 +1,251 @@
+"""
+Persistent embedding cache for the RAG system.
+Stores float32 vectors on disk keyed by (provider, model, text hash) so
+unchanged text is never sent to the embedding provider twice.
+"""
+
+from typing import Dict, List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Content-addressed, size-bounded on-disk cache of embedding vectors.
+
+    Vectors are stored as raw float32 bytes in a small SQLite file. When the
+    total stored size exceeds ``max_bytes`` the least recently used entries
+    are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_path: Optional[str] = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        access_flush_seconds: float = 5.0,
+        access_flush_size: int = 1024,
+    ):
+        """
+        Initialize embedding cache.
+
+        Args:
+            cache_path: Path to the SQLite cache file
+            max_bytes: Maximum total size of cached vectors before eviction
+            access_flush_seconds: Write buffered last-access times at most
+                                  this long after the oldest unwritten hit
+            access_flush_size: Write them once this many keys are buffered
+        """
+        self.cache_path = cache_path or "data/embedding_cache/embeddings.db"
+        self.max_bytes = max_bytes
+        self.access_flush_seconds = access_flush_seconds
+        self.access_flush_size = access_flush_size
+        # Hits only refresh LRU order, so their last_access writes are batched
+        self._pending_access: Dict[str, float] = {}
+        self._last_access_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        Path(os.path.dirname(self.cache_path) or ".").mkdir(parents=True, exist_ok=True)
+        self._init_sqlite()
+
+    def _init_sqlite(self):
+        """Initialize SQLite database and tables."""
+        self._connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+        cursor = self._connection.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER,
+                vector BLOB,
+                nbytes INTEGER,
+                last_access REAL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)")
+        self._connection.commit()
+        row = cursor.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+        self._total_bytes = int(row[0])
+
+    @staticmethod
+    def make_key(provider: str, model_name: str, text: str) -> str:
+        """Build the cache key for a piece of text."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{provider}:{model_name}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up several keys at once.
+
+        Args:
+            keys: Cache keys to look up
+
+        Returns:
+            Mapping of found keys to their vectors
+        """
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            cursor = self._connection.cursor()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = cursor.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+
+            if found:
+                now = time.time()
+                for key in found:
+                    self._pending_access[key] = now
+                if (
+                    len(self._pending_access) >= self.access_flush_size
+                    or time.monotonic() - self._last_access_flush >= self.access_flush_seconds
+                ):
+                    self._flush_access(cursor)
+                    self._connection.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up a single key."""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """
+        Store several vectors at once.
+
+        Args:
+            items: Mapping of cache keys to vectors
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, int(np.asarray(vector).shape[-1]), blob, len(blob), now))
+
+        with self._lock:
+            cursor = self._connection.cursor()
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start:start + 500]]
+                placeholders = ",".join("?" * len(chunk))
+                replaced += cursor.execute(
+                    f"SELECT COALESCE(SUM(nbytes), 0) FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchone()[0]
+            cursor.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, nbytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            for row in rows:
+                self._pending_access.pop(row[0], None)
+            # Eviction must see the real LRU order
+            self._flush_access(cursor)
+            self._connection.commit()
+            self._total_bytes += sum(row[3] for row in rows) - int(replaced)
+            self._evict_if_needed(cursor)
+
+    def put(self, key: str, vector: np.ndarray):
+        """Store a single vector."""
+        self.put_many({key: vector})
+
+    def flush(self):
+        """Write buffered last-access times to disk."""
+        with self._lock:
+            if self._connection is None:
+                return
+            self._flush_access(self._connection.cursor())
+            self._connection.commit()
+
+    def _flush_access(self, cursor: sqlite3.Cursor):
+        """Write buffered last-access times (caller holds the lock and commits)."""
+        self._last_access_flush = time.monotonic()
+        if not self._pending_access:
+            return
+        cursor.executemany(
+            "UPDATE embeddings SET last_access = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._pending_access.items()],
+        )
+        self._pending_access.clear()
+
+    def _evict_if_needed(self, cursor: sqlite3.Cursor, batch_size: int = 256):
+        """Evict least recently used entries until under ``max_bytes``."""
+        if self.max_bytes <= 0 or self._total_bytes <= self.max_bytes:
+            return
+        # Free down to 90% of the budget so we don't evict on every insert
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while self._total_bytes > target:
+            # Walks the last_access index; only the oldest few rows are read
+            rows = cursor.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_access ASC LIMIT ?",
+                (batch_size,),
+            ).fetchall()
+            if not rows:
+                break
+            to_delete = []
+            for key, nbytes in rows:
+                if self._total_bytes <= target:
+                    break
+                to_delete.append((key,))
+                self._total_bytes -= nbytes
+            cursor.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+            evicted += len(to_delete)
+        self._connection.commit()
+        self.evictions += evicted
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and size information."""
+        # One consistent snapshot: counters and sizes change under the same lock
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+            total_bytes = self._total_bytes
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": (hits / lookups) if lookups else 0.0,
+            "evictions": evictions,
+            "entries": int(entries),
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def reset_stats(self):
+        """Reset hit/miss counters."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def clear(self):
+        """Remove all cached vectors."""
+        with self._lock:
+            self._connection.execute("DELETE FROM embeddings")
+            self._connection.commit()
+            self._pending_access.clear()
+            self._total_bytes = 0
+
+    def close(self):
+        """Close the cache database."""
+        if self._connection:
+            self.flush()
+            self._connection.close()
+            self._connection = None
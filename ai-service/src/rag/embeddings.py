@@ -2,13 +2,23 @@
 Embedding module for RAG system.
 Now uses local Ollama embeddings by default (e.g. mxbai-embed-large),
 with an optional fallback to sentence-transformers if desired.
+The "hash" provider is a deterministic, model-free stand-in for tests and
+benchmarks.
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import asyncio
+import hashlib
 import os
+import re
 
 import numpy as np
 
+from ..models.host_pool import HostPool
+from .embedding_cache import EmbeddingCache
+
+_WORD = re.compile(r"\w+")
+
 
 class EmbeddingModel:
     """Embedding model wrapper for RAG.
@@ -17,13 +27,20 @@ class EmbeddingModel:
     package and an embedding model such as `mxbai-embed-large`.
 
     You can still use sentence-transformers by setting provider="sentence-transformers".
+
+    provider="hash" needs no model at all: each word is hashed to a signed
+    position of a fixed-size vector (feature hashing). Texts sharing words
+    get similar vectors, and the same text always gets the same vector.
     """
 
     def __init__(
         self,
         model_name: str = "mxbai-embed-large",
         provider: str = "ollama",
-        base_url: Optional[str] = None,
+        base_url: Optional[Union[str, Sequence[str]]] = None,
+        cache: Optional[EmbeddingCache] = None,
+        dimension: int = 384,
+        host_pool: Optional[HostPool] = None,
     ):
         """
         Initialize embedding model.
@@ -34,19 +51,35 @@ class EmbeddingModel:
                         For sentence-transformers, e.g. "sentence-transformers/all-MiniLM-L6-v2".
             provider:   "ollama" (default) or "sentence-transformers".
             base_url:   Ollama base URL, defaults to http://localhost:11434.
+                        A list of URLs spreads requests over several hosts.
+            cache:      Optional persistent EmbeddingCache. When set, texts that
+                        were embedded before are served from disk.
+            dimension:  Vector size (provider="hash" only).
+            host_pool:  Optional HostPool to route Ollama requests through
+                        (e.g. one shared with the LLMHandler). Built from
+                        base_url if omitted.
         """
         self.model_name = model_name
         self.provider = provider or "ollama"
-        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.host_pool = host_pool or HostPool(
+            base_url or os.getenv("OLLAMA_BASE_URL") or os.getenv("OLLAMA_HOST") or "http://localhost:11434"
+        )
+        self.base_url = self.host_pool.hosts[0]
+
+        self.cache = cache
+        self.dimension = dimension
+        self._hash_slots: Dict[str, tuple] = {}
 
-        self._ollama_client = None
+        self._ollama_module = None
+        self._ollama_clients: Dict[str, object] = {}
+        self._ollama_async_clients: Dict[str, object] = {}
         self._st_model = None
 
     # ---------------------------------------------------------------------
     # Provider initialisation helpers
     # ---------------------------------------------------------------------
-    def _ensure_ollama_client(self):
-        if self._ollama_client is None:
+    def _ensure_ollama_module(self):
+        if self._ollama_module is None:
             try:
                 import ollama  # type: ignore
             except ImportError as exc:
@@ -54,11 +87,28 @@ class EmbeddingModel:
                     "The 'ollama' Python package is required for Ollama embeddings. "
                     "Install it with: pip install ollama"
                 ) from exc
+            self._ollama_module = ollama
+        return self._ollama_module
 
-            # The official client doesn't need explicit base_url here; it will
-            # use OLLAMA_HOST env var if set. We keep base_url mainly for
-            # future custom HTTP usage.
-            self._ollama_client = ollama
+    def _client_options(self) -> Dict:
+        timeout = self.host_pool.request_timeout_seconds
+        return {"timeout": timeout} if timeout else {}
+
+    def _ollama_client(self, host: str):
+        """Sync Ollama client for one host of the pool."""
+        client = self._ollama_clients.get(host)
+        if client is None:
+            client = self._ensure_ollama_module().Client(host=host, **self._client_options())
+            self._ollama_clients[host] = client
+        return client
+
+    def _ollama_async_client(self, host: str):
+        """Async Ollama client for one host of the pool."""
+        client = self._ollama_async_clients.get(host)
+        if client is None:
+            client = self._ensure_ollama_module().AsyncClient(host=host, **self._client_options())
+            self._ollama_async_clients[host] = client
+        return client
 
     def _ensure_sentence_transformers_model(self):
         if self._st_model is None:
@@ -85,16 +135,117 @@ class EmbeddingModel:
         Returns:
             Embedding vector as numpy array.
         """
+        if self.cache is None:
+            return self._embed_text_uncached(text)
+
+        keys, found, missing = self._cache_lookup([text])
+        new_vectors = [self._embed_text_uncached(text)] if missing else None
+        return self._cache_store(keys, found, missing, new_vectors)[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for a batch of texts.
+
+        Only cache misses are sent to the provider; results are returned in
+        input order.
+
+        Args:
+            texts: List of texts to embed.
+
+        Returns:
+            Array of embedding vectors (shape: [len(texts), dim]).
+        """
+        if self.cache is None or not texts:
+            return self._embed_batch_uncached(texts)
+
+        keys, found, missing = self._cache_lookup(texts)
+        new_vectors = self._embed_batch_uncached(list(missing.values())) if missing else None
+        return self._cache_store(keys, found, missing, new_vectors)
+
+    async def aembed_text(self, text: str) -> np.ndarray:
+        """
+        Async version of embed_text.
+
+        Ollama is called through its async client, so the event loop is free
+        while the model runs; other providers and the SQLite cache run in a
+        worker thread.
+        """
+        if self.cache is None:
+            return await self._aembed_text_uncached(text)
+
+        keys, found, missing = await asyncio.to_thread(self._cache_lookup, [text])
+        if not missing:
+            return found[keys[0]]
+        new_vectors = [await self._aembed_text_uncached(text)]
+        return (await asyncio.to_thread(self._cache_store, keys, found, missing, new_vectors))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> np.ndarray:
+        """Async version of embed_batch; only cache misses are sent to the provider."""
+        if self.cache is None or not texts:
+            return await self._aembed_batch_uncached(texts)
+
+        keys, found, missing = await asyncio.to_thread(self._cache_lookup, texts)
+        if not missing:
+            return self._cache_store(keys, found, missing, None)
+        new_vectors = await self._aembed_batch_uncached(list(missing.values()))
+        return await asyncio.to_thread(self._cache_store, keys, found, missing, new_vectors)
+
+    def cache_stats(self) -> Dict:
+        """Get embedding cache hit/miss counters (empty if caching is off)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def get_embedding_dimension(self) -> int:
+        """Get the dimension of embeddings."""
+        dummy_embedding = self.embed_text("dummy")
+        return int(dummy_embedding.shape[0])
+
+    # ---------------------------------------------------------------------
+    # Provider calls
+    # ---------------------------------------------------------------------
+    def _cache_key(self, text: str) -> str:
+        model_name = self.model_name
+        if self.provider == "hash":
+            # Hash vectors depend only on the dimension, not on model_name
+            model_name = f"{model_name}@{self.dimension}"
+        return EmbeddingCache.make_key(self.provider, model_name, text)
+
+    def _cache_lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """Cache keys of texts, the vectors already cached, and each distinct miss (key -> text)."""
+        keys = [self._cache_key(text) for text in texts]
+        found: Dict[str, np.ndarray] = self.cache.get_many(keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _cache_store(
+        self,
+        keys: List[str],
+        found: Dict[str, np.ndarray],
+        missing: Dict[str, str],
+        new_vectors,
+    ) -> np.ndarray:
+        """Cache the vectors embedded for the misses; returns every vector in input order."""
+        if missing:
+            new_vectors = np.asarray(new_vectors, dtype=np.float32)
+            fresh = {key: new_vectors[i] for i, key in enumerate(missing)}
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def _embed_text_uncached(self, text: str) -> np.ndarray:
+        if self.provider == "hash":
+            return self._hash_embed([text])[0]
+
         if self.provider == "sentence-transformers":
             self._ensure_sentence_transformers_model()
             embedding = self._st_model.encode(text, convert_to_numpy=True)
             return embedding
 
         # Default: Ollama embeddings
-        self._ensure_ollama_client()
-        response = self._ollama_client.embed(
-            model=self.model_name,
-            input=text,
+        response = self.host_pool.call(
+            lambda host: self._ollama_client(host).embed(model=self.model_name, input=text)
         )
         embeddings = response.get("embeddings")
 
@@ -106,16 +257,33 @@ class EmbeddingModel:
 
         return np.asarray(vector, dtype=np.float32)
 
-    def embed_batch(self, texts: List[str]) -> np.ndarray:
-        """
-        Generate embeddings for a batch of texts.
+    async def _aembed_text_uncached(self, text: str) -> np.ndarray:
+        if self.provider != "ollama":
+            return await asyncio.to_thread(self._embed_text_uncached, text)
 
-        Args:
-            texts: List of texts to embed.
+        response = await self.host_pool.acall(
+            lambda host: self._ollama_async_client(host).embed(model=self.model_name, input=text)
+        )
+        embeddings = response.get("embeddings")
+        if isinstance(embeddings, list) and embeddings and isinstance(embeddings[0], list):
+            vector = embeddings[0]
+        else:
+            vector = embeddings
+        return np.asarray(vector, dtype=np.float32)
+
+    async def _aembed_batch_uncached(self, texts: List[str]) -> np.ndarray:
+        if self.provider != "ollama":
+            return await asyncio.to_thread(self._embed_batch_uncached, texts)
+
+        response = await self.host_pool.acall(
+            lambda host: self._ollama_async_client(host).embed(model=self.model_name, input=texts)
+        )
+        return np.asarray(response.get("embeddings", []), dtype=np.float32)
+
+    def _embed_batch_uncached(self, texts: List[str]) -> np.ndarray:
+        if self.provider == "hash":
+            return self._hash_embed(texts)
 
-        Returns:
-            Array of embedding vectors (shape: [len(texts), dim]).
-        """
         if self.provider == "sentence-transformers":
             self._ensure_sentence_transformers_model()
             embeddings = self._st_model.encode(
@@ -126,16 +294,31 @@ class EmbeddingModel:
             return embeddings
 
         # Default: Ollama embeddings
-        self._ensure_ollama_client()
-        response = self._ollama_client.embed(
-            model=self.model_name,
-            input=texts,
+        response = self.host_pool.call(
+            lambda host: self._ollama_client(host).embed(model=self.model_name, input=texts)
         )
         embeddings = response.get("embeddings", [])
         return np.asarray(embeddings, dtype=np.float32)
 
-    def get_embedding_dimension(self) -> int:
-        """Get the dimension of embeddings."""
-        dummy_embedding = self.embed_text("dummy")
-        return int(dummy_embedding.shape[0])
+    def _hash_embed(self, texts: List[str]) -> np.ndarray:
+        """Feature-hash lowercase words into L2-normalized vectors."""
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                slot = self._hash_slots.get(word)
+                if slot is None:
+                    digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                    slot = (digest % self.dimension, 1.0 if (digest >> 63) else -1.0)
+                    if len(self._hash_slots) < 1_000_000:
+                        self._hash_slots[word] = slot
+                rows.append(row)
+                columns.append(slot[0])
+                signs.append(slot[1])
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
 
@@ -0,0 +1,477 @@
+"""
+FAISS vector index with stable document labels.
+Every document gets an int64 label that never changes while it is stored,
+so single documents can be replaced or removed without rebuilding the index.
+Metadata lives in a ColumnarMetadata store whose row number is the label.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import re
+
+import numpy as np
+
+from .metadata_store import ColumnarMetadata
+
+
+class FaissIndex:
+    """FAISS index addressed by document ID instead of insertion position.
+
+    Flat and HNSW indexes are wrapped in an ``IndexIDMap2``; IVF indexes
+    store labels natively. Indexes that cannot remove vectors (HNSW) keep
+    deleted documents as tombstones that are filtered out at search time,
+    and every index is compacted once too many rows are dead.
+    """
+
+    INDEX_SUFFIX = ".index"
+    METADATA_SUFFIX = "_metadata.bin"
+    LEGACY_METADATA_SUFFIX = "_metadata.json"
+    DELETED_SUFFIX = "_deleted.npy"
+
+    # Filtered searches matching at most this many rows are scored exactly
+    FILTER_EXACT_MAX_ROWS = 2048
+
+    # Compact (drop dead rows and relabel) once this fraction of rows is deleted
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, index_factory: str = "Flat", nprobe: int = 8, ef_search: int = 64):
+        """
+        Initialize FAISS index.
+
+        Args:
+            index_factory: FAISS index factory string, e.g. "Flat",
+                           "IVF256,Flat", "IVF256,PQ32" or "HNSW32"
+            nprobe: Number of IVF lists probed per search (IVF indexes only)
+            ef_search: HNSW search beam width (HNSW indexes only)
+        """
+        self.index_factory = index_factory or "Flat"
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self._index = None
+        self._fallback = False
+        self._metadata = ColumnarMetadata()
+        self._deleted = np.zeros(0, dtype=bool)
+        self._label_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._label_of)
+
+    @staticmethod
+    def _faiss():
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError("FAISS is required. Install with: pip install faiss-cpu")
+        return faiss
+
+    @property
+    def _n_deleted(self) -> int:
+        """Rows (labels) whose document has been deleted or replaced."""
+        return len(self._metadata) - len(self._label_of)
+
+    @property
+    def _n_stale(self) -> int:
+        """Deleted vectors still physically present in the index."""
+        return 0 if self._index is None else self._index.ntotal - len(self._label_of)
+
+    # ------------------------------------------------------------------
+    # Index construction
+    # ------------------------------------------------------------------
+    def _create_index(self, dimension: int, training_vectors: Optional[np.ndarray] = None):
+        """
+        Create an empty index from the configured factory string.
+
+        Indexes that need training (IVF, PQ) are trained on training_vectors.
+        If there are too few vectors to train, a flat index is used instead
+        until the next rebuild.
+        """
+        faiss = self._faiss()
+        index = faiss.index_factory(dimension, self.index_factory, faiss.METRIC_L2)
+        self._fallback = False
+        if not index.is_trained:
+            n_train = 0 if training_vectors is None else training_vectors.shape[0]
+            if n_train < self._min_training_size():
+                print(
+                    f"Warning: {n_train} vectors are too few to train FAISS index "
+                    f"'{self.index_factory}'; using a flat index for now."
+                )
+                index = faiss.IndexFlatL2(dimension)
+                self._fallback = True
+            else:
+                index.train(training_vectors)
+
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # IVF lists hold labels themselves; a hashtable direct map lets
+            # them be reconstructed and removed by label
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        else:
+            index = faiss.IndexIDMap2(index)
+        self._index = index
+
+    def _min_training_size(self) -> int:
+        """Minimum number of vectors needed to train the configured index."""
+        minimum = 1
+        nlist = re.search(r'IVF(\d+)', self.index_factory)
+        if nlist:
+            minimum = max(minimum, int(nlist.group(1)))
+        if 'PQ' in self.index_factory:
+            # 8-bit PQ codebooks need at least 256 training points
+            minimum = max(minimum, 256)
+        return minimum
+
+    def _rebuild(self, vectors: np.ndarray, labels: np.ndarray):
+        """Rebuild (and retrain if needed) the index from the given vectors."""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        self._create_index(vectors.shape[1], vectors if len(vectors) else None)
+        if len(vectors):
+            self._index.add_with_ids(vectors, np.asarray(labels, dtype='int64'))
+
+    def _reconstruct(self, labels: np.ndarray) -> np.ndarray:
+        """
+        Recover stored vectors by label.
+
+        Vectors are not kept in a second copy; flat and HNSW indexes return
+        them exactly, PQ indexes return their (lossy) decoded codes.
+        """
+        labels = np.asarray(labels, dtype='int64')
+        if len(labels) == 0:
+            return np.zeros((0, self._index.d), dtype='float32')
+        return self._index.reconstruct_batch(labels)
+
+    def _live_labels(self) -> np.ndarray:
+        return np.flatnonzero(~self._deleted).astype('int64')
+
+    def _compact(self):
+        """
+        Drop dead rows and relabel the survivors 0..n-1.
+
+        Stored vectors are relabelled in place, never re-encoded, so lossy
+        (PQ) indexes don't lose precision with every compaction. Only an
+        index still holding tombstoned vectors (HNSW) is rebuilt, from its
+        exactly reconstructed vectors.
+        """
+        live = self._live_labels()
+        if self._n_stale:
+            vectors = self._reconstruct(live)
+            self._rebuild(vectors, np.arange(len(live)))
+        else:
+            new_labels = np.full(len(self._deleted), -1, dtype='int64')
+            new_labels[live] = np.arange(len(live))
+            self._relabel(new_labels)
+        self._metadata.keep_rows(live)
+        self._deleted = np.zeros(len(live), dtype=bool)
+        self._label_of = {self._metadata.get_id(row): row for row in range(len(live))}
+
+    def _relabel(self, new_labels: np.ndarray):
+        """Replace every stored label l with new_labels[l], keeping the encoded vectors."""
+        faiss = self._faiss()
+        ivf = faiss.try_extract_index_ivf(self._index)
+        if ivf is None:
+            id_map = faiss.vector_to_array(self._index.id_map)
+            faiss.copy_array_to_vector(new_labels[id_map], self._index.id_map)
+            self._index.construct_rev_map()
+            return
+
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size == 0:
+                continue
+            labels = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+            relabelled = np.ascontiguousarray(new_labels[labels])
+            invlists.update_entries(list_no, 0, size, faiss.swig_ptr(relabelled), faiss.swig_ptr(codes))
+        # Rebuild the label -> (list, offset) hashtable
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def add(self, embeddings: np.ndarray, documents: List[Dict], ids: List[str]):
+        """
+        Add documents; documents whose ID is already stored are replaced.
+
+        Args:
+            embeddings: Array of document embeddings
+            documents: List of document dictionaries with metadata
+            ids: Document IDs
+        """
+        if not ids:
+            return
+        vectors = np.ascontiguousarray(embeddings, dtype='float32').reshape(len(ids), -1)
+
+        # Later duplicates in the same call win
+        position_of = {doc_id: i for i, doc_id in enumerate(ids)}
+        positions = sorted(position_of.values())
+        if len(positions) != len(ids):
+            vectors = vectors[positions]
+            ids = [ids[i] for i in positions]
+            documents = [documents[i] for i in positions]
+        self._remove([doc_id for doc_id in ids if doc_id in self._label_of])
+
+        start = len(self._metadata)
+        labels = np.arange(start, start + len(ids), dtype='int64')
+        metas = []
+        for doc_id, doc in zip(ids, documents):
+            meta = doc.copy()
+            meta['id'] = doc_id
+            metas.append(meta)
+        self._metadata.append(metas)
+        self._deleted = np.concatenate([self._deleted, np.zeros(len(ids), dtype=bool)])
+        for doc_id, label in zip(ids, labels):
+            self._label_of[doc_id] = int(label)
+
+        if self._index is None or self._fallback:
+            # (Re)build so trainable indexes are trained on everything we have.
+            # The new labels are the highest live ones, so they come last.
+            existing = self._live_labels()[:-len(ids)]
+            if self._index is not None and len(existing):
+                vectors = np.concatenate([self._reconstruct(existing), vectors])
+            self._rebuild(vectors, np.concatenate([existing, labels]))
+        else:
+            self._index.add_with_ids(vectors, labels)
+        # Replacing documents leaves tombstones just like deleting them
+        self._compact_if_needed()
+
+    def upsert(self, embeddings: np.ndarray, documents: List[Dict], ids: List[str]):
+        """Insert new documents or replace existing ones with the same IDs."""
+        self.add(embeddings, documents, ids)
+
+    def delete(self, ids: List[str]):
+        """Delete documents by ID. Unknown IDs are ignored."""
+        self._remove(ids)
+        self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        if self._n_deleted > self.COMPACT_RATIO * len(self._metadata):
+            self._compact()
+
+    def _remove(self, ids: List[str]):
+        """Remove vectors by document ID, leaving tombstones if the index can't."""
+        labels = np.array(
+            [self._label_of.pop(doc_id) for doc_id in set(ids) if doc_id in self._label_of],
+            dtype='int64'
+        )
+        if len(labels) == 0:
+            return
+        self._deleted[labels] = True
+        try:
+            self._index.remove_ids(labels)
+        except RuntimeError:
+            # HNSW graphs can't drop nodes; search skips the tombstones
+            pass
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filters: Optional[Dict] = None,
+    ) -> List[List[Dict]]:
+        """
+        Find the k nearest documents for each of several queries.
+
+        Args:
+            query_embeddings: Array of query embeddings (shape: [n_queries, dim])
+            k: Number of top results to return per query
+            filters: Optional metadata filter applied to every query
+
+        Returns:
+            One result list per query, with squared-L2 'distance' and 'score'
+        """
+        n_queries = query_embeddings.shape[0]
+        if self._index is None or len(self._label_of) == 0:
+            return [[] for _ in range(n_queries)]
+
+        self._apply_search_params()
+        queries = np.ascontiguousarray(query_embeddings, dtype='float32')
+        mask = self._metadata.mask_for(filters)
+        if mask is not None and self._n_deleted:
+            mask = mask & ~self._deleted
+        elif mask is None and self._n_stale:
+            mask = ~self._deleted
+        if mask is None:
+            distances, labels = self._index.search(queries, k)
+        else:
+            distances, labels = self._filtered_search(queries, k, mask)
+
+        all_results = []
+        for q in range(n_queries):
+            results = []
+            for i, label in enumerate(labels[q]):
+                # Approximate indexes pad missing hits with -1
+                if 0 <= label < len(self._metadata) and not self._deleted[label]:
+                    # Only the k hit rows are decoded
+                    result = self._metadata.get(int(label))
+                    result['score'] = float(distances[q][i])
+                    result['distance'] = float(distances[q][i])
+                    results.append(result)
+            all_results.append(results)
+        return all_results
+
+    def _apply_search_params(self):
+        """Apply the configured nprobe / efSearch to the current index."""
+        faiss = self._faiss()
+        ivf = faiss.try_extract_index_ivf(self._index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        hnsw = self._hnsw()
+        if hnsw is not None:
+            hnsw.efSearch = self.ef_search
+
+    def _hnsw(self):
+        """The HNSW graph of the index, if it is an HNSW index."""
+        index = self._index
+        if hasattr(index, 'id_map'):
+            index = self._faiss().downcast_index(index.index)
+        return getattr(index, 'hnsw', None)
+
+    def _filtered_search(self, queries: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search only the labels selected by a boolean mask.
+
+        Small candidate sets are scored exactly; larger ones are searched in
+        the index with an IDSelectorBitmap so FAISS skips non-matching labels.
+        """
+        faiss = self._faiss()
+        labels = np.flatnonzero(mask)
+        if len(labels) <= max(self.FILTER_EXACT_MAX_ROWS, k):
+            return self._exact_search(queries, k, labels)
+
+        # Labels are metadata rows, so the bitmap covers every label
+        bits = np.packbits(mask, bitorder='little')
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
+        if faiss.try_extract_index_ivf(self._index) is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        elif self._hnsw() is not None:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        distances, found = self._index.search(queries, k, params=params)
+
+        # Approximate indexes can come back short on selective filters
+        short = np.flatnonzero((found < 0).any(axis=1))
+        if len(short):
+            exact_distances, exact_found = self._exact_search(queries[short], k, labels)
+            distances[short] = exact_distances
+            found[short] = exact_found
+        return distances, found
+
+    def _exact_search(self, queries: np.ndarray, k: int, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact squared-L2 search over the given labels (padded with -1)."""
+        faiss = self._faiss()
+        distances = np.full((queries.shape[0], k), np.inf, dtype='float32')
+        found_labels = np.full((queries.shape[0], k), -1, dtype='int64')
+        if len(labels) == 0:
+            return distances, found_labels
+        vectors = self._reconstruct(labels)
+
+        found_distances, found = faiss.knn(queries, vectors, min(k, len(labels)))
+        distances[:, :found.shape[1]] = found_distances
+        found_labels[:, :found.shape[1]] = np.where(found >= 0, labels[np.maximum(found, 0)], -1)
+        return distances, found_labels
+
+    def iter_documents(self) -> Iterator[Dict]:
+        """Iterate over stored document metadata."""
+        for label in self._label_of.values():
+            yield self._metadata.get(label)
+
+    def get_fingerprints(self) -> Dict[str, str]:
+        """Get {document ID: fingerprint} for fingerprinted documents."""
+        fingerprints = {}
+        for doc_id, label in self._label_of.items():
+            fingerprint = self._metadata.get_fingerprint(label)
+            if fingerprint:
+                fingerprints[doc_id] = fingerprint
+        return fingerprints
+
+    def get_ids(self) -> List[str]:
+        """Get the ID of every live document."""
+        return list(self._label_of)
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Get {document ID: stored vector} for live documents; unknown IDs are left out."""
+        found = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._label_of]
+        if self._index is None or not found:
+            return {}
+        vectors = self._reconstruct(np.array([self._label_of[doc_id] for doc_id in found], dtype='int64'))
+        return dict(zip(found, vectors))
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: str):
+        """Write the index, metadata and tombstones next to ``path``."""
+        if self._index is not None:
+            faiss = self._faiss()
+            index_path = f"{path}{self.INDEX_SUFFIX}"
+            faiss.write_index(self._index, f"{index_path}.tmp")
+            os.replace(f"{index_path}.tmp", index_path)
+
+        # Save metadata as a columnar binary sidecar
+        self._metadata.save(f"{path}{self.METADATA_SUFFIX}")
+        deleted_path = f"{path}{self.DELETED_SUFFIX}"
+        with open(f"{deleted_path}.tmp", 'wb') as f:
+            np.save(f, self._deleted)
+        os.replace(f"{deleted_path}.tmp", deleted_path)
+
+    def load(self, path: str) -> bool:
+        """
+        Load an index saved with ``save``.
+
+        Indexes saved before labels were introduced (positional rows) are
+        converted on load.
+
+        Returns:
+            True if an index was found and loaded
+        """
+        faiss = self._faiss()
+        index_path = f"{path}{self.INDEX_SUFFIX}"
+        if not os.path.exists(index_path):
+            return False
+        try:
+            index = faiss.read_index(index_path)
+        except Exception as e:
+            print(f"Warning: Could not load FAISS index: {e}")
+            return False
+
+        # Load metadata (memory-mapped; rows are decoded on demand)
+        metadata_path = f"{path}{self.METADATA_SUFFIX}"
+        legacy_metadata_path = f"{path}{self.LEGACY_METADATA_SUFFIX}"
+        if os.path.exists(metadata_path):
+            self._metadata = ColumnarMetadata.load(metadata_path)
+        elif os.path.exists(legacy_metadata_path):
+            with open(legacy_metadata_path, 'r') as f:
+                self._metadata = ColumnarMetadata.from_documents(json.load(f))
+        else:
+            self._metadata = ColumnarMetadata()
+
+        deleted_path = f"{path}{self.DELETED_SUFFIX}"
+        if os.path.exists(deleted_path):
+            self._deleted = np.array(np.load(deleted_path), dtype=bool)
+        else:
+            self._deleted = np.zeros(len(self._metadata), dtype=bool)
+        self._label_of = {
+            self._metadata.get_id(row): row for row in np.flatnonzero(~self._deleted).tolist()
+        }
+
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # Positional IVF indexes already used row numbers as ids
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            self._index = index
+        elif hasattr(index, 'id_map'):
+            self._index = index
+        else:
+            # Old flat/HNSW index: its positions are the metadata rows
+            vectors = index.reconstruct_n(0, index.ntotal)
+            self._rebuild(vectors, np.arange(index.ntotal))
+        inner = faiss.downcast_index(self._index.index) if hasattr(self._index, 'id_map') else self._index
+        # A flat index standing in for an untrained one is replaced on the next add
+        self._fallback = isinstance(inner, faiss.IndexFlat) and self._min_training_size() > 1
+        return True
@@ -0,0 +1,112 @@
+"""
+Structured metadata filters for vector search.
+
+A filter is a plain dictionary with any of these keys:
+    category:  exact category name (case-sensitive, as stored)
+    type:      document type, e.g. "product" or "training_example"
+    min_price: inclusive lower price bound
+    max_price: inclusive upper price bound
+    in_stock:  True for stock > 0, False for stock <= 0
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+FILTER_KEYS = ("category", "type", "min_price", "max_price", "in_stock")
+
+
+def validate_filters(filters: Optional[Dict]) -> Dict:
+    """
+    Check a filter dictionary and drop keys whose value is None.
+
+    Raises:
+        ValueError: If the filter has unknown keys
+    """
+    if not filters:
+        return {}
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {sorted(unknown)}. Supported: {list(FILTER_KEYS)}")
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def filters_key(filters: Optional[Dict]) -> tuple:
+    """Hashable, order-independent key for a filter dictionary."""
+    return tuple(sorted(validate_filters(filters).items()))
+
+
+def to_chroma_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """Translate a filter dictionary into a ChromaDB ``where`` clause."""
+    filters = validate_filters(filters)
+    clauses = []
+    if "category" in filters:
+        clauses.append({"category": {"$eq": filters["category"]}})
+    if "type" in filters:
+        clauses.append({"type": {"$eq": filters["type"]}})
+    if "min_price" in filters:
+        clauses.append({"price": {"$gte": float(filters["min_price"])}})
+    if "max_price" in filters:
+        clauses.append({"price": {"$lte": float(filters["max_price"])}})
+    if "in_stock" in filters:
+        clauses.append({"stock": {"$gt": 0} if filters["in_stock"] else {"$lte": 0}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def matches_filters(document: Dict, filters: Optional[Dict]) -> bool:
+    """Check a single document dictionary against a filter."""
+    filters = validate_filters(filters)
+    if "category" in filters and document.get("category") != filters["category"]:
+        return False
+    if "type" in filters and document.get("type") != filters["type"]:
+        return False
+
+    price = document.get("price")
+    has_price = isinstance(price, (int, float)) and not isinstance(price, bool)
+    if "min_price" in filters and not (has_price and price >= float(filters["min_price"])):
+        return False
+    if "max_price" in filters and not (has_price and price <= float(filters["max_price"])):
+        return False
+
+    if "in_stock" in filters:
+        stock = document.get("stock")
+        if not isinstance(stock, (int, float)) or isinstance(stock, bool):
+            return False
+        if (stock > 0) != bool(filters["in_stock"]):
+            return False
+    return True
+
+
+def build_mask(metadata, filters: Optional[Dict]) -> Optional[np.ndarray]:
+    """
+    Build a boolean row mask over a ColumnarMetadata store.
+
+    Rows with a missing value for a filtered field never match.
+
+    Returns:
+        Boolean array with one entry per row, or None if there is no filter
+    """
+    filters = validate_filters(filters)
+    if not filters:
+        return None
+
+    mask = np.ones(len(metadata), dtype=bool)
+    for name in ("category", "type"):
+        if name in filters:
+            code = metadata.category_code(name, filters[name])
+            mask &= np.asarray(metadata.category_codes(name)) == code if code >= 0 else False
+
+    # NaN (missing) compares False, so missing prices/stock are excluded
+    if "min_price" in filters:
+        mask &= np.asarray(metadata.numeric_column("price")) >= float(filters["min_price"])
+    if "max_price" in filters:
+        mask &= np.asarray(metadata.numeric_column("price")) <= float(filters["max_price"])
+    if "in_stock" in filters:
+        stock = np.asarray(metadata.numeric_column("stock"))
+        mask &= (stock > 0) if filters["in_stock"] else (stock <= 0)
+    return mask
@@ -0,0 +1,133 @@
+"""
+Lexical (BM25) index for hybrid retrieval.
+An in-memory inverted index that is updated document by document, so it
+never needs a full rebuild when the catalog changes.
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import heapq
+import math
+import re
+
+from .filters import matches_filters
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase tokens.
+
+    A trailing plural "s" is dropped so "rings" matches "ring"; this is
+    deliberately crude but language-agnostic (works for Roman Urdu too).
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an incrementally maintained inverted index."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize BM25 index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._docs: Dict[str, Dict] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_len
+
+    def add(self, doc_id: str, text: str, document: Optional[Dict] = None):
+        """
+        Index a document, replacing any previous version with the same ID.
+
+        Args:
+            doc_id: Document ID
+            text: Text to index
+            document: Document dictionary returned for lexical hits
+        """
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = sum(terms.values())
+        self._total_len += self._doc_len[doc_id]
+        doc = dict(document or {})
+        doc.setdefault('text', text)
+        doc['id'] = doc_id
+        self._docs[doc_id] = doc
+
+    def remove(self, doc_id: str):
+        """Remove a document. Unknown IDs are ignored."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+        self._docs.pop(doc_id, None)
+
+    def score(self, query: str) -> Dict[str, float]:
+        """Get the BM25 score of every document containing a query term."""
+        n_docs = len(self._doc_len)
+        if n_docs == 0:
+            return {}
+        avg_len = self._total_len / n_docs
+
+        scores: Dict[str, float] = {}
+        for term in tokenize(query):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
+        """
+        Find the top-k documents by BM25 score.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            filters: Optional metadata filter (see rag.filters)
+
+        Returns:
+            List of (document, score) pairs, best first
+        """
+        scores = self.score(query)
+        if filters:
+            scores = {
+                doc_id: value for doc_id, value in scores.items()
+                if matches_filters(self._docs[doc_id], filters)
+            }
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self._docs[doc_id].copy(), value) for doc_id, value in top]
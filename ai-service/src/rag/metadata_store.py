@@ -0,0 +1,310 @@
+"""
+Columnar binary metadata store for the vector store.
+Keeps per-document metadata in fixed-width NumPy columns plus
+offsets-indexed UTF-8 string blobs, so rows are only decoded when needed.
+"""
+
+from typing import Dict, Iterator, List, Optional
+import json
+import math
+import os
+
+import numpy as np
+
+from .filters import build_mask, filters_key
+
+
+class _StringColumn:
+    """Variable-length strings stored as one byte blob plus row offsets."""
+
+    def __init__(self, offsets: Optional[np.ndarray] = None, blob: Optional[np.ndarray] = None):
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.blob = blob if blob is not None else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def extend(self, values: List[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        new_offsets = int(self.offsets[-1]) + np.cumsum(lengths)
+        self.offsets = np.concatenate([self.offsets, new_offsets])
+        self.blob = np.concatenate([self.blob, np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+
+    def take(self, rows: np.ndarray) -> "_StringColumn":
+        starts = np.asarray(self.offsets[rows], dtype=np.int64)
+        lengths = np.asarray(self.offsets[rows + 1], dtype=np.int64) - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        # Byte positions to gather: each row's bytes, shifted to its new offset
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+        return _StringColumn(offsets, np.ascontiguousarray(self.blob[positions]))
+
+
+class ColumnarMetadata:
+    """Metadata for vector store rows, stored column by column.
+
+    Numeric fields used for filtering (price, stock, rating) are float64
+    columns, low-cardinality fields (category, type) are int32 codes into a
+    vocabulary, and the document ID and fingerprint are string columns.
+    Everything else is kept as a compact JSON string per row and only
+    decoded by ``get``.
+    """
+
+    NUMERIC_COLUMNS = ("price", "stock", "rating")
+    INTEGER_COLUMNS = ("stock",)
+    CATEGORICAL_COLUMNS = ("category", "type")
+    STRING_COLUMNS = ("id", "fingerprint")
+
+    MAGIC = b"SAMETA01"
+
+    def __init__(self):
+        """Initialize an empty metadata store."""
+        self._numeric: Dict[str, np.ndarray] = {
+            name: np.zeros(0, dtype=np.float64) for name in self.NUMERIC_COLUMNS
+        }
+        self._codes: Dict[str, np.ndarray] = {
+            name: np.zeros(0, dtype=np.int32) for name in self.CATEGORICAL_COLUMNS
+        }
+        self._vocab: Dict[str, List[str]] = {name: [] for name in self.CATEGORICAL_COLUMNS}
+        self._vocab_index: Dict[str, Dict[str, int]] = {name: {} for name in self.CATEGORICAL_COLUMNS}
+        self._strings: Dict[str, _StringColumn] = {
+            name: _StringColumn() for name in self.STRING_COLUMNS + ("extra",)
+        }
+        # Precomputed filter bitmasks, dropped whenever rows change
+        self._mask_cache: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings["id"])
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, documents: List[Dict]):
+        """
+        Append metadata rows.
+
+        Args:
+            documents: Document dictionaries (each should carry an 'id')
+        """
+        if not documents:
+            return
+        self._mask_cache.clear()
+
+        for name in self.NUMERIC_COLUMNS:
+            values = np.fromiter(
+                (self._as_number(doc.get(name)) for doc in documents),
+                dtype=np.float64,
+                count=len(documents),
+            )
+            self._numeric[name] = np.concatenate([self._numeric[name], values])
+
+        for name in self.CATEGORICAL_COLUMNS:
+            codes = np.fromiter(
+                (self._encode_category(name, doc.get(name)) for doc in documents),
+                dtype=np.int32,
+                count=len(documents),
+            )
+            self._codes[name] = np.concatenate([self._codes[name], codes])
+
+        for name in self.STRING_COLUMNS:
+            self._strings[name].extend([str(doc.get(name) or "") for doc in documents])
+
+        extras = []
+        for doc in documents:
+            extra = {}
+            for key, value in doc.items():
+                if key in self.STRING_COLUMNS or key in self.CATEGORICAL_COLUMNS and isinstance(value, str):
+                    continue
+                if key in self.NUMERIC_COLUMNS and not math.isnan(self._as_number(value)):
+                    continue
+                extra[key] = value
+            extras.append(json.dumps(extra, ensure_ascii=False, separators=(",", ":"), default=str))
+        self._strings["extra"].extend(extras)
+
+    def keep_rows(self, rows: np.ndarray):
+        """Keep only the given rows (in the given order)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self._mask_cache.clear()
+        for name in self.NUMERIC_COLUMNS:
+            self._numeric[name] = np.ascontiguousarray(self._numeric[name][rows])
+        for name in self.CATEGORICAL_COLUMNS:
+            self._codes[name] = np.ascontiguousarray(self._codes[name][rows])
+        for name in self._strings:
+            self._strings[name] = self._strings[name].take(rows)
+
+    def _encode_category(self, name: str, value) -> int:
+        if not isinstance(value, str):
+            return -1
+        index = self._vocab_index[name]
+        if value not in index:
+            index[value] = len(self._vocab[name])
+            self._vocab[name].append(value)
+        return index[value]
+
+    @staticmethod
+    def _as_number(value) -> float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return math.nan
+        return float(value)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def get(self, row: int) -> Dict:
+        """Decode a single row into a metadata dictionary."""
+        doc = json.loads(self._strings["extra"].get(row))
+        doc["id"] = self._strings["id"].get(row)
+        fingerprint = self._strings["fingerprint"].get(row)
+        if fingerprint:
+            doc["fingerprint"] = fingerprint
+        for name in self.CATEGORICAL_COLUMNS:
+            code = int(self._codes[name][row])
+            if code >= 0:
+                doc[name] = self._vocab[name][code]
+        for name in self.NUMERIC_COLUMNS:
+            value = float(self._numeric[name][row])
+            if not math.isnan(value):
+                doc[name] = int(value) if name in self.INTEGER_COLUMNS else value
+        return doc
+
+    def get_id(self, row: int) -> str:
+        """Get the document ID of a row without decoding the rest."""
+        return self._strings["id"].get(row)
+
+    def get_fingerprint(self, row: int) -> str:
+        """Get the fingerprint of a row ("" if it has none)."""
+        return self._strings["fingerprint"].get(row)
+
+    def ids(self) -> Iterator[str]:
+        """Iterate over document IDs in row order."""
+        column = self._strings["id"]
+        for row in range(len(column)):
+            yield column.get(row)
+
+    def fingerprints(self) -> Dict[str, str]:
+        """Get {document ID: fingerprint} for rows that have one."""
+        ids = self._strings["id"]
+        fingerprints = self._strings["fingerprint"]
+        result = {}
+        for row in range(len(ids)):
+            fingerprint = fingerprints.get(row)
+            if fingerprint:
+                result[ids.get(row)] = fingerprint
+        return result
+
+    def numeric_column(self, name: str) -> np.ndarray:
+        """Get a numeric column (NaN where missing)."""
+        return self._numeric[name]
+
+    def category_codes(self, name: str) -> np.ndarray:
+        """Get the int32 codes of a categorical column (-1 where missing)."""
+        return self._codes[name]
+
+    def category_code(self, name: str, value: str) -> int:
+        """Get the code of a category value, or -1 if it never occurs."""
+        return self._vocab_index[name].get(value, -1)
+
+    def mask_for(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Get the boolean row mask for a filter (see ``filters.build_mask``).
+
+        Masks are cached per filter until the rows change.
+        """
+        key = filters_key(filters)
+        if not key:
+            return None
+        if key not in self._mask_cache:
+            if len(self._mask_cache) >= 64:
+                self._mask_cache.clear()
+            self._mask_cache[key] = build_mask(self, filters)
+        return self._mask_cache[key]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _arrays(self) -> List[tuple]:
+        arrays = [(f"numeric:{name}", self._numeric[name]) for name in self.NUMERIC_COLUMNS]
+        arrays += [(f"codes:{name}", self._codes[name]) for name in self.CATEGORICAL_COLUMNS]
+        for name, column in self._strings.items():
+            arrays.append((f"offsets:{name}", column.offsets))
+            arrays.append((f"blob:{name}", column.blob))
+        return arrays
+
+    def save(self, path: str):
+        """
+        Write the store to a single binary file.
+
+        Layout: magic, 8-byte header length, JSON header (vocabularies and
+        array offsets/dtypes), then the raw 8-byte-aligned column arrays.
+        """
+        arrays = self._arrays()
+        entries = []
+        position = 0
+        for name, array in arrays:
+            entries.append({
+                "name": name,
+                "dtype": array.dtype.str,
+                "length": int(array.shape[0]),
+                "offset": position,
+            })
+            position += -(-array.nbytes // 8) * 8
+
+        header = json.dumps({"vocab": self._vocab, "arrays": entries}).encode("utf-8")
+        header += b" " * (-(len(self.MAGIC) + 8 + len(header)) % 8)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(np.int64(len(header)).tobytes())
+            f.write(header)
+            for _, array in arrays:
+                data = np.ascontiguousarray(array).tobytes()
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnarMetadata":
+        """Memory-map a store written by ``save``."""
+        with open(path, "rb") as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError(f"Not a metadata file: {path}")
+            header_length = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        data_start = len(cls.MAGIC) + 8 + header_length
+
+        arrays = {}
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            if entry["length"] == 0:
+                arrays[entry["name"]] = np.zeros(0, dtype=dtype)
+                continue
+            arrays[entry["name"]] = np.memmap(
+                path, dtype=dtype, mode="r",
+                offset=data_start + entry["offset"], shape=(entry["length"],),
+            )
+
+        store = cls()
+        store._vocab = {name: list(header["vocab"].get(name, [])) for name in cls.CATEGORICAL_COLUMNS}
+        store._vocab_index = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in store._vocab.items()
+        }
+        for name in cls.NUMERIC_COLUMNS:
+            store._numeric[name] = arrays[f"numeric:{name}"]
+        for name in cls.CATEGORICAL_COLUMNS:
+            store._codes[name] = arrays[f"codes:{name}"]
+        for name in store._strings:
+            store._strings[name] = _StringColumn(arrays[f"offsets:{name}"], arrays[f"blob:{name}"])
+        return store
+
+    @classmethod
+    def from_documents(cls, documents: List[Dict]) -> "ColumnarMetadata":
+        """Build a store from a list of metadata dictionaries."""
+        store = cls()
+        store.append(documents)
+        return store
@@ -0,0 +1,313 @@
+"""
+In-process NumPy vector index.
+Keeps normalized float32 embeddings in one contiguous matrix that is
+persisted to disk and memory-mapped on load, so several worker processes
+can share one page-cached copy. Optionally keeps scalar-quantized codes in
+memory for a fast first pass, re-ranking a small candidate set exactly.
+"""
+
+from typing import Dict, List, Optional
+import json
+import os
+
+import numpy as np
+
+from .metadata_store import ColumnarMetadata
+from .quantization import ScalarQuantizer, recall_at_k
+
+
+class NumpyIndex:
+    """Brute-force cosine similarity index over a single float32 matrix."""
+
+    MATRIX_FILE = "numpy_index.npy"
+    METADATA_FILE = "numpy_index_metadata.bin"
+    LEGACY_METADATA_FILE = "numpy_index_metadata.json"
+    CODES_FILE = "numpy_index_codes.npy"
+    QUANTIZER_FILE = "numpy_index_quantizer.npz"
+
+    def __init__(self, persist_dir: str, quantization: Optional[str] = None, rerank_factor: int = 4):
+        """
+        Initialize NumPy index.
+
+        Args:
+            persist_dir: Directory holding the matrix and metadata files
+            quantization: None for exact float32 search, or "int8" / "float16"
+                          to search quantized codes first
+            rerank_factor: With quantization, k * rerank_factor candidates
+                           are re-scored exactly against the float32 matrix
+        """
+        self.persist_dir = persist_dir
+        self.rerank_factor = max(1, int(rerank_factor))
+        self._quantizer = ScalarQuantizer(quantization) if quantization and quantization != "none" else None
+        self._codes: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._metadata = ColumnarMetadata()
+        self._row_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, embeddings: np.ndarray, documents: List[Dict], ids: List[str]):
+        """
+        Append documents to the index.
+
+        Args:
+            embeddings: Array of document embeddings
+            documents: List of document dictionaries with metadata
+            ids: Document IDs
+        """
+        vectors = self._normalize(embeddings).reshape(len(ids), -1)
+        if self._matrix is None or len(self._ids) == 0:
+            self._matrix = np.ascontiguousarray(vectors)
+            if self._quantizer is not None:
+                self._quantizer.fit(vectors)
+                self._codes = self._quantizer.encode(vectors)
+        else:
+            # Copies out of the memmap; the file is rewritten on save()
+            self._matrix = np.concatenate([self._matrix, vectors], axis=0)
+            if self._quantizer is not None:
+                # Encoded with the existing range; save() refits
+                self._codes = np.concatenate([self._codes, self._quantizer.encode(vectors)], axis=0)
+
+        metas = []
+        for doc_id, doc in zip(ids, documents):
+            meta = doc.copy()
+            meta['id'] = doc_id
+            self._row_of[doc_id] = len(self._ids)
+            self._ids.append(doc_id)
+            metas.append(meta)
+        self._metadata.append(metas)
+
+    def delete(self, ids: List[str]):
+        """Delete documents by ID. Unknown IDs are ignored."""
+        drop = {self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of}
+        if not drop:
+            return
+        keep = np.array([i for i in range(len(self._ids)) if i not in drop], dtype=np.int64)
+        self._matrix = np.ascontiguousarray(self._matrix[keep]) if len(keep) else None
+        if self._codes is not None:
+            self._codes = np.ascontiguousarray(self._codes[keep]) if len(keep) else None
+        self._ids = [self._ids[i] for i in keep]
+        self._metadata.keep_rows(keep)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    def upsert(self, embeddings: np.ndarray, documents: List[Dict], ids: List[str]):
+        """Insert new documents or replace existing ones with the same IDs."""
+        self.delete(ids)
+        self.add(embeddings, documents, ids)
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Find the k most similar documents.
+
+        Args:
+            query_embedding: Query embedding vector
+            k: Number of top results to return
+            filters: Optional metadata filter (see rag.filters)
+
+        Returns:
+            List of documents with cosine 'distance' (1 - similarity) and 'score'
+        """
+        return self.search_batch(np.asarray(query_embedding).reshape(1, -1), k, filters)[0]
+
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filters: Optional[Dict] = None,
+    ) -> List[List[Dict]]:
+        """
+        Find the k most similar documents for each of several queries.
+
+        Args:
+            query_embeddings: Array of query embeddings (shape: [n_queries, dim])
+            k: Number of top results to return per query
+            filters: Optional metadata filter applied to every query
+
+        Returns:
+            One result list per query (see ``search``)
+        """
+        n_queries = query_embeddings.shape[0]
+        # k <= 0 would leave an empty rerank pool that can't be reshaped
+        if self._matrix is None or len(self._ids) == 0 or k <= 0:
+            return [[] for _ in range(n_queries)]
+
+        candidates = None
+        mask = self._metadata.mask_for(filters)
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return [[] for _ in range(n_queries)]
+
+        queries = self._normalize(query_embeddings)
+        if self._quantizer is not None:
+            top, top_scores = self._search_quantized(queries, k, candidates)
+        else:
+            top, top_scores = self._search_exact(queries, k, candidates)
+
+        all_results = []
+        for q in range(n_queries):
+            results = []
+            for row, similarity in zip(top[q], top_scores[q]):
+                result = self._metadata.get(int(row))
+                distance = float(1.0 - similarity)
+                result['score'] = distance
+                result['distance'] = distance
+                results.append(result)
+            all_results.append(results)
+        return all_results
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, k: int):
+        """Row-wise top-k (indices, scores), best first."""
+        k = min(k, similarities.shape[1])
+        # argpartition is O(n); only the k winners per query get fully sorted
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _search_exact(self, queries: np.ndarray, k: int, candidates: Optional[np.ndarray]):
+        """Full-precision scan over all rows (or the candidate rows)."""
+        matrix = self._matrix if candidates is None else self._matrix[candidates]
+        top, top_scores = self._top_k(queries @ matrix.T, k)
+        if candidates is not None:
+            top = candidates[top]
+        return top, top_scores
+
+    def _search_quantized(self, queries: np.ndarray, k: int, candidates: Optional[np.ndarray]):
+        """Scan the quantized codes, then re-score the best few exactly."""
+        codes = self._codes if candidates is None else self._codes[candidates]
+        approx = self._quantizer.scores(codes, queries)
+        pool, _ = self._top_k(approx, k * self.rerank_factor)
+        if candidates is not None:
+            pool = candidates[pool]
+
+        # Only the pooled rows are read from the (memory-mapped) float32 matrix
+        n_queries, pool_size = pool.shape
+        vectors = np.asarray(self._matrix[pool.reshape(-1)]).reshape(n_queries, pool_size, -1)
+        exact = np.einsum('qcd,qd->qc', vectors, queries)
+        order, top_scores = self._top_k(exact, k)
+        return np.take_along_axis(pool, order, axis=1), top_scores
+
+    def quantization_recall(self, query_embeddings: np.ndarray, k: int = 10) -> float:
+        """
+        Measure recall@k of the quantized search against exact float32 search.
+
+        Returns:
+            Recall in [0, 1] (1.0 when quantization is off)
+        """
+        if self._quantizer is None or self._matrix is None:
+            return 1.0
+        queries = self._normalize(np.asarray(query_embeddings).reshape(-1, self._matrix.shape[1]))
+        approx, _ = self._search_quantized(queries, k, None)
+        exact, _ = self._search_exact(queries, k, None)
+        return recall_at_k(approx, exact)
+
+    def memory_usage(self) -> Dict:
+        """Bytes used by the float32 matrix and the quantized codes."""
+        return {
+            "float32_bytes": int(self._matrix.nbytes) if self._matrix is not None else 0,
+            "float32_memory_mapped": isinstance(self._matrix, np.memmap),
+            "code_bytes": int(self._codes.nbytes) if self._codes is not None else 0,
+        }
+
+    def iter_documents(self):
+        """Iterate over stored document metadata in row order."""
+        for row in range(len(self._ids)):
+            yield self._metadata.get(row)
+
+    def get_fingerprints(self) -> Dict[str, str]:
+        """Get {document ID: fingerprint} for fingerprinted documents."""
+        return self._metadata.fingerprints()
+
+    def get_ids(self) -> List[str]:
+        """Get the ID of every stored document."""
+        return list(self._ids)
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Get {document ID: stored (normalized) vector}; unknown IDs are left out."""
+        found = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._row_of]
+        if self._matrix is None or not found:
+            return {}
+        rows = np.asarray(self._matrix[[self._row_of[doc_id] for doc_id in found]], dtype=np.float32)
+        return dict(zip(found, rows))
+
+    def save(self, directory: Optional[str] = None):
+        """Write the matrix and metadata to disk atomically."""
+        directory = directory or self.persist_dir
+        matrix_path = os.path.join(directory, self.MATRIX_FILE)
+        metadata_path = os.path.join(directory, self.METADATA_FILE)
+
+        matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        with open(f"{matrix_path}.tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(f"{matrix_path}.tmp", matrix_path)
+        self._metadata.save(metadata_path)
+
+        if self._quantizer is not None and self._matrix is not None:
+            # Refit on everything so codes appended since the last fit aren't clipped
+            self._quantizer.fit(self._matrix)
+            self._codes = self._quantizer.encode(self._matrix)
+            codes_path = os.path.join(directory, self.CODES_FILE)
+            quantizer_path = os.path.join(directory, self.QUANTIZER_FILE)
+            with open(f"{codes_path}.tmp", 'wb') as f:
+                np.save(f, self._codes)
+            with open(f"{quantizer_path}.tmp", 'wb') as f:
+                np.savez(f, **self._quantizer.state())
+            os.replace(f"{codes_path}.tmp", codes_path)
+            os.replace(f"{quantizer_path}.tmp", quantizer_path)
+
+    def load(self, directory: Optional[str] = None) -> bool:
+        """
+        Memory-map the matrix and load metadata from disk.
+
+        Returns:
+            True if an index was found and loaded
+        """
+        directory = directory or self.persist_dir
+        matrix_path = os.path.join(directory, self.MATRIX_FILE)
+        metadata_path = os.path.join(directory, self.METADATA_FILE)
+        legacy_metadata_path = os.path.join(directory, self.LEGACY_METADATA_FILE)
+        if not os.path.exists(matrix_path):
+            return False
+
+        if os.path.exists(metadata_path):
+            metadata = ColumnarMetadata.load(metadata_path)
+        elif os.path.exists(legacy_metadata_path):
+            with open(legacy_metadata_path, 'r', encoding='utf-8') as f:
+                metadata = ColumnarMetadata.from_documents(json.load(f))
+        else:
+            return False
+
+        matrix = np.load(matrix_path, mmap_mode='r')
+        self._matrix = matrix if matrix.size else None
+        self._metadata = metadata
+        self._ids = list(metadata.ids())
+        if self._quantizer is not None and self._matrix is not None:
+            self._load_codes(directory)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return True
+
+    def _load_codes(self, directory: str):
+        """Load saved quantized codes, or rebuild them from the matrix."""
+        codes_path = os.path.join(directory, self.CODES_FILE)
+        quantizer_path = os.path.join(directory, self.QUANTIZER_FILE)
+        if os.path.exists(codes_path) and os.path.exists(quantizer_path):
+            with np.load(quantizer_path) as state:
+                quantizer = ScalarQuantizer.from_state(state)
+            codes = np.load(codes_path)
+            if quantizer.mode == self._quantizer.mode and codes.shape == self._matrix.shape:
+                self._quantizer = quantizer
+                self._codes = codes
+                return
+        self._quantizer.fit(self._matrix)
+        self._codes = self._quantizer.encode(self._matrix)
@@ -0,0 +1,130 @@
+"""
+Scalar quantization for in-process vector storage.
+Encodes float32 embeddings as int8 (per-dimension scale and offset) or
+float16 codes, and scores queries directly against the codes.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+class ScalarQuantizer:
+    """Per-dimension scalar quantizer ("int8" or "float16")."""
+
+    MODES = ("int8", "float16")
+
+    # Rows decoded to float32 at a time while scoring
+    CHUNK_ROWS = 65536
+
+    def __init__(self, mode: str = "int8"):
+        """
+        Initialize quantizer.
+
+        Args:
+            mode: "int8" (4x smaller) or "float16" (2x smaller)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}'. Options: {list(self.MODES)}")
+        self.mode = mode
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def code_dtype(self):
+        return np.int8 if self.mode == "int8" else np.float16
+
+    def fit(self, vectors: np.ndarray):
+        """Learn the per-dimension range of the vectors (int8 only)."""
+        if self.mode != "int8":
+            return
+        low = np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        high = np.full(vectors.shape[1], -np.inf, dtype=np.float32)
+        for start in range(0, vectors.shape[0], self.CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + self.CHUNK_ROWS], dtype=np.float32)
+            low = np.minimum(low, chunk.min(axis=0))
+            high = np.maximum(high, chunk.max(axis=0))
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-12) / 255.0
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode float vectors into codes (values outside the fitted range are clipped)."""
+        codes = np.empty(vectors.shape, dtype=self.code_dtype)
+        # Chunked so encoding a memory-mapped matrix doesn't load it all at once
+        for start in range(0, vectors.shape[0], self.CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + self.CHUNK_ROWS], dtype=np.float32)
+            if self.mode == "float16":
+                codes[start:start + chunk.shape[0]] = chunk
+            else:
+                levels = np.rint((chunk - self.offset) / self.scale)
+                codes[start:start + chunk.shape[0]] = np.clip(levels, 0, 255) - 128
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Decode codes back into approximate float32 vectors."""
+        if self.mode == "float16":
+            return codes.astype(np.float32)
+        return (codes.astype(np.float32) + 128.0) * self.scale + self.offset
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products between queries and encoded vectors.
+
+        Args:
+            codes: Encoded vectors (shape: [n, dim])
+            queries: Float32 queries (shape: [n_queries, dim])
+
+        Returns:
+            Score matrix (shape: [n_queries, n])
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+
+        if self.mode == "float16":
+            for start in range(0, codes.shape[0], self.CHUNK_ROWS):
+                chunk = codes[start:start + self.CHUNK_ROWS].astype(np.float32)
+                out[:, start:start + chunk.shape[0]] = queries @ chunk.T
+            return out
+
+        # q . ((c + 128) * scale + offset) = (q * scale) . c + 128 * sum(q * scale) + q . offset
+        scaled = queries * self.scale
+        bias = 128.0 * scaled.sum(axis=1) + queries @ self.offset
+        for start in range(0, codes.shape[0], self.CHUNK_ROWS):
+            chunk = codes[start:start + self.CHUNK_ROWS].astype(np.float32)
+            out[:, start:start + chunk.shape[0]] = scaled @ chunk.T
+        out += bias[:, None]
+        return out
+
+    def state(self) -> dict:
+        """Arrays needed to restore the quantizer (for np.savez)."""
+        state = {"mode": np.array(self.mode)}
+        if self.mode == "int8":
+            state["offset"] = self.offset
+            state["scale"] = self.scale
+        return state
+
+    @classmethod
+    def from_state(cls, state) -> "ScalarQuantizer":
+        """Restore a quantizer saved with ``state``."""
+        quantizer = cls(str(state["mode"]))
+        if quantizer.mode == "int8":
+            quantizer.offset = np.asarray(state["offset"], dtype=np.float32)
+            quantizer.scale = np.asarray(state["scale"], dtype=np.float32)
+        return quantizer
+
+
+def recall_at_k(approximate_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    """
+    Fraction of exact top-k neighbours that the approximate search found.
+
+    Args:
+        approximate_ids: Row ids returned by the approximate search ([n_queries, k])
+        exact_ids: Ground-truth row ids ([n_queries, k])
+    """
+    if exact_ids.size == 0:
+        return 1.0
+    hits = sum(
+        len(set(approx_row.tolist()) & set(exact_row.tolist()))
+        for approx_row, exact_row in zip(approximate_ids, exact_ids)
+    )
+    return hits / exact_ids.size
@@ -0,0 +1,148 @@
+"""
+In-memory cache of retrieval results.
+Repeated shopper queries ("rings", "gold bracelet price") are answered
+without re-embedding the query or searching the vector store again.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from .filters import filters_key
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text for cache lookups (case, Unicode form, whitespace)."""
+    query = unicodedata.normalize("NFKC", query or "")
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+class RetrievalCache:
+    """LRU + TTL cache of retrieval results, bounded by entries and bytes.
+
+    Keys include the catalog generation, which ``invalidate`` bumps on every
+    sync or index mutation. Callers build the key before retrieving, so
+    results computed while the catalog was changing are stored under the
+    old generation and can never be served for the new catalog.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, max_bytes: int = 16 * 1024 * 1024):
+        """
+        Initialize retrieval cache.
+
+        Args:
+            max_entries: Maximum number of cached result lists
+            ttl_seconds: Seconds a result stays valid (0 or less: no expiry)
+            max_bytes: Approximate upper bound on the memory used by cached results
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.generation = 0
+        self._entries: "OrderedDict[tuple, Tuple[float, int, List[Dict]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, query: str, top_k: int, filters: Optional[Dict]) -> tuple:
+        """Cache key for a retrieval call against the current catalog generation."""
+        return (self.generation, normalize_query(query), int(top_k), filters_key(filters))
+
+    def invalidate(self):
+        """Start a new catalog generation and drop everything cached so far."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, key: tuple) -> Optional[List[Dict]]:
+        """
+        Look up cached results.
+
+        Returns:
+            A copy of the cached result list, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, nbytes, results = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._bytes -= nbytes
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may annotate result dicts; keep the cached ones pristine
+        return [dict(doc) for doc in results]
+
+    def put(self, key: tuple, results: List[Dict]):
+        """Store results, evicting least recently used entries past the bounds."""
+        results = [dict(doc) for doc in results]
+        nbytes = self._estimate_bytes(key, results)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key[0] != self.generation:
+                # Computed against a catalog that has changed since
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic(), nbytes, results)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    @staticmethod
+    def _estimate_bytes(key: tuple, results: List[Dict]) -> int:
+        """Rough memory footprint: serialized size plus per-object overhead."""
+        payload = len(json.dumps(results, default=str, ensure_ascii=False))
+        return payload + sys.getsizeof(key) + 200 * (len(results) + 1)
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and size information."""
+        with self._lock:
+            entries = len(self._entries)
+            nbytes = self._bytes
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": entries,
+            "bytes": nbytes,
+            "generation": self.generation,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+    def reset_stats(self):
+        """Reset hit/miss counters."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
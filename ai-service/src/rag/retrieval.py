@@ -1,11 +1,17 @@
 """
 Retrieval module for RAG system.
-Handles document retrieval using vector similarity search.
+Handles document retrieval using vector similarity search, optionally fused
+with BM25 lexical search (hybrid retrieval) and diversified with Maximal
+Marginal Relevance.
 """
 
 from typing import List, Dict, Optional
+import asyncio
 import numpy as np
+from .diversity import dedupe_by_product, mmr_select
 from .embeddings import EmbeddingModel
+from .lexical_index import BM25Index
+from .result_cache import RetrievalCache
 from .vector_store import VectorStore
 
 
@@ -19,7 +25,12 @@ class RetrievalSystem:
         top_k: int = 5,
         vector_store_type: str = "chroma",
         persist_dir: Optional[str] = None,
-        collection_name: str = "store_assistant"
+        collection_name: str = "store_assistant",
+        hybrid: bool = False,
+        rrf_k: int = 60,
+        cache: Optional[RetrievalCache] = None,
+        mmr: bool = False,
+        mmr_lambda: float = 0.5
     ):
         """
         Initialize retrieval system.
@@ -31,6 +42,14 @@ class RetrievalSystem:
             vector_store_type: Type of vector store ("chroma" or "faiss")
             persist_dir: Directory to persist vector store
             collection_name: Name of ChromaDB collection
+            hybrid: Also run BM25 lexical search and fuse both rankings
+                    with reciprocal-rank fusion
+            rrf_k: Reciprocal-rank fusion constant (higher = flatter fusion)
+            cache: Optional result cache for repeated queries; invalidated
+                   whenever documents are added, changed or deleted
+            mmr: Re-rank a larger candidate pool with Maximal Marginal
+                 Relevance (one result per product) for a diverse top_k
+            mmr_lambda: MMR trade-off, 1.0 = pure relevance, 0.0 = pure diversity
         """
         self.embedding_model = embedding_model or EmbeddingModel()
         self.vector_store = vector_store or VectorStore(
@@ -39,26 +58,200 @@ class RetrievalSystem:
             collection_name=collection_name
         )
         self.top_k = top_k
+        self.rrf_k = rrf_k
+        self.mmr = mmr
+        self.mmr_lambda = mmr_lambda
+        self.lexical_index: Optional[BM25Index] = None
+        self.cache = cache
+        if self.cache is not None:
+            # A shared cache may hold results from a previously opened store
+            self.cache.invalidate()
+        if hybrid:
+            # Built once from what the store already holds, then kept in
+            # sync by add/upsert/delete
+            self.lexical_index = BM25Index()
+            for doc in self.vector_store.iter_documents():
+                self.lexical_index.add(doc['id'], doc.get('text', ''), doc)
     
-    def retrieve(self, query: str, top_k: Optional[int] = None) -> List[Dict]:
+    def retrieve(self, query: str, top_k: Optional[int] = None, filters: Optional[Dict] = None) -> List[Dict]:
         """
         Retrieve relevant documents for a query.
         
         Args:
             query: User query
             top_k: Number of results to return (overrides default)
+            filters: Optional metadata filter, e.g.
+                     {"category": "Rings", "max_price": 2000, "in_stock": True}
             
         Returns:
             List of retrieved documents with metadata
         """
         top_k = top_k or self.top_k
+        if self.cache is None:
+            return self._retrieve_uncached(query, top_k, filters)
         
+        # Key is taken before searching, see RetrievalCache
+        key = self.cache.make_key(query, top_k, filters)
+        results = self.cache.get(key)
+        if results is None:
+            results = self._retrieve_uncached(query, top_k, filters)
+            self.cache.put(key, results)
+        return results
+    
+    async def aretrieve(self, query: str, top_k: Optional[int] = None, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Async version of retrieve.
+        
+        The query is embedded without blocking the event loop and the search
+        runs in a worker thread, so concurrent requests don't queue behind it.
+        """
+        top_k = top_k or self.top_k
+        key = self.cache.make_key(query, top_k, filters) if self.cache is not None else None
+        if key is not None:
+            results = self.cache.get(key)
+            if results is not None:
+                return results
+        
+        query_embedding = await self.embedding_model.aembed_text(query)
+        results = await asyncio.to_thread(self._search, query, query_embedding, top_k, filters)
+        if key is not None:
+            self.cache.put(key, results)
+        return results
+    
+    def _retrieve_uncached(self, query: str, top_k: int, filters: Optional[Dict]) -> List[Dict]:
+        """Embed the query and search (plus BM25 fusion in hybrid mode)."""
         # Generate query embedding
         query_embedding = self.embedding_model.embed_text(query)
+        return self._search(query, query_embedding, top_k, filters)
+    
+    def _search(self, query: str, query_embedding: np.ndarray, top_k: int, filters: Optional[Dict]) -> List[Dict]:
+        """Search with an embedded query (plus BM25 fusion and MMR if enabled)."""
+        if self.lexical_index is None and not self.mmr:
+            # Search vector store
+            return self.vector_store.search(query_embedding, k=top_k, filters=filters)
+        
+        pool = self._candidate_pool(top_k)
+        results = self.vector_store.search(query_embedding, k=pool, filters=filters)
+        if self.lexical_index is not None:
+            results = self._fuse(query, results, pool if self.mmr else top_k, filters)
+        if self.mmr:
+            results = self._diversify([query_embedding], [results], top_k)[0]
+        return results
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Retrieve relevant documents for several queries at once.
+        
+        All queries are embedded with one embed_batch call and searched with
+        one vectorized vector store call.
+        
+        Args:
+            queries: User queries
+            top_k: Number of results per query (overrides default)
+            filters: Optional metadata filter applied to every query
+            
+        Returns:
+            One list of retrieved documents per query, in input order
+        """
+        if not queries:
+            return []
+        top_k = top_k or self.top_k
+        if self.cache is None:
+            return self._retrieve_many_uncached(queries, top_k, filters)
+        
+        keys = [self.cache.make_key(query, top_k, filters) for query in queries]
+        results = [self.cache.get(key) for key in keys]
+        
+        # Only cache misses are embedded and searched, each distinct one once
+        missing: Dict[tuple, List[int]] = {}
+        for i, cached in enumerate(results):
+            if cached is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            fresh = self._retrieve_many_uncached(
+                [queries[positions[0]] for positions in missing.values()], top_k, filters
+            )
+            for (key, positions), docs in zip(missing.items(), fresh):
+                self.cache.put(key, docs)
+                for i in positions:
+                    results[i] = [dict(doc) for doc in docs]
+        return results
+    
+    def _retrieve_many_uncached(self, queries: List[str], top_k: int, filters: Optional[Dict]) -> List[List[Dict]]:
+        """Embed all queries in one call and search them in one vectorized call."""
+        query_embeddings = self.embedding_model.embed_batch(queries)
+        if self.lexical_index is None and not self.mmr:
+            return self.vector_store.search_batch(query_embeddings, k=top_k, filters=filters)
+        
+        pool = self._candidate_pool(top_k)
+        results = self.vector_store.search_batch(query_embeddings, k=pool, filters=filters)
+        if self.lexical_index is not None:
+            results = [
+                self._fuse(query, docs, pool if self.mmr else top_k, filters)
+                for query, docs in zip(queries, results)
+            ]
+        if self.mmr:
+            results = self._diversify(query_embeddings, results, top_k)
+        return results
+    
+    @staticmethod
+    def _candidate_pool(top_k: int) -> int:
+        """How many hits each ranker contributes before fusion or MMR."""
+        return max(top_k * 4, 20)
+    
+    def _diversify(self, query_embeddings, result_lists: List[List[Dict]], top_k: int) -> List[List[Dict]]:
+        """
+        Pick a diverse top_k from each candidate list with MMR.
+        
+        Candidates are first reduced to one document per product. Their
+        vectors are read back from the vector store in one call (BM25-only
+        hits included), never re-embedded.
+        """
+        result_lists = [dedupe_by_product(docs) for docs in result_lists]
+        ids = [doc['id'] for docs in result_lists if len(docs) > top_k for doc in docs]
+        if not ids:
+            return [docs[:top_k] for docs in result_lists]
+        embeddings = self.vector_store.get_embeddings(ids)
         
-        # Search vector store
-        results = self.vector_store.search(query_embedding, k=top_k)
+        diversified = []
+        for query_embedding, docs in zip(query_embeddings, result_lists):
+            if len(docs) <= top_k:
+                diversified.append(docs)
+                continue
+            # A document deleted since the search has no vector and drops out
+            docs = [doc for doc in docs if doc['id'] in embeddings]
+            candidates = np.array([embeddings[doc['id']] for doc in docs], dtype=np.float32).reshape(len(docs), -1)
+            picks = mmr_select(query_embedding, candidates, top_k, self.mmr_lambda)
+            diversified.append([docs[i] for i in picks])
+        return diversified
+    
+    def _fuse(self, query: str, vector_results: List[Dict], top_k: int, filters: Optional[Dict]) -> List[Dict]:
+        """Fuse vector and BM25 rankings with reciprocal-rank fusion."""
+        lexical_results = self.lexical_index.search(query, k=self._candidate_pool(top_k), filters=filters)
+        
+        fused: Dict[str, Dict] = {}
+        scores: Dict[str, float] = {}
+        for rank, doc in enumerate(vector_results):
+            fused[doc['id']] = doc
+            scores[doc['id']] = 1.0 / (self.rrf_k + rank + 1)
+        for rank, (doc, bm25_score) in enumerate(lexical_results):
+            doc_id = doc['id']
+            if doc_id not in fused:
+                fused[doc_id] = doc
+            fused[doc_id]['bm25_score'] = bm25_score
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
         
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        results = []
+        for doc_id in ranked:
+            doc = fused[doc_id]
+            doc['rrf_score'] = scores[doc_id]
+            results.append(doc)
         return results
     
     def add_documents(self, documents: List[Dict], texts: Optional[List[str]] = None):
@@ -78,6 +271,56 @@ class RetrievalSystem:
         # Add to vector store
         ids = [doc.get('id', str(i)) for i, doc in enumerate(documents)]
         self.vector_store.add_documents(embeddings, documents, ids)
+        self._index_lexical(ids, documents, texts)
+        self.invalidate_cache()
+    
+    def upsert_documents(self, documents: List[Dict], ids: List[str]):
+        """
+        Embed and insert or replace documents by ID.
+        
+        Args:
+            documents: List of document dictionaries with 'text' and metadata
+            ids: Document IDs (same order as documents)
+        """
+        if not documents:
+            return
+        texts = [doc.get('text', doc.get('content', '')) for doc in documents]
+        embeddings = self.embedding_model.embed_batch(texts)
+        self.vector_store.upsert(ids, embeddings, documents)
+        self._index_lexical(ids, documents, texts)
+        self.invalidate_cache()
+    
+    def delete_documents(self, ids: List[str]):
+        """Delete documents by ID."""
+        self.vector_store.delete(ids)
+        if self.lexical_index is not None:
+            for doc_id in ids:
+                self.lexical_index.remove(doc_id)
+        self.invalidate_cache()
+    
+    def invalidate_cache(self):
+        """Start a new catalog generation so no cached result is served again."""
+        if self.cache is not None:
+            self.cache.invalidate()
+    
+    def cache_stats(self) -> Dict:
+        """Get result cache statistics (empty if caching is disabled)."""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def _index_lexical(self, ids: List[str], documents: List[Dict], texts: List[str]):
+        """Keep the BM25 index in step with the vector store."""
+        if self.lexical_index is None:
+            return
+        for doc_id, doc, text in zip(ids, documents, texts):
+            self.lexical_index.add(doc_id, text, doc)
+    
+    def get_fingerprints(self) -> Dict[str, str]:
+        """Get {document ID: fingerprint} for fingerprinted documents."""
+        return self.vector_store.get_fingerprints()
+
+    def get_ids(self) -> List[str]:
+        """Get the ID of every stored document."""
+        return self.vector_store.get_ids()
     
     def save(self, path: Optional[str] = None):
         """Save retrieval system."""
@@ -86,4 +329,5 @@ class RetrievalSystem:
     def load(self, path: Optional[str] = None):
         """Load retrieval system."""
         self.vector_store.load(path)
+        self.invalidate_cache()
 
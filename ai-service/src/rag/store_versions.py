@@ -0,0 +1,112 @@
+"""
+Versioned vector store directories.
+
+Full rebuilds are written into a fresh directory next to the configured
+persist_dir and then published by atomically rewriting a pointer file, so
+readers never see a half-built store:
+
+    data/vector_store/                   original (unversioned) store
+    data/vector_store_versions/CURRENT   name of the live version
+    data/vector_store_versions/v.../     one directory per full rebuild
+"""
+
+from pathlib import Path
+from typing import List, Optional
+import os
+import re
+import shutil
+import time
+
+VERSIONS_SUFFIX = "_versions"
+POINTER_FILE = "CURRENT"
+_VERSION_PATTERN = re.compile(r"^v(\d+)-")
+
+
+def versions_root(persist_dir: str) -> Path:
+    """Directory holding the versions of a vector store."""
+    persist_dir = Path(persist_dir)
+    return persist_dir.parent / f"{persist_dir.name}{VERSIONS_SUFFIX}"
+
+
+def current_version(persist_dir: str) -> Optional[str]:
+    """Name of the published version, or None if nothing was published."""
+    pointer = versions_root(persist_dir) / POINTER_FILE
+    if not pointer.exists():
+        return None
+    name = pointer.read_text(encoding="utf-8").strip()
+    if not name or not (versions_root(persist_dir) / name).is_dir():
+        return None
+    return name
+
+
+def current_store_dir(persist_dir: str) -> str:
+    """
+    Resolve the directory readers should open.
+
+    Args:
+        persist_dir: Configured vector store directory
+
+    Returns:
+        The published version's directory, or persist_dir itself if no
+        version has been published yet
+    """
+    name = current_version(persist_dir)
+    if name is None:
+        return str(persist_dir)
+    return str(versions_root(persist_dir) / name)
+
+
+def _version_dirs(persist_dir: str) -> List[Path]:
+    """Version directories, oldest first."""
+    root = versions_root(persist_dir)
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_dir() and _VERSION_PATTERN.match(p.name))
+
+
+def create_version_dir(persist_dir: str) -> str:
+    """Create an empty, unpublished version directory and return its path."""
+    existing = _version_dirs(persist_dir)
+    sequence = int(_VERSION_PATTERN.match(existing[-1].name).group(1)) + 1 if existing else 1
+    # Zero-padded sequence first, so names sort in creation order
+    path = versions_root(persist_dir) / f"v{sequence:06d}-{time.strftime('%Y%m%d-%H%M%S')}"
+    path.mkdir(parents=True)
+    return str(path)
+
+
+def publish_version(persist_dir: str, version_dir: str):
+    """Atomically make version_dir the live version."""
+    root = versions_root(persist_dir)
+    name = Path(version_dir).name
+    if Path(version_dir).resolve().parent != root.resolve():
+        raise ValueError(f"{version_dir} is not a version of {persist_dir}")
+    tmp_pointer = root / f"{POINTER_FILE}.tmp"
+    tmp_pointer.write_text(name, encoding="utf-8")
+    os.replace(tmp_pointer, root / POINTER_FILE)
+
+
+def prune_versions(persist_dir: str, keep: int = 2) -> List[str]:
+    """
+    Delete old versions, keeping the live one and the newest others.
+
+    The previous version is kept by default because requests that started
+    before a swap may still be reading from it.
+
+    Returns:
+        Names of the deleted versions
+    """
+    live = current_version(persist_dir)
+    kept = {live} if live else set()
+    removed = []
+    for path in reversed(_version_dirs(persist_dir)):
+        if path.name in kept:
+            continue
+        if len(kept) < keep:
+            kept.add(path.name)
+            continue
+        try:
+            shutil.rmtree(path)
+            removed.append(path.name)
+        except OSError as e:
+            print(f"Warning: Could not remove old vector store version {path}: {e}")
+    return removed
@@ -3,38 +3,79 @@ Vector store module for storing and retrieving embeddings.
 Supports multiple vector database backends (FAISS, ChromaDB, etc.)
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
 import numpy as np
-import json
 import os
 from pathlib import Path
 
+from .faiss_index import FaissIndex
+from .filters import to_chroma_where
+from .numpy_index import NumpyIndex
+
 
 class VectorStore:
     """Vector store for similarity search."""
     
-    def __init__(self, store_type: str = "chroma", persist_dir: Optional[str] = None, collection_name: str = "store_assistant"):
+    def __init__(
+        self,
+        store_type: str = "chroma",
+        persist_dir: Optional[str] = None,
+        collection_name: str = "store_assistant",
+        index_factory: str = "Flat",
+        nprobe: int = 8,
+        ef_search: int = 64,
+        quantization: Optional[str] = None,
+        rerank_factor: int = 4
+    ):
         """
         Initialize vector store.
         
         Args:
-            store_type: Type of vector store ("faiss" or "chroma")
+            store_type: Type of vector store ("chroma", "faiss" or "numpy")
             persist_dir: Directory to persist the vector store
             collection_name: Name of the ChromaDB collection (for ChromaDB only)
+            index_factory: FAISS index factory string, e.g. "Flat", "IVF256,Flat",
+                           "IVF256,PQ32" or "HNSW32" (for FAISS only)
+            nprobe: Number of IVF lists probed per search (IVF indexes only)
+            ef_search: HNSW search beam width (HNSW indexes only)
+            quantization: "int8" or "float16" to search scalar-quantized codes
+                          and re-rank exactly (NumPy only; for FAISS use an
+                          "SQ8" / "SQfp16" index_factory instead)
+            rerank_factor: Candidates re-scored exactly per result when quantized
         """
         self.store_type = store_type
         self.persist_dir = persist_dir or "data/vector_store"
         self.collection_name = collection_name
-        self._index = None
+        self.index_factory = index_factory or "Flat"
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
         self._client = None
         self._collection = None
-        self._metadata = []
-        self._embeddings = []
+        self._faiss_index: Optional[FaissIndex] = None
+        self._numpy_index: Optional[NumpyIndex] = None
         Path(self.persist_dir).mkdir(parents=True, exist_ok=True)
         
         # Initialize ChromaDB if selected
         if self.store_type == "chroma":
             self._initialize_chroma()
+        elif self.store_type == "numpy":
+            # Memory-maps a previously saved matrix if there is one
+            self._numpy_index = NumpyIndex(
+                self.persist_dir,
+                quantization=self.quantization,
+                rerank_factor=self.rerank_factor
+            )
+            self._numpy_index.load()
+        else:
+            # Picks up a previously saved FAISS index if there is one
+            self._faiss_index = FaissIndex(
+                self.index_factory,
+                nprobe=self.nprobe,
+                ef_search=self.ef_search
+            )
+            self.load()
         
     def _initialize_chroma(self):
         """Initialize ChromaDB client and collection."""
@@ -60,13 +101,21 @@ class VectorStore:
         except ImportError:
             raise ImportError("ChromaDB is required. Install with: pip install chromadb")
     
-    def _load_faiss(self, dimension: int):
-        """Load FAISS index."""
-        try:
-            import faiss
-            self._index = faiss.IndexFlatL2(dimension)
-        except ImportError:
-            raise ImportError("FAISS is required. Install with: pip install faiss-cpu")
+    @staticmethod
+    def _prepare_chroma_documents(documents: List[Dict]) -> Tuple[List[str], List[Dict]]:
+        """Split documents into texts and ChromaDB-compatible metadata."""
+        texts = [doc.get('text', doc.get('content', '')) for doc in documents]
+        
+        # Prepare metadata (remove 'text' and 'content' as they're stored separately).
+        # ChromaDB rejects None values, so those are dropped too.
+        metadatas = []
+        for doc in documents:
+            metadata = {
+                k: v for k, v in doc.items()
+                if k not in ['text', 'content', 'id'] and v is not None
+            }
+            metadatas.append(metadata)
+        return texts, metadatas
     
     def add_documents(
         self, 
@@ -94,46 +143,180 @@ class VectorStore:
             if ids is None:
                 ids = [doc.get('id', str(i)) for i, doc in enumerate(documents)]
             
-            texts = [doc.get('text', doc.get('content', '')) for doc in documents]
-            
-            # Convert embeddings to list format for ChromaDB
-            embeddings_list = embeddings.tolist()
-            
-            # Prepare metadata (remove 'text' and 'content' as they're stored separately)
-            metadatas = []
-            for doc in documents:
-                metadata = {k: v for k, v in doc.items() if k not in ['text', 'content', 'id']}
-                metadatas.append(metadata)
+            texts, metadatas = self._prepare_chroma_documents(documents)
             
             # Add to ChromaDB collection
             self._collection.add(
-                embeddings=embeddings_list,
+                embeddings=embeddings.tolist(),
                 documents=texts,
                 metadatas=metadatas,
                 ids=ids
             )
+        elif self.store_type == "numpy":
+            if ids is None:
+                start = len(self._numpy_index)
+                ids = [doc.get('id', str(start + i)) for i, doc in enumerate(documents)]
+            self._numpy_index.add(embeddings, documents, list(ids))
         else:
-            # Use FAISS (fallback)
-            if self._index is None:
-                self._load_faiss(embeddings.shape[1])
+            # Use FAISS (fallback); documents are addressed by stable labels
+            if ids is None:
+                start = len(self._faiss_index)
+                ids = [doc.get('id', str(start + i)) for i, doc in enumerate(documents)]
+            self._faiss_index.add(embeddings, documents, list(ids))
+    
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[Dict]):
+        """
+        Insert new documents or replace existing ones with the same IDs.
+        
+        Args:
+            ids: Document IDs
+            embeddings: Array of document embeddings
+            documents: List of document dictionaries with metadata
+        """
+        if embeddings.shape[0] != len(documents) or len(ids) != len(documents):
+            raise ValueError("Number of ids, embeddings and documents must match")
+        if not ids:
+            return
+        
+        if self.store_type == "chroma":
+            if self._collection is None:
+                self._initialize_chroma()
+            texts, metadatas = self._prepare_chroma_documents(documents)
+            self._collection.upsert(
+                embeddings=embeddings.tolist(),
+                documents=texts,
+                metadatas=metadatas,
+                ids=list(ids)
+            )
+        elif self.store_type == "numpy":
+            self._numpy_index.upsert(embeddings, documents, list(ids))
+        else:
+            # Only the vectors of these IDs are removed and re-added
+            self._faiss_index.upsert(embeddings, documents, list(ids))
+    
+    def delete(self, ids: List[str]):
+        """
+        Delete documents by ID. Unknown IDs are ignored.
+        
+        Args:
+            ids: Document IDs to delete
+        """
+        if not ids:
+            return
+        
+        if self.store_type == "chroma":
+            if self._collection is None:
+                return
+            self._collection.delete(ids=list(ids))
+        elif self.store_type == "numpy":
+            self._numpy_index.delete(ids)
+        else:
+            self._faiss_index.delete(ids)
+    
+    def get_fingerprints(self) -> Dict[str, str]:
+        """
+        Get the content fingerprint of every stored document that has one.
+        
+        Returns:
+            Mapping of document ID to its 'fingerprint' metadata value
+        """
+        if self.store_type == "chroma":
+            if self._collection is None:
+                return {}
+            stored = self._collection.get(include=["metadatas"])
+            return {
+                doc_id: metadata['fingerprint']
+                for doc_id, metadata in zip(stored['ids'], stored['metadatas'] or [])
+                if metadata and 'fingerprint' in metadata
+            }
+        
+        if self.store_type == "numpy":
+            return self._numpy_index.get_fingerprints()
+        
+        return self._faiss_index.get_fingerprints()
+
+    def get_ids(self) -> List[str]:
+        """Get the ID of every stored document."""
+        if self.store_type == "chroma":
+            if self._collection is None:
+                return []
+            return list(self._collection.get(include=[])['ids'])
+
+        if self.store_type == "numpy":
+            return self._numpy_index.get_ids()
+
+        return self._faiss_index.get_ids()
+    
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Get the stored vectors of documents, without re-embedding them.
+        
+        Args:
+            ids: Document IDs
             
-            # Add to FAISS index
-            self._index.add(embeddings.astype('float32'))
+        Returns:
+            Mapping of document ID to its vector; unknown IDs are left out
+        """
+        if not ids:
+            return {}
+        
+        if self.store_type == "chroma":
+            if self._collection is None:
+                return {}
+            stored = self._collection.get(ids=list(dict.fromkeys(ids)), include=["embeddings"])
+            embeddings = stored['embeddings']
+            if embeddings is None:
+                return {}
+            return {
+                doc_id: np.asarray(embedding, dtype='float32')
+                for doc_id, embedding in zip(stored['ids'], embeddings)
+            }
+        
+        if self.store_type == "numpy":
+            return self._numpy_index.get_embeddings(ids)
+        
+        return self._faiss_index.get_embeddings(ids)
+    
+    def quantization_recall(self, query_embeddings: np.ndarray, k: int = 10) -> float:
+        """
+        Recall@k of quantized search versus full-precision search.
+        
+        Args:
+            query_embeddings: Sample queries to evaluate with
+            k: Number of neighbours compared per query
             
-            # Store metadata
-            for i, doc in enumerate(documents):
-                doc_with_id = doc.copy()
-                if ids:
-                    doc_with_id['id'] = ids[i]
-                else:
-                    doc_with_id['id'] = str(len(self._metadata))
-                self._metadata.append(doc_with_id)
-                self._embeddings.append(embeddings[i])
+        Returns:
+            Recall in [0, 1]; 1.0 when the store is not quantized
+        """
+        if self.store_type != "numpy":
+            return 1.0
+        return self._numpy_index.quantization_recall(query_embeddings, k)
+    
+    def iter_documents(self) -> Iterator[Dict]:
+        """
+        Iterate over every stored document (text and metadata, no vectors).
+        
+        Yields:
+            Document dictionaries with at least 'id' and 'text'
+        """
+        if self.store_type == "chroma":
+            if self._collection is None:
+                return
+            stored = self._collection.get(include=["documents", "metadatas"])
+            for i, doc_id in enumerate(stored['ids']):
+                metadata = (stored['metadatas'] or [])[i] if stored['metadatas'] else {}
+                text = stored['documents'][i] if stored['documents'] else ""
+                yield {'id': doc_id, 'text': text or "", **(metadata or {})}
+        elif self.store_type == "numpy":
+            yield from self._numpy_index.iter_documents()
+        else:
+            yield from self._faiss_index.iter_documents()
     
     def search(
         self, 
         query_embedding: np.ndarray, 
-        k: int = 5
+        k: int = 5,
+        filters: Optional[Dict] = None
     ) -> List[Dict]:
         """
         Search for similar documents.
@@ -141,62 +324,84 @@ class VectorStore:
         Args:
             query_embedding: Query embedding vector
             k: Number of top results to return
+            filters: Optional metadata filter, e.g.
+                     {"category": "Rings", "max_price": 2000, "in_stock": True}
+                     (see rag.filters for all keys)
             
         Returns:
             List of similar documents with scores
         """
+        query_embedding = np.asarray(query_embedding, dtype='float32').reshape(1, -1)
+        return self.search_batch(query_embedding, k=k, filters=filters)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filters: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for several queries in one backend call.
+        
+        Args:
+            query_embeddings: Array of query embeddings (shape: [n_queries, dim])
+            k: Number of top results to return per query
+            filters: Optional metadata filter applied to every query
+            
+        Returns:
+            One list of similar documents with scores per query
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype='float32')
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings.reshape(1, -1)
+        n_queries = query_embeddings.shape[0]
+        if n_queries == 0:
+            return []
+        
         if self.store_type == "chroma":
             # Use ChromaDB
             if self._collection is None:
-                return []
-            
-            # Convert embedding to list format
-            query_embedding_list = query_embedding.tolist() if isinstance(query_embedding, np.ndarray) else query_embedding
+                return [[] for _ in range(n_queries)]
             
-            # Search in ChromaDB
+            # Search in ChromaDB (filters become a native where clause)
+            query_kwargs = {}
+            where = to_chroma_where(filters)
+            if where is not None:
+                query_kwargs['where'] = where
             results = self._collection.query(
-                query_embeddings=[query_embedding_list],
-                n_results=k
+                query_embeddings=query_embeddings.tolist(),
+                n_results=k,
+                **query_kwargs
             )
             
             # Format results to match expected format
-            formatted_results = []
-            if results['ids'] and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    doc_id = results['ids'][0][i]
-                    doc_text = results['documents'][0][i] if results['documents'] and i < len(results['documents'][0]) else ""
-                    metadata = results['metadatas'][0][i] if results['metadatas'] and i < len(results['metadatas'][0]) else {}
-                    distance = results['distances'][0][i] if results['distances'] and i < len(results['distances'][0]) else 0.0
-                    
-                    result_dict = {
-                        'id': doc_id,
-                        'text': doc_text,
-                        **metadata,
-                        'score': float(distance),
-                        'distance': float(distance)
-                    }
-                    formatted_results.append(result_dict)
-            
-            return formatted_results
+            return [self._format_chroma_results(results, q) for q in range(n_queries)]
+        elif self.store_type == "numpy":
+            return self._numpy_index.search_batch(query_embeddings, k, filters)
         else:
             # Use FAISS (fallback)
-            if self._index is None or self._index.ntotal == 0:
-                return []
-            
-            query_embedding = query_embedding.reshape(1, -1).astype('float32')
-            
-            # Search in FAISS
-            distances, indices = self._index.search(query_embedding, k)
-            
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self._metadata):
-                    result = self._metadata[idx].copy()
-                    result['score'] = float(distances[0][i])
-                    result['distance'] = float(distances[0][i])
-                    results.append(result)
-            
-            return results
+            return self._faiss_index.search_batch(query_embeddings, k, filters)
+    
+    @staticmethod
+    def _format_chroma_results(results: Dict, q: int) -> List[Dict]:
+        """Convert the q-th query of a ChromaDB result into result dicts."""
+        formatted_results = []
+        if results['ids'] and len(results['ids'][q]) > 0:
+            for i in range(len(results['ids'][q])):
+                doc_id = results['ids'][q][i]
+                doc_text = results['documents'][q][i] if results['documents'] and i < len(results['documents'][q]) else ""
+                metadata = results['metadatas'][q][i] if results['metadatas'] and i < len(results['metadatas'][q]) else {}
+                distance = results['distances'][q][i] if results['distances'] and i < len(results['distances'][q]) else 0.0
+                
+                result_dict = {
+                    'id': doc_id,
+                    'text': doc_text,
+                    **metadata,
+                    'score': float(distance),
+                    'distance': float(distance)
+                }
+                formatted_results.append(result_dict)
+        return formatted_results
     
     def save(self, path: Optional[str] = None):
         """Save vector store to disk."""
@@ -204,17 +409,13 @@ class VectorStore:
         if self.store_type == "chroma":
             return
         
+        if self.store_type == "numpy":
+            self._numpy_index.save(path)
+            return
+        
         # FAISS save (fallback)
         path = path or os.path.join(self.persist_dir, "vector_store")
-        
-        # Save FAISS index
-        if self._index is not None:
-            import faiss
-            faiss.write_index(self._index, f"{path}.index")
-        
-        # Save metadata
-        with open(f"{path}_metadata.json", 'w') as f:
-            json.dump(self._metadata, f, indent=2)
+        self._faiss_index.save(path)
     
     def load(self, path: Optional[str] = None):
         """Load vector store from disk."""
@@ -223,21 +424,10 @@ class VectorStore:
             self._initialize_chroma()
             return
         
+        if self.store_type == "numpy":
+            self._numpy_index.load(path)
+            return
+        
         # FAISS load (fallback)
         path = path or os.path.join(self.persist_dir, "vector_store")
-        
-        # Load FAISS index
-        try:
-            import faiss
-            index_path = f"{path}.index"
-            if os.path.exists(index_path):
-                self._index = faiss.read_index(index_path)
-        except Exception as e:
-            print(f"Warning: Could not load FAISS index: {e}")
-        
-        # Load metadata
-        metadata_path = f"{path}_metadata.json"
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                self._metadata = json.load(f)
-
+        self._faiss_index.load(path)